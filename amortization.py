@@ -0,0 +1,194 @@
+"""Loan EMI and amortization schedules, vectorized with NumPy.
+
+Every function takes scalars or 1-D arrays (one entry per loan) and broadcasts them.
+Schedules use the closed form of the outstanding balance after k payments,
+
+    B_k = P * (g^n - g^k) / (g^n - 1),   g = 1 + r   (B_k = P * (n - k) / n when r = 0)
+
+so any window of periods is computed directly, without stepping through the months
+before it. That is what makes paging through (or streaming) a 30-year schedule, or
+computing thousands of schedules at once, a handful of array operations.
+
+Per period k (1-based): interest = B_{k-1} * r, principal = B_{k-1} - B_k, and
+payment = EMI, matching `generateSchedule` in static/calculator.js.
+
+`max_principal`, `min_months` and `max_rate` invert the EMI formula (the first two in
+closed form, the rate by bisection) to answer "how much / how long / at what rate".
+
+    payment, total_interest, total_cost = amortization.emi(800000, 60, 10.5)
+    block = amortization.schedule_block([8e5, 2e6], [60, 240], [10.5, 8.9], start=0, stop=12)
+    for block in amortization.iter_blocks(2e6, 360, 8.9, chunk=120):
+        ...
+"""
+
+import numpy as np
+
+COLUMNS = ("month", "payment", "principal", "interest", "balance")
+
+
+def _as_loans(principal, months, apr):
+    principal, months, apr = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(principal, dtype=np.float64)),
+        np.atleast_1d(np.asarray(months, dtype=np.float64)),
+        np.atleast_1d(np.asarray(apr, dtype=np.float64)),
+    )
+    with np.errstate(invalid="ignore"):
+        n = np.round(months)
+        valid = (
+            np.isfinite(principal) & (principal > 0)
+            & np.isfinite(months) & (n > 0)
+            & np.isfinite(apr) & (apr >= 0)
+        )
+    return principal, np.where(valid, n, 0.0), (apr / 100.0) / 12.0, valid
+
+
+def emi(principal, months, apr):
+    """EMI for each loan. Returns (payment, total_interest, total_cost) arrays, NaN where invalid.
+
+    `months` is rounded to whole periods; `apr` is the annual rate in percent.
+    """
+    principal = np.asarray(principal, dtype=np.float64)
+    months = np.asarray(months, dtype=np.float64)
+    apr = np.asarray(apr, dtype=np.float64)
+
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        n = np.round(months)
+        valid = (
+            np.isfinite(principal) & (principal > 0)
+            & np.isfinite(months) & (months > 0)
+            & np.isfinite(apr) & (apr >= 0)
+            & (n > 0)
+        )
+        r = (apr / 100.0) / 12.0
+        pow_ = (1 + r) ** n
+        payment = np.where(r == 0, principal / n, principal * (r * pow_) / (pow_ - 1))
+        payment = np.where(valid, payment, np.nan)
+        total_cost = payment * n
+        total_interest = np.maximum(0.0, total_cost - principal)
+    return payment, total_interest, total_cost
+
+
+def emi_one(principal: float, months: float, apr: float):
+    """Scalar `emi`: (payment, total_interest, total_cost) as floats, or None if invalid."""
+    payment, total_interest, total_cost = emi(principal, months, apr)
+    if not np.isfinite(payment):
+        return None
+    return float(payment), float(total_interest), float(total_cost)
+
+
+def schedule_block(principal, months, apr, start: int = 0, stop: int | None = None) -> dict:
+    """Periods `start`..`stop - 1` (0-based) of every loan's schedule.
+
+    Returns a dict of (n_loans, stop - start) float64 arrays keyed by `COLUMNS`; `month`
+    is 1-based. Cells past a loan's own term, and every cell of an invalid loan, are NaN.
+    `stop` defaults to the longest term.
+    """
+    principal, n, r, valid = _as_loans(principal, months, apr)
+    if stop is None:
+        stop = int(n.max()) if n.size else 0
+    start = max(0, int(start))
+    stop = max(start, int(stop))
+
+    # Balances B_start .. B_stop; period k uses B_{k-1} and B_k.
+    periods = np.arange(start, stop + 1, dtype=np.float64)
+    k = periods[1:]  # 1-based period numbers
+    P, N, R = principal[:, None], n[:, None], r[:, None]
+
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        log_g = np.log1p(R)
+        g_n = np.expm1(N * log_g)  # g^n - 1, accurate for small rates
+        elapsed = np.minimum(periods, N)
+        # (g^n - g^k) / (g^n - 1), written with expm1 so it does not cancel near the end.
+        remaining = np.where(R > 0, (g_n - np.expm1(elapsed * log_g)) / g_n, (N - elapsed) / N)
+        balance = np.maximum(0.0, P * remaining)
+        before, after = balance[:, :-1], balance[:, 1:]
+        interest = before * R
+        payment = np.where(R > 0, P * R * (g_n + 1) / g_n, P / N)
+        principal_paid = before - after
+
+    in_term = valid[:, None] & (k <= N)
+    shape = in_term.shape
+    nan = np.full(shape, np.nan)
+    return {
+        "month": np.where(in_term, np.broadcast_to(k, shape), np.nan),
+        "payment": np.where(in_term, np.broadcast_to(payment, shape), nan),
+        "principal": np.where(in_term, principal_paid, nan),
+        "interest": np.where(in_term, interest, nan),
+        "balance": np.where(in_term, after, nan),
+    }
+
+
+def iter_blocks(principal, months, apr, chunk: int = 120, start: int = 0, stop: int | None = None):
+    """Yield `schedule_block`s of at most `chunk` periods covering `start`..`stop - 1`."""
+    if stop is None:
+        n = _as_loans(principal, months, apr)[1]
+        stop = int(n.max()) if n.size else 0
+    for block_start in range(max(0, int(start)), int(stop), max(1, int(chunk))):
+        yield schedule_block(principal, months, apr, block_start, min(int(stop), block_start + chunk))
+
+
+def schedule_rows(block: dict, loan: int = 0, decimals: int = 2):
+    """One loan's rows of a block as JSON-ready dicts (periods outside its term are skipped)."""
+    columns = {name: block[name][loan] for name in COLUMNS}
+    keep = np.isfinite(columns["month"])
+    months = columns["month"][keep].astype(np.int64).tolist()
+    values = [np.round(columns[name][keep], decimals).tolist() for name in COLUMNS[1:]]
+    return [
+        {"month": month, "emi": pay, "principal": prin, "interest": intr, "balance": bal}
+        for month, pay, prin, intr, bal in zip(months, *values)
+    ]
+
+
+def max_principal(payment, months, apr):
+    """Largest principal that `payment` per month repays over `months` at `apr` (inverse of `emi`).
+
+    0 where `payment` <= 0; NaN where the term or rate is invalid.
+    """
+    payment = np.asarray(payment, dtype=np.float64)
+    months = np.round(np.asarray(months, dtype=np.float64))
+    r = (np.asarray(apr, dtype=np.float64) / 100.0) / 12.0
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        discount = -np.expm1(-months * np.log1p(r))  # 1 - (1 + r)^-n
+        principal = np.where(r > 0, np.maximum(payment, 0.0) * discount / r, np.maximum(payment, 0.0) * months)
+        valid = np.isfinite(payment) & np.isfinite(months) & (months > 0) & np.isfinite(r) & (r >= 0)
+    return np.where(valid, principal, np.nan)
+
+
+def min_months(principal, payment, apr):
+    """Fewest whole months in which `payment` per month repays `principal` at `apr`.
+
+    inf where the payment never covers the interest; NaN where inputs are invalid.
+    """
+    principal = np.asarray(principal, dtype=np.float64)
+    payment = np.asarray(payment, dtype=np.float64)
+    r = (np.asarray(apr, dtype=np.float64) / 100.0) / 12.0
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        covers = payment > principal * r
+        # n = -log(1 - P r / EMI) / log(1 + r); tolerance absorbs float error at exact terms.
+        exact = np.where(r > 0, -np.log1p(-principal * r / payment) / np.log1p(r), principal / payment)
+        months = np.where(covers, np.ceil(exact - 1e-9), np.inf)
+        valid = np.isfinite(principal) & (principal > 0) & np.isfinite(payment) & (payment > 0) & np.isfinite(r) & (r >= 0)
+    return np.where(valid, months, np.nan)
+
+
+def max_rate(principal, months, payment, cap: float = 100.0, iterations: int = 60):
+    """Highest annual rate (percent) at which `payment` still repays `principal` over `months`.
+
+    The EMI rises monotonically with the rate, so this bisects all loans at once. NaN
+    where even 0% needs a larger payment (or inputs are invalid); `cap` where the
+    payment covers every rate up to `cap`.
+    """
+    principal, months, payment = np.broadcast_arrays(
+        np.asarray(principal, dtype=np.float64),
+        np.asarray(months, dtype=np.float64),
+        np.asarray(payment, dtype=np.float64),
+    )
+    lo = np.zeros(principal.shape)
+    hi = np.full(principal.shape, float(cap))
+    feasible = emi(principal, months, lo)[0] <= payment
+    for _ in range(iterations):
+        mid = (lo + hi) / 2
+        fits = emi(principal, months, mid)[0] <= payment
+        lo = np.where(fits, mid, lo)
+        hi = np.where(fits, hi, mid)
+    return np.where(feasible, lo, np.nan)
@@ -1,50 +1,614 @@
 import warnings
 warnings.filterwarnings("ignore")
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify
+import gc
+import hashlib
+import hmac
+import itertools
 import os
 import json
-import urllib.request
-import urllib.error
+import random
+import re
+import tempfile
+import time
+import uuid
 import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import google.generativeai as genai
 
-# Configure Gemini API
+import amortization
+import chat_prompt
+import chat_router
+import llm_cache
+import llm_client
+import metrics
+import model_format
+import simulation
+import single_flight
+import timing
+
+# Configure Gemini API (REST over a pooled keep-alive client; see llm_client.py)
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+GEMINI = llm_client.client_from_env()
+
+
+def _record_llm_call(endpoint: str, outcome: str, seconds):
+    metrics.REGISTRY.inc("credilume_llm_calls_total", {"endpoint": endpoint, "outcome": outcome})
+    if seconds is not None:
+        metrics.REGISTRY.observe("credilume_llm_call_duration_seconds", seconds, {"endpoint": endpoint})
+
+
+GEMINI.on_call = _record_llm_call
 
 app = Flask(__name__)
 
+# Shared cache for LLM responses (see llm_cache.py for backends / env settings).
+LLM_CACHE = llm_cache.cache_from_env()
+
+
+def _record_coalesced(scope: str):
+    metrics.REGISTRY.inc("credilume_llm_coalesced_total", {"endpoint": "advisor", "scope": scope})
+
+
+# Identical concurrent /smart_advisor queries share one Gemini call (see single_flight.py).
+ADVICE_FLIGHTS = single_flight.flight_from_env(_record_coalesced)
+
 _BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Lazy-loaded ML artifacts (keeps server startup fast and avoids scipy/sklearn import stalls
-# during Flask's debug reloader re-import).
+# during Flask's debug reloader re-import). In production, gunicorn.conf.py sets
+# CREDILUME_PRELOAD=1 so they are loaded once in the master before workers fork.
+# Each loaded version is an immutable _ModelBundle published by _REGISTRY (see MODEL
+# REGISTRY below); `model` / `FEATURE_NAMES` mirror the current bundle for scripts.
 model = None
 FEATURE_NAMES = None
 _ARTIFACT_ERROR = None
+_ARTIFACT_ERROR_AT = 0.0
+_ARTIFACT_LOCK = threading.Lock()
+
+# A failed load is retried after this many seconds instead of failing forever.
+ARTIFACT_RETRY_SECONDS = float(os.environ.get("ARTIFACT_RETRY_SECONDS", "30"))
+
+# "auto" serves loan_model.clm (see model_format.py; no sklearn import) when it exists and
+# matches loan_model.pkl, otherwise the pickle. "compact" / "pickle" force one format.
+MODEL_FORMAT = os.environ.get("MODEL_FORMAT", "auto").strip().lower()
+
+
+class _LinearScorer:
+    """Single-pass inference for a fitted binary linear classifier.
+
+    Computes the approval probability once and thresholds it, instead of calling
+    `predict` and `predict_proba` separately. When the estimator exposes `coef_` /
+    `intercept_` the score is a raw NumPy dot + sigmoid, skipping sklearn's per-call
+    input validation; otherwise it falls back to the estimator's `predict_proba`.
+    """
+
+    def __init__(self, coef=None, intercept=0.0, classes=(0, 1), threshold: float = 0.5, estimator=None):
+        self.coef = None if coef is None else np.ascontiguousarray(coef, dtype=np.float64).ravel()
+        self.intercept = float(intercept)
+        self.classes = np.asarray(classes)
+        self.threshold = float(threshold)
+        self.estimator = estimator
+
+    @classmethod
+    def from_estimator(cls, estimator, threshold: float = 0.5):
+        coef = getattr(estimator, "coef_", None)
+        intercept = getattr(estimator, "intercept_", None)
+        classes = getattr(estimator, "classes_", None)
+        if coef is not None and intercept is not None and classes is not None and len(classes) == 2 and np.shape(coef)[0] == 1:
+            return cls(coef[0], intercept[0], classes, threshold=threshold, estimator=estimator)
+        return cls(classes=classes if classes is not None else (0, 1), threshold=threshold, estimator=estimator)
+
+    def decision_function(self, X):
+        return X @ self.coef + self.intercept
+
+    def predict_proba(self, X):
+        """Probability of the positive class, shape (n_rows,)."""
+        if self.coef is None:
+            return self.estimator.predict_proba(X)[:, 1]
+        z = self.decision_function(X)
+        # Numerically stable logistic sigmoid (same values as scipy.special.expit).
+        return np.exp(-np.logaddexp(0.0, -z))
+
+    def predict(self, X):
+        """Return (labels, positive_class_probabilities) from one scoring pass."""
+        proba = self.predict_proba(X)
+        labels = self.classes[(proba > self.threshold).astype(np.intp)]
+        return labels, proba
+
+    def check_parity(self, X, atol: float = 1e-9) -> bool:
+        """Compare against the wrapped estimator's predict/predict_proba on `X`."""
+        if self.estimator is None or self.coef is None:
+            return True
+        labels, proba = self.predict(X)
+        expected_proba = self.estimator.predict_proba(X)[:, 1]
+        expected_labels = self.classes[(expected_proba > self.threshold).astype(np.intp)]
+        return bool(np.allclose(proba, expected_proba, rtol=0, atol=atol) and np.array_equal(labels, expected_labels))
+
+
+class _FeatureEncoder:
+    """Precompiled mapping from parsed application fields to the model's feature vector.
+
+    Built once from FEATURE_NAMES: a column-index map, a zeroed float64 template row and
+    the one-hot layout of categorical columns (`pd.get_dummies` names such as
+    "education_ Not Graduate"). Encoding fills values by index into a template copy or a
+    caller-supplied buffer, so no per-request dict/list/object-array conversion is needed.
+    """
+
+    # Numeric inputs collected by the form / JSON API (all other numeric features stay 0).
+    NUMERIC_FIELDS = ("income_annum", "loan_amount", "loan_term", "cibil_score")
+
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+        self.index = {name: i for i, name in enumerate(self.feature_names)}
+        self.template = np.zeros(len(self.feature_names), dtype=np.float64)
+        self.numeric = tuple((name, self.index[name]) for name in self.NUMERIC_FIELDS if name in self.index)
+
+        # column -> {normalized level: feature index}; the dropped first level has no column.
+        self.categorical = {}
+        for name, i in self.index.items():
+            column, sep, level = name.partition("_ ")
+            if sep:
+                self.categorical.setdefault(column, {})[level.strip().lower()] = i
+
+        self._local = threading.local()
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    def encode_one(self, values, categorical=None, out=None):
+        """Encode one application into a (1, n_features) row.
+
+        Without `out`, a per-thread buffer is reused; consume the row before the next call.
+        """
+        if out is None:
+            out = getattr(self._local, "row", None)
+            if out is None:
+                out = self._local.row = np.empty((1, self.n_features), dtype=np.float64)
+        row = out[0]
+        row[:] = self.template
+        for name, i in self.numeric:
+            row[i] = values[name]
+        if categorical is not None:
+            for column, levels in self.categorical.items():
+                raw = categorical.get(column)
+                if raw is not None:
+                    i = levels.get(str(raw).strip().lower())
+                    if i is not None:
+                        row[i] = 1.0
+        return out
+
+    def encode_batch(self, columns, categorical=None, out=None):
+        """Encode column arrays (name -> 1-D array) into an (n_rows, n_features) matrix.
+
+        `out` may be a preallocated buffer with at least n_rows rows; a view of the first
+        n_rows rows is returned.
+        """
+        n_rows = len(columns[self.numeric[0][0]]) if self.numeric else 0
+        if out is None or out.shape[0] < n_rows or out.shape[1] != self.n_features:
+            out = np.empty((n_rows, self.n_features), dtype=np.float64)
+        matrix = out[:n_rows]
+        matrix[:] = self.template
+        for name, i in self.numeric:
+            matrix[:, i] = columns[name]
+        if categorical is not None:
+            for column, levels in self.categorical.items():
+                raw_values = categorical.get(column)
+                if raw_values is None:
+                    continue
+                for level, i in levels.items():
+                    matrix[:, i] = [
+                        1.0 if raw is not None and str(raw).strip().lower() == level else 0.0
+                        for raw in raw_values
+                    ]
+        return matrix
+
+
+def _parity_probe(n_features: int):
+    """A handful of deterministic rows spanning realistic input magnitudes."""
+    rng = np.random.default_rng(0)
+    scales = np.array([1.0, 1e3, 1e5, 1e7])
+    return rng.standard_normal((16, n_features)) * scales[rng.integers(0, len(scales), (16, n_features))]
+
+
+def _artifact_version(*paths) -> str:
+    """Short content hash identifying the exact artifact files being served."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def _use_compact_model(compact_path: str, model_path: str) -> bool:
+    if MODEL_FORMAT == "pickle":
+        return False
+    if MODEL_FORMAT == "compact":
+        return True
+    if not os.path.exists(compact_path):
+        return False
+    # Guard against a stale export: if the pickle was retrained without re-exporting,
+    # its hash no longer matches the one recorded in the compact header.
+    source_sha256 = model_format.read_header(compact_path).get("source_sha256")
+    if source_sha256 and os.path.exists(model_path) and model_format.file_sha256(model_path) != source_sha256:
+        app.logger.warning("loan_model.clm is stale relative to loan_model.pkl; serving the pickle")
+        return False
+    return True
+
+
+class _ModelBundle:
+    """Everything the request path needs from one model version; never mutated once published."""
+
+    def __init__(self, loaded_model, feature_names, scorer, info: dict):
+        self.model = loaded_model
+        self.feature_names = list(feature_names)
+        self.scorer = scorer
+        self.encoder = _FeatureEncoder(self.feature_names)
+        self.info = info
+
+    @property
+    def version(self) -> str:
+        return self.info["version"]
+
+
+def _artifact_paths():
+    return (
+        os.path.join(_BASE_DIR, "loan_model.clm"),
+        os.path.join(_BASE_DIR, "loan_model.pkl"),
+        os.path.join(_BASE_DIR, "features.pkl"),
+        os.path.join(_BASE_DIR, "model_manifest.json"),
+    )
+
+
+def _manifest_threshold(manifest_path: str, model_path: str) -> float:
+    """Decision threshold tuned by `loan_fin.py --search`, if the manifest matches the pickle."""
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return 0.5
+    if manifest.get("artifacts", {}).get("loan_model.pkl") != model_format.file_sha256(model_path):
+        app.logger.warning("model_manifest.json does not match loan_model.pkl; using threshold 0.5")
+        return 0.5
+    return float(manifest.get("threshold", 0.5))
+
+
+def _build_bundle() -> _ModelBundle:
+    """Load the artifacts currently on disk into a new (unpublished) bundle."""
+    started = time.perf_counter()
+    compact_path, model_path, features_path, manifest_path = _artifact_paths()
+
+    if _use_compact_model(compact_path, model_path):
+        loaded_model = model_format.load(compact_path)
+        feature_names = loaded_model.feature_names
+        scorer = _LinearScorer(
+            loaded_model.coef, loaded_model.intercept, loaded_model.classes_, loaded_model.threshold
+        )
+        artifact_paths = (compact_path,)
+    else:
+        with open(model_path, "rb") as f:
+            loaded_model = pickle.load(f)
+        with open(features_path, "rb") as f:
+            feature_names = pickle.load(f)
+
+        threshold = _manifest_threshold(manifest_path, model_path)
+        scorer = _LinearScorer.from_estimator(loaded_model, threshold)
+        if not scorer.check_parity(_parity_probe(len(feature_names))):
+            # Not a plain linear model after all; keep correctness over speed.
+            scorer = _LinearScorer(classes=loaded_model.classes_, threshold=threshold, estimator=loaded_model)
+        artifact_paths = (model_path, features_path) + ((manifest_path,) if os.path.exists(manifest_path) else ())
+
+    return _ModelBundle(loaded_model, feature_names, scorer, {
+        "format": "compact" if isinstance(loaded_model, model_format.CompactModel) else "pickle",
+        "version": _artifact_version(*artifact_paths),
+        "threshold": scorer.threshold,
+        "load_seconds": round(time.perf_counter() - started, 4),
+        "loaded_at": time.time(),
+        "pid": os.getpid(),
+    })
+
+
+def _validate_bundle(bundle: _ModelBundle):
+    """Reject a candidate model that the request path could not serve."""
+    missing = [name for name in _FeatureEncoder.NUMERIC_FIELDS if name not in bundle.encoder.index]
+    if missing:
+        raise ValueError(f"Model is missing required features: {missing}")
+    n_coef = getattr(bundle.model, "n_features_in_", len(bundle.feature_names))
+    if n_coef != len(bundle.feature_names):
+        raise ValueError(f"Model expects {n_coef} features but the feature list has {len(bundle.feature_names)}")
+
+    probe = bundle.encoder.encode_batch({
+        "income_annum": np.array([3e5, 1.2e6, 9e6]),
+        "loan_amount": np.array([1e5, 8e5, 3e7]),
+        "loan_term": np.array([12.0, 60.0, 360.0]),
+        "cibil_score": np.array([450.0, 720.0, 880.0]),
+    })
+    labels, proba = bundle.scorer.predict(probe)
+    if not (np.all(np.isfinite(proba)) and np.all((proba >= 0) & (proba <= 1))):
+        raise ValueError("Model produced invalid probabilities on the validation probe")
+    if not set(np.unique(labels).tolist()) <= {0, 1}:
+        raise ValueError("Model must predict 0/1 labels")
+
+
+def _load_artifacts() -> _ModelBundle:
+    """Return the current model bundle, loading it on first use."""
+    global _ARTIFACT_ERROR, _ARTIFACT_ERROR_AT
+    bundle = _REGISTRY.current
+    if bundle is not None:
+        _REGISTRY.ensure_watcher()
+        return bundle
+
+    with _ARTIFACT_LOCK:
+        if _REGISTRY.current is not None:
+            return _REGISTRY.current
+
+        if _ARTIFACT_ERROR is not None and time.monotonic() - _ARTIFACT_ERROR_AT < ARTIFACT_RETRY_SECONDS:
+            raise RuntimeError(_ARTIFACT_ERROR)
 
+        try:
+            _REGISTRY.reload(force=True)
+            _ARTIFACT_ERROR = None
+        except Exception as e:
+            _ARTIFACT_ERROR = f"Failed to load ML artifacts: {e}"
+            _ARTIFACT_ERROR_AT = time.monotonic()
+            raise RuntimeError(_ARTIFACT_ERROR)
+
+    _REGISTRY.ensure_watcher()
+    return _REGISTRY.current
+
+
+def _warm_up():
+    """Run one full prediction so first-request code paths and buffers are already hot."""
+    started = time.perf_counter()
+    _predict_payload({
+        "income_annum": "1200000",
+        "loan_amount": "800000",
+        "loan_term": "60",
+        "cibil_score": "750",
+        "explain_mode": "off",
+    })
+    _REGISTRY.current.info["warmup_seconds"] = round(time.perf_counter() - started, 4)
+
+
+def _preload():
+    """Production startup: load + warm up in the gunicorn master before fork().
+
+    Workers then share the unpickled model pages copy-on-write; `gc.freeze()` keeps
+    the garbage collector from touching (and so copying) those objects in each worker.
+    """
+    # The watcher thread would not survive fork(); each worker starts its own instead.
+    _REGISTRY.defer_watcher = True
+    try:
+        _load_artifacts()
+        _warm_up()
+    except Exception as e:
+        # Keep serving (rule paths, advisors); /health?ready=1 reports the failure.
+        app.logger.error("Artifact preload failed: %s", e)
+    gc.collect()
+    gc.freeze()
 
-def _load_artifacts():
-    global model, FEATURE_NAMES, _ARTIFACT_ERROR
-    if model is not None and FEATURE_NAMES is not None:
-        return
 
+def _model_status() -> dict:
+    bundle = _REGISTRY.current
+    status = {"ready": bundle is not None, **(bundle.info if bundle is not None else {})}
     if _ARTIFACT_ERROR is not None:
-        raise RuntimeError(_ARTIFACT_ERROR)
+        status["error"] = _ARTIFACT_ERROR
+    return status
 
-    try:
-        model_path = os.path.join(_BASE_DIR, "loan_model.pkl")
-        features_path = os.path.join(_BASE_DIR, "features.pkl")
 
-        with open(model_path, "rb") as f:
-            model = pickle.load(f)
-        with open(features_path, "rb") as f:
-            FEATURE_NAMES = pickle.load(f)
+# ═══════════════════════════════════════════════════════════════════════════════
+# MODEL REGISTRY - Versioned hot reload without restarting workers
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Seconds between checks of the artifact files (0 disables the watcher).
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "30"))
+# Admin reload/rollback requests are broadcast to the other workers through this file.
+MODEL_CONTROL_PATH = os.environ.get("MODEL_CONTROL_PATH") or os.path.join(
+    tempfile.gettempdir(), "credilume_model_control.json"
+)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+
+class _ModelRegistry:
+    """Versioned model registry with read-copy-update semantics.
+
+    Requests read `current` once (a single attribute load, no lock) and keep using that
+    bundle for the whole request. Reloads build and validate a new bundle off to the
+    side, then swap the reference; writers serialize on `_lock`. The previous bundles
+    are kept for rollback.
+    """
+
+    def __init__(self, history_size: int = 3):
+        self.current = None
+        self.history = []
+        self.history_size = history_size
+        self.reloads = 0
+        self.rollbacks = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._rejected = None
+        self._control_seq = 0
+        self._watcher_started = False
+        self.defer_watcher = False
+
+    @staticmethod
+    def _fingerprint_files():
+        fingerprint = []
+        for path in _artifact_paths():
+            try:
+                st = os.stat(path)
+                fingerprint.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                fingerprint.append((path, None, None))
+        return tuple(fingerprint)
+
+    def _publish(self, bundle: _ModelBundle):
+        global model, FEATURE_NAMES
+        if self.current is not None:
+            self.history.append(self.current)
+            del self.history[:-self.history_size]
+        self.current = bundle
+        model, FEATURE_NAMES = bundle.model, bundle.feature_names
+        metrics.REGISTRY.set_gauge("credilume_model_load_seconds", bundle.info["load_seconds"])
+
+    def reload(self, force: bool = False) -> bool:
+        """Load, validate and publish the artifacts on disk; returns True if the model changed."""
+        fingerprint = self._fingerprint_files()
+        with self._lock:
+            if not force and fingerprint in (self._fingerprint, self._rejected):
+                return False
+            try:
+                bundle = _build_bundle()
+                _validate_bundle(bundle)
+            except Exception as e:
+                # Keep serving the current model; retried once the files change again.
+                self._rejected = fingerprint
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+            self._fingerprint = fingerprint
+            self.last_error = None
+            if self.current is not None and bundle.version == self.current.version:
+                return False
+            self._publish(bundle)
+            self.reloads += 1
+            return True
+
+    def rollback(self, version: str | None = None) -> _ModelBundle:
+        """Re-publish a previous bundle (the most recent one, or the given version)."""
+        with self._lock:
+            candidates = [b for b in self.history if version is None or b.version == version]
+            if not candidates:
+                raise ValueError("No previous model version available" if version is None
+                                 else f"Version {version} is not in this worker's history")
+            target = candidates[-1]
+            self.history.remove(target)
+            self._publish(target)
+            self.rollbacks += 1
+            return target
+
+    def broadcast(self, action: str, version: str | None = None) -> int:
+        """Ask the other workers (via their watchers) to apply the same admin action."""
+        seq = time.time_ns()
+        tmp_path = f"{MODEL_CONTROL_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"seq": seq, "action": action, "version": version}, f)
+        os.replace(tmp_path, MODEL_CONTROL_PATH)
+        self._control_seq = seq
+        return seq
+
+    def _apply_control(self):
+        try:
+            with open(MODEL_CONTROL_PATH, encoding="utf-8") as f:
+                control = json.load(f)
+        except (OSError, ValueError):
+            return
+        if control.get("seq", 0) <= self._control_seq:
+            return
+        self._control_seq = control["seq"]
+        if control.get("action") == "reload":
+            self.reload(force=True)
+        elif control.get("action") == "rollback" and control.get("version"):
+            if self.current is None or self.current.version != control["version"]:
+                self.rollback(control["version"])
+
+    def check(self):
+        """One watcher tick: pick up changed artifacts and admin broadcasts."""
+        try:
+            self.reload()
+        except Exception as e:
+            app.logger.warning("Model reload failed; still serving %s: %s",
+                               self.current.version if self.current else None, e)
+        try:
+            self._apply_control()
+        except Exception as e:
+            app.logger.warning("Model control action failed: %s", e)
+
+    def _watch_loop(self):
+        while True:
+            time.sleep(MODEL_WATCH_INTERVAL)
+            self.check()
+
+    def ensure_watcher(self):
+        # Threads don't survive fork(), so each worker starts its own (gunicorn's
+        # post_worker_init hook, or the first request under the dev server).
+        if self._watcher_started or self.defer_watcher or MODEL_WATCH_INTERVAL <= 0:
+            return
+        with self._lock:
+            if self._watcher_started:
+                return
+            self._watcher_started = True
+            self._control_seq = max(self._control_seq, time.time_ns())
+        threading.Thread(target=self._watch_loop, name="model-watcher", daemon=True).start()
+
+    def _after_fork(self):
+        self._watcher_started = False
+        self.defer_watcher = False
+        self._lock = threading.Lock()
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "current": self.current.info if self.current is not None else None,
+            "history": [b.version for b in self.history],
+            "reloads": self.reloads,
+            "rollbacks": self.rollbacks,
+            "last_error": self.last_error,
+            "watch_interval_seconds": MODEL_WATCH_INTERVAL,
+        }
+
+
+_REGISTRY = _ModelRegistry()
+if hasattr(os, "register_at_fork"):  # POSIX only; nothing forks on Windows
+    os.register_at_fork(after_in_child=_REGISTRY._after_fork)
+
+
+def _admin_authorized() -> bool:
+    if not ADMIN_TOKEN:
+        return False
+    supplied = request.headers.get("X-Admin-Token", "")
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        supplied = auth[len("Bearer "):]
+    return hmac.compare_digest(supplied.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+@app.route("/admin/model", methods=["GET"])
+def admin_model_status():
+    if not _admin_authorized():
+        return jsonify({"ok": False, "error": "Forbidden"}), 403
+    return jsonify({"ok": True, **_REGISTRY.status()})
+
+
+@app.route("/admin/model/reload", methods=["POST"])
+def admin_model_reload():
+    """Reload the artifacts on disk now (this worker) and broadcast to the others."""
+    if not _admin_authorized():
+        return jsonify({"ok": False, "error": "Forbidden"}), 403
+    try:
+        changed = _REGISTRY.reload(force=True)
     except Exception as e:
-        _ARTIFACT_ERROR = f"Failed to load ML artifacts: {e}"
-        raise RuntimeError(_ARTIFACT_ERROR)
+        return jsonify({"ok": False, "error": f"Reload rejected: {e}", **_REGISTRY.status()}), 409
+    _REGISTRY.broadcast("reload")
+    return jsonify({"ok": True, "changed": changed, **_REGISTRY.status()})
+
+
+@app.route("/admin/model/rollback", methods=["POST"])
+def admin_model_rollback():
+    """Switch back to the previous (or a given) model version in every worker."""
+    if not _admin_authorized():
+        return jsonify({"ok": False, "error": "Forbidden"}), 403
+    version = (request.get_json(silent=True) or {}).get("version")
+    try:
+        target = _REGISTRY.rollback(version)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e), **_REGISTRY.status()}), 409
+    _REGISTRY.broadcast("rollback", target.version)
+    return jsonify({"ok": True, **_REGISTRY.status()})
 
 
 def _safe_error_payload(form, message: str):
@@ -71,6 +635,32 @@ def _safe_error_payload(form, message: str):
         "loan_term_value": form.get("loan_term_value", ""),
     }
 
+@app.before_request
+def _start_timeline():
+    g.request_started = time.perf_counter()
+    timing.start()
+
+
+@app.after_request
+def _finish_timeline(response):
+    return _finish_request(request.endpoint or "unknown", request.method, response, g.get("request_started"))
+
+
+def _finish_request(route, method, response, started):
+    """Server-Timing header, stage histograms and request metrics for one response."""
+    timeline = timing.finish()
+    if timeline is not None:
+        response.headers["Server-Timing"] = timeline.header()
+        timing.HISTOGRAMS.observe(route, timeline)
+    if started is not None:
+        metrics.REGISTRY.inc("credilume_http_requests_total", {
+            "route": route, "method": method, "status": str(response.status_code),
+        })
+        metrics.REGISTRY.observe("credilume_http_request_duration_seconds", time.perf_counter() - started, {"route": route})
+        metrics.REGISTRY.ensure_flusher()
+    return response
+
+
 @app.route("/")
 def home():
     return render_template("index.html")
@@ -78,7 +668,32 @@ def home():
 
 @app.route("/health")
 def health():
-    return "ok", 200
+    """Liveness by default; `?ready=1` makes it a readiness probe (503 until the model is loaded)."""
+    if request.args.get("ready") in {"1", "true", "yes"}:
+        try:
+            _load_artifacts()
+        except Exception:
+            pass
+        model_status = _model_status()
+        if not model_status["ready"]:
+            return jsonify({"status": "not_ready", "model": model_status}), 503
+
+    return jsonify({
+        "status": "ok",
+        "model": _model_status(),
+        "llm": {
+            "breaker": GEMINI.breaker.snapshot(),
+            "cache": LLM_CACHE.stats(),
+            "coalescing": ADVICE_FLIGHTS.stats(),
+        },
+        "timings": metrics.REGISTRY.stage_timings(),
+    }), 200
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus text format, aggregated over every worker (see metrics.py)."""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.route("/predict", methods=["POST"])
 def predict():
@@ -94,32 +709,41 @@ def predict():
 def predict_json():
     try:
         payload = _predict_payload(request.form)
-        # Only return the parts the client needs for inline rendering.
-        response = {
-            "ok": True,
-            "prediction_text": payload.get("prediction_text"),
-            "health_score": payload.get("health_score"),
-            "reasons": payload.get("reasons") or [],
-            "suggestions": payload.get("suggestions") or [],
-            "cibil_info": payload.get("cibil_info") or [],
-            "cibil_score": payload.get("cibil_score"),
-            "guardrail_note": payload.get("guardrail_note"),
-            "advisor_summary": payload.get("advisor_summary"),
-            "advisor_advice": payload.get("advisor_advice") or [],
-            "advisor_warnings": payload.get("advisor_warnings") or [],
-            "dti_percent": payload.get("dti_percent"),
-        }
-        return jsonify(response)
+        return jsonify(_predict_json_body(payload, request.args.get("timings") in {"1", "true", "yes"}))
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 400
 
 
-def _predict_payload(form):
-    _load_artifacts()
-    if FEATURE_NAMES is None:
-        raise RuntimeError("features.pkl not found or could not be loaded")
+def _predict_json_body(payload: dict, timings: bool = False) -> dict:
+    # Only return the parts the client needs for inline rendering.
+    response = {
+        "ok": True,
+        "prediction_text": payload.get("prediction_text"),
+        "health_score": payload.get("health_score"),
+        "reasons": payload.get("reasons") or [],
+        "suggestions": payload.get("suggestions") or [],
+        "cibil_info": payload.get("cibil_info") or [],
+        "cibil_score": payload.get("cibil_score"),
+        "guardrail_note": payload.get("guardrail_note"),
+        "advisor_summary": payload.get("advisor_summary"),
+        "advisor_advice": payload.get("advisor_advice") or [],
+        "advisor_warnings": payload.get("advisor_warnings") or [],
+        "dti_percent": payload.get("dti_percent"),
+    }
+    if payload.get("explain_token"):
+        response["explain_token"] = payload["explain_token"]
+        response["explain_status"] = "pending"
+    timeline = timing.current()
+    if timeline is not None and timings:
+        response["timings"] = timeline.as_dict()
+    return response
+
 
-    input_data = dict.fromkeys(FEATURE_NAMES, 0)
+def _parse_application(form):
+    """Parse the numeric and categorical inputs of one loan application.
+
+    `form` can be `request.form` or a plain dict (JSON / batch rows).
+    """
 
     def _get_float(name: str, default: float | None = None) -> float:
         raw = form.get(name)
@@ -133,25 +757,6 @@ def _predict_payload(form):
     loan_amount = _get_float("loan_amount")
     cibil = _get_float("cibil_score")
 
-    # Preserve user-entered term fields for UI (so "10 years" stays "10 years" on results)
-    term_unit_display = (form.get("term_unit") or "months").strip().lower()
-    if term_unit_display not in {"months", "years"}:
-        term_unit_display = "months"
-    loan_term_value_display = ""
-    try:
-        raw_term_value_display = (form.get("loan_term_value") or "").strip()
-        if raw_term_value_display:
-            parsed = float(raw_term_value_display)
-            if np.isfinite(parsed) and parsed > 0:
-                if term_unit_display == "years":
-                    # Keep decimals for years (e.g., 7.5)
-                    loan_term_value_display = raw_term_value_display
-                else:
-                    # Force whole numbers for months
-                    loan_term_value_display = str(int(round(parsed)))
-    except Exception:
-        loan_term_value_display = ""
-
     # Loan term in months: prefer the hidden loan_term, but fall back to loan_term_value + unit
     # so the form still works even if JS fails.
     loan_term = None
@@ -168,23 +773,100 @@ def _predict_payload(form):
     loan_type = (form.get("loan_type") or "personal").strip().lower()
     applicant_profile = (form.get("applicant_profile") or "salaried").strip().lower()
     try:
-        interest_rate = float(form.get("interest_rate") or 10)
+        interest_rate = _get_float("interest_rate", 10)
     except Exception:
         interest_rate = 10.0
     try:
-        existing_emi = float(form.get("existing_emi") or 0)
+        existing_emi = _get_float("existing_emi", 0)
     except Exception:
         existing_emi = 0.0
 
-    input_data["income_annum"] = income
-    input_data["loan_amount"] = loan_amount
-    input_data["loan_term"] = loan_term
-    input_data["cibil_score"] = cibil
+    return {
+        "income_annum": income,
+        "loan_amount": loan_amount,
+        "cibil_score": cibil,
+        "loan_term": loan_term,
+        "loan_type": loan_type,
+        "applicant_profile": applicant_profile,
+        "interest_rate": interest_rate,
+        "existing_emi": existing_emi,
+    }
+
+
+def _health_score(cibil, loan_to_income):
+    """Financial Health Score (0-100); works on scalars and NumPy arrays alike."""
+    score = np.trunc((cibil / 900) * 60 + np.maximum(0, 1 - loan_to_income) * 40)
+    return np.clip(score, 0, 100)
+
+
+def _guardrail_profile(loan_term, dti, cibil, relaxed_credit):
+    """Return (strong_profile, acceptable_profile, credit_ok) for the hybrid guardrail.
+
+    Element-wise, so the same rules serve single requests and batches. `dti` is NaN when
+    it could not be computed.
+    """
+    reasonable_term = loan_term <= 360
+
+    # EMI-burden (DTI) is a more realistic affordability signal than loan_amount/income.
+    dti_known = np.isfinite(dti)
+    dti_ok = dti_known & (dti <= 0.35)
+    dti_strong = dti_known & (dti <= 0.25)
+
+    # Slightly relaxed credit thresholds for education/student use-cases.
+    credit_ok = np.where(relaxed_credit, cibil >= 650, cibil >= 700)
+
+    strong_profile = reasonable_term & dti_strong & credit_ok
+    acceptable_profile = reasonable_term & dti_ok & credit_ok
+    return strong_profile, acceptable_profile, credit_ok
+
+
+def _predict_payload(form, defer_explain: bool = False):
+    """Score one application and build the result page / JSON data.
+
+    With `defer_explain`, a synchronous Gemini explanation is not fetched here; its
+    `(api_key, payload)` is returned as `explain_request` for the caller to await
+    (the async serving mode in asgi.py) and merge with `_merge_explanation`.
+    """
+    bundle = _load_artifacts()
+    timing.mark("load")
+
+    application = _parse_application(form)
+    income = application["income_annum"]
+    loan_amount = application["loan_amount"]
+    cibil = application["cibil_score"]
+    loan_term = application["loan_term"]
+    loan_type = application["loan_type"]
+    applicant_profile = application["applicant_profile"]
+    interest_rate = application["interest_rate"]
+    existing_emi = application["existing_emi"]
+
+    # Preserve user-entered term fields for UI (so "10 years" stays "10 years" on results)
+    term_unit_display = (form.get("term_unit") or "months").strip().lower()
+    if term_unit_display not in {"months", "years"}:
+        term_unit_display = "months"
+    loan_term_value_display = ""
+    try:
+        raw_term_value_display = (form.get("loan_term_value") or "").strip()
+        if raw_term_value_display:
+            parsed = float(raw_term_value_display)
+            if np.isfinite(parsed) and parsed > 0:
+                if term_unit_display == "years":
+                    # Keep decimals for years (e.g., 7.5)
+                    loan_term_value_display = raw_term_value_display
+                else:
+                    # Force whole numbers for months
+                    loan_term_value_display = str(int(round(parsed)))
+    except Exception:
+        loan_term_value_display = ""
+    timing.mark("parse")
 
-    final_input = np.array(list(input_data.values())).reshape(1, -1)
+    final_input = bundle.encoder.encode_one(application, form)
+    timing.mark("encode")
 
-    model_prediction = int(model.predict(final_input)[0])
-    model_probability = float(model.predict_proba(final_input)[0][1])
+    labels, probabilities = bundle.scorer.predict(final_input)
+    model_prediction = int(labels[0])
+    model_probability = float(probabilities[0])
+    timing.mark("inference")
 
     def _format_inr(amount: float) -> str:
         try:
@@ -192,35 +874,13 @@ def _predict_payload(form):
         except Exception:
             return f"₹{amount}"
 
-    def _compute_emi(principal: float, months: float, apr: float):
-        if not np.isfinite(principal) or principal <= 0:
-            return None
-        if not np.isfinite(months) or months <= 0:
-            return None
-        if not np.isfinite(apr) or apr < 0:
-            return None
-
-        n = int(round(months))
-        if n <= 0:
-            return None
-
-        r = (apr / 100.0) / 12.0
-        if r == 0:
-            payment = principal / n
-        else:
-            pow_ = (1 + r) ** n
-            payment = principal * (r * pow_) / (pow_ - 1)
-
-        total_cost = payment * n
-        total_interest = max(0.0, total_cost - principal)
-        return float(payment), float(total_interest), float(total_cost)
-
     # Pre-compute EMI/DTI for guardrails + advisor
-    emi_tuple = _compute_emi(loan_amount, loan_term, interest_rate)
+    emi_tuple = amortization.emi_one(loan_amount, loan_term, interest_rate)
     monthly_income = (income / 12.0) if income > 0 else 0.0
     dti = None
     if emi_tuple is not None and monthly_income > 0:
         dti = float((emi_tuple[0] + max(0.0, existing_emi)) / monthly_income)
+    timing.mark("emi_dti")
 
     def _build_advisor(final_pred: int):
         lt = loan_type if loan_type in {"education", "home", "business", "personal"} else "personal"
@@ -332,8 +992,7 @@ def _predict_payload(form):
     # NEW FEATURE: Financial Health Score (rule-based)
     income_safe = max(income, 1.0)
     loan_to_income = loan_amount / income_safe
-    health_score = int((cibil / 900) * 60 + (max(0, 1 - loan_to_income) * 40))
-    health_score = max(0, min(100, health_score))
+    health_score = int(_health_score(cibil, loan_to_income))
 
     def rule_based_explain():
         reasons_local = []
@@ -359,6 +1018,7 @@ def _predict_payload(form):
         return reasons_local, suggestions_local, cibil_info_local
 
     reasons, suggestions, cibil_info = rule_based_explain()
+    timing.mark("rules")
 
     # HYBRID GUARDRAILS: Only override to APPROVE for obviously strong cases.
     guardrail_applied = False
@@ -369,19 +1029,15 @@ def _predict_payload(form):
     lt_norm = loan_type if loan_type in {"education", "home", "business", "personal"} else "personal"
     ap_norm = applicant_profile if applicant_profile in {"student", "salaried", "self_employed", "business_owner"} else "salaried"
 
-    reasonable_term = loan_term <= 360
-
-    # EMI-burden (DTI) is a more realistic affordability signal than loan_amount/income.
-    dti_ok = (dti is not None) and np.isfinite(dti) and (dti <= 0.35)
-    dti_strong = (dti is not None) and np.isfinite(dti) and (dti <= 0.25)
-
-    # Slightly relaxed credit thresholds for education/student use-cases.
-    credit_ok = cibil >= 700
-    if lt_norm == "education" and ap_norm == "student":
-        credit_ok = cibil >= 650
-
-    strong_profile = reasonable_term and dti_strong and credit_ok
-    acceptable_profile = reasonable_term and dti_ok and credit_ok
+    strong_profile, acceptable_profile, credit_ok = (
+        bool(flag)
+        for flag in _guardrail_profile(
+            loan_term,
+            dti if dti is not None else np.nan,
+            cibil,
+            lt_norm == "education" and ap_norm == "student",
+        )
+    )
 
     if model_prediction == 0 and (strong_profile or acceptable_profile):
         guardrail_applied = True
@@ -399,89 +1055,63 @@ def _predict_payload(form):
         else:
             reasons.insert(0, "Affordable EMI burden based on inputs")
         suggestions.insert(0, "Keep EMIs within comfort and maintain an emergency buffer")
+    timing.mark("guardrail")
 
     # Optional Gemini-enhanced explanations (REST; does not affect decision)
     # Prefer GEMINI_API_KEY (documented), but allow GOOGLE_API_KEY for compatibility.
     api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-    if api_key:
-        try:
-            model_name = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
-            endpoint = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
-
-            payload = {
-                "inputs": {
-                    "income_annum": income,
-                    "loan_amount": loan_amount,
-                    "loan_term_months": loan_term,
-                    "cibil_score": cibil,
-                    "loan_to_income": round(float(loan_to_income), 4),
-                },
-                "ml": {
-                    "prediction": int(model_prediction),
-                    "approval_probability": round(model_probability, 6),
-                },
-                "hybrid": {
-                    "final_prediction": int(final_prediction),
-                    "final_probability": round(final_probability, 6),
-                    "guardrail_applied": bool(guardrail_applied),
-                    "guardrail_note": guardrail_note,
-                },
-            }
-
-            prompt = (
-                "Return STRICT JSON with keys: reasons, suggestions, cibil_info. "
-                "Each value is an array of short strings (<= 14 words). "
-                "Be concrete and explainable.\n\n"
-                f"Context: {json.dumps(payload, ensure_ascii=False)}"
-            )
-
-            body = {
-                "contents": [
-                    {
-                        "role": "user",
-                        "parts": [{"text": prompt}],
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": 0.2,
-                    "maxOutputTokens": 300,
-                },
-            }
-
-            req = urllib.request.Request(
-                endpoint,
-                data=json.dumps(body).encode("utf-8"),
-                headers={"Content-Type": "application/json"},
-                method="POST",
-            )
-
-            with urllib.request.urlopen(req, timeout=6) as resp:
-                raw = resp.read().decode("utf-8", errors="replace")
-            data = json.loads(raw)
-            text = (
-                data.get("candidates", [{}])[0]
-                .get("content", {})
-                .get("parts", [{}])[0]
-                .get("text", "")
-                .strip()
-            )
+    explain_token = None
+    explain_request = None
+    explain_mode = _explain_mode(form)
+    # While the LLM circuit is open, skip enrichment entirely (rule-based reasons only).
+    if api_key and explain_mode != "off" and not GEMINI.breaker.is_open():
+        payload = {
+            "inputs": {
+                "income_annum": income,
+                "loan_amount": loan_amount,
+                "loan_term_months": loan_term,
+                "cibil_score": cibil,
+                "loan_to_income": round(float(loan_to_income), 4),
+            },
+            "ml": {
+                "prediction": int(model_prediction),
+                "approval_probability": round(model_probability, 6),
+            },
+            "hybrid": {
+                "final_prediction": int(final_prediction),
+                "final_probability": round(final_probability, 6),
+                "guardrail_applied": bool(guardrail_applied),
+                "guardrail_note": guardrail_note,
+            },
+        }
 
-            json_start = text.find("{")
-            json_end = text.rfind("}")
-            if json_start != -1 and json_end != -1 and json_end > json_start:
-                parsed = json.loads(text[json_start : json_end + 1])
-                if isinstance(parsed, dict):
+        if explain_mode == "async":
+            # Answer now with rule-based reasons; the client polls /predict_explain/<token>.
+            explain_token = _submit_explanation(api_key, payload)
+        elif defer_explain:
+            explain_request = (api_key, payload)
+        else:
+            try:
+                parsed = _gemini_explain(api_key, payload)
+                if parsed is not None:
                     reasons = parsed.get("reasons", reasons)
                     suggestions = parsed.get("suggestions", suggestions)
                     cibil_info = parsed.get("cibil_info", cibil_info)
-        except Exception:
-            # Silent fallback to rule-based explanations
-            pass
+            except Exception:
+                # Silent fallback to rule-based explanations
+                pass
+        timing.mark("llm_explain")
+
+    metrics.REGISTRY.inc("credilume_predictions_total", {
+        "decision": "approved" if final_prediction == 1 else "rejected",
+        "guardrail": "override" if guardrail_applied else "none",
+    })
 
     result = "✅ Loan Likely Approved" if final_prediction == 1 else "❌ Loan Likely Rejected"
     decision_suffix = " (Hybrid)" if guardrail_applied else ""
 
     advisor_summary, advisor_advice, advisor_warnings, emi_monthly, emi_total_interest, emi_total_cost, dti_percent = _build_advisor(final_prediction)
+    timing.mark("advisor")
 
     return {
         "prediction_text": f"{result}{decision_suffix} (Approval Probability: {round(final_probability*100,2)}%)",
@@ -507,9 +1137,998 @@ def _predict_payload(form):
         "loan_type": loan_type,
         "applicant_profile": applicant_profile,
         "existing_emi": existing_emi,
+        "explain_token": explain_token,
+        "explain_request": explain_request,
     }
 
 
+def _merge_explanation(result: dict, parsed):
+    """Apply a Gemini explanation (`_gemini_explain` output) to a `_predict_payload` result."""
+    if parsed is not None:
+        for key in ("reasons", "suggestions", "cibil_info"):
+            result[key] = parsed.get(key, result[key])
+    return result
+
+
+def _explain_cache_key(model_name: str, payload: dict) -> str:
+    # Near-identical applications share an explanation: amounts on a log scale,
+    # CIBIL in 10-point bands, tenure in 6-month bands, probability in 5% bands.
+    inputs, ml, hybrid = payload["inputs"], payload["ml"], payload["hybrid"]
+    return llm_cache.make_key(f"explain:{model_name}", {
+        "income": llm_cache.log_bucket(inputs["income_annum"]),
+        "loan": llm_cache.log_bucket(inputs["loan_amount"]),
+        "term": llm_cache.band(inputs["loan_term_months"], 6),
+        "cibil": llm_cache.band(inputs["cibil_score"], 10),
+        "ml_prediction": ml["prediction"],
+        "ml_probability": llm_cache.band(ml["approval_probability"], 0.05),
+        "final_prediction": hybrid["final_prediction"],
+        "guardrail_applied": hybrid["guardrail_applied"],
+    })
+
+
+def _gemini_explain(api_key: str, payload: dict):
+    """Ask Gemini (REST) for reasons/suggestions/cibil_info; returns a dict or None."""
+    cache_key = _explain_cache_key(GEMINI.model, payload)
+    cached = LLM_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    text = GEMINI.generate(api_key, _explain_prompt(payload), endpoint="explain", temperature=0.2, max_output_tokens=300)
+    parsed = _parse_explanation(text)
+    if parsed is not None:
+        LLM_CACHE.set(cache_key, parsed)
+    return parsed
+
+
+def _explain_prompt(payload: dict) -> str:
+    return (
+        "Return STRICT JSON with keys: reasons, suggestions, cibil_info. "
+        "Each value is an array of short strings (<= 14 words). "
+        "Be concrete and explainable.\n\n"
+        f"Context: {json.dumps(payload, ensure_ascii=False)}"
+    )
+
+
+def _parse_explanation(text: str):
+    text = text.strip()
+    json_start = text.find("{")
+    json_end = text.rfind("}")
+    if json_start != -1 and json_end != -1 and json_end > json_start:
+        parsed = json.loads(text[json_start : json_end + 1])
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ASYNC EXPLANATIONS - Gemini enrichment off the request path
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# "sync" (default) calls Gemini inside the request, "async" returns rule-based reasons
+# immediately plus a polling token, "off" never calls Gemini. Per request, the
+# `explain_mode` form field overrides this.
+GEMINI_EXPLAIN_MODE = os.environ.get("GEMINI_EXPLAIN_MODE", "sync").strip().lower()
+_EXPLAIN_MODES = {"sync", "async", "off"}
+
+_EXPLAIN_WORKERS = int(os.environ.get("GEMINI_EXPLAIN_WORKERS", "4"))
+_EXPLAIN_TTL_SECONDS = int(os.environ.get("GEMINI_EXPLAIN_TTL", "900"))
+# Results live on disk so a poll can be answered by any gunicorn worker on the host.
+_EXPLAIN_DIR = os.environ.get("GEMINI_EXPLAIN_DIR") or os.path.join(tempfile.gettempdir(), "credilume_explain")
+
+_EXPLAIN_TOKEN_RE = re.compile(r"^[0-9a-f]{32}$")
+_explain_executor = None
+_explain_executor_lock = threading.Lock()
+
+
+def _explain_mode(form) -> str:
+    mode = str(form.get("explain_mode") or GEMINI_EXPLAIN_MODE).strip().lower()
+    return mode if mode in _EXPLAIN_MODES else "sync"
+
+
+def _get_explain_executor():
+    # Created lazily so each (forked) worker gets its own threads.
+    global _explain_executor
+    if _explain_executor is None:
+        with _explain_executor_lock:
+            if _explain_executor is None:
+                _explain_executor = ThreadPoolExecutor(
+                    max_workers=_EXPLAIN_WORKERS, thread_name_prefix="gemini-explain"
+                )
+    return _explain_executor
+
+
+def _explain_path(token: str) -> str:
+    return os.path.join(_EXPLAIN_DIR, f"{token}.json")
+
+
+def _write_explanation(token: str, record: dict):
+    os.makedirs(_EXPLAIN_DIR, exist_ok=True)
+    tmp_path = f"{_explain_path(token)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False)
+    os.replace(tmp_path, _explain_path(token))
+
+
+def _prune_explanations():
+    cutoff = time.time() - _EXPLAIN_TTL_SECONDS
+    try:
+        with os.scandir(_EXPLAIN_DIR) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+
+
+def _run_explanation(token: str, api_key: str, payload: dict):
+    try:
+        parsed = _gemini_explain(api_key, payload)
+    except Exception as e:
+        _write_explanation(token, {"status": "failed", "error": str(e), "finished": time.time()})
+        return
+    if parsed is None:
+        _write_explanation(token, {"status": "failed", "error": "No usable explanation returned", "finished": time.time()})
+        return
+    _write_explanation(token, {
+        "status": "ready",
+        "reasons": parsed.get("reasons"),
+        "suggestions": parsed.get("suggestions"),
+        "cibil_info": parsed.get("cibil_info"),
+        "finished": time.time(),
+    })
+
+
+def _submit_explanation(api_key: str, payload: dict):
+    """Queue Gemini enrichment on the background executor; returns a polling token (or None)."""
+    token = uuid.uuid4().hex
+    try:
+        _write_explanation(token, {"status": "pending", "created": time.time()})
+        _get_explain_executor().submit(_run_explanation, token, api_key, payload)
+    except Exception:
+        return None
+    if random.random() < 0.01:
+        _prune_explanations()
+    return token
+
+
+@app.route("/predict_explain/<token>")
+def predict_explain(token):
+    """Poll for the Gemini-enriched explanation of an async /predict_json call."""
+    if not _EXPLAIN_TOKEN_RE.match(token):
+        return jsonify({"ok": False, "error": "Invalid token"}), 400
+    try:
+        with open(_explain_path(token), encoding="utf-8") as f:
+            record = json.load(f)
+    except FileNotFoundError:
+        return jsonify({"ok": False, "error": "Unknown or expired token"}), 404
+    except Exception as e:
+        # A concurrent writer uses os.replace, so this is rare; ask the client to retry.
+        return jsonify({"ok": True, "status": "pending", "detail": str(e)})
+    return jsonify({"ok": True, **record})
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BATCH SCORING - Vectorized inference for bulk re-scoring
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Upper bound on rows per /predict_batch call (protects worker memory).
+PREDICT_BATCH_MAX_ROWS = int(os.environ.get("PREDICT_BATCH_MAX_ROWS", "200000"))
+# Upper bound on the request body; checked before anything is parsed.
+PREDICT_BATCH_MAX_BYTES = int(os.environ.get("PREDICT_BATCH_MAX_BYTES", str(64 * 1024 * 1024)))
+
+_NDJSON_MIMETYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+
+def _dti_vec(emi, existing_emi, income):
+    """EMI burden (new EMI + existing EMIs) over monthly income; NaN where unknown."""
+    monthly_income = np.where(income > 0, income / 12.0, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(
+            np.isfinite(emi) & (monthly_income > 0),
+            (emi + np.maximum(0.0, existing_emi)) / monthly_income,
+            np.nan,
+        )
+
+
+def _hybrid_decision(model_prediction, model_probability, loan_term, dti, cibil, relaxed_credit):
+    """Vectorized hybrid guardrail: (final_prediction, final_probability, guardrail_applied)."""
+    strong_profile, acceptable_profile, _ = _guardrail_profile(loan_term, dti, cibil, relaxed_credit)
+    guardrail_applied = (model_prediction == 0) & (strong_profile | acceptable_profile)
+    final_prediction = np.where(guardrail_applied, 1, model_prediction)
+    floor = np.where(strong_profile, 0.80, 0.70)
+    final_probability = np.where(guardrail_applied, np.maximum(model_probability, floor), model_probability)
+    return final_prediction, final_probability, guardrail_applied
+
+
+def _read_batch_rows():
+    """Read the application rows of a /predict_batch request (JSON array or NDJSON).
+
+    Oversized requests are rejected before they are parsed: by Content-Length when it is
+    sent, otherwise as soon as PREDICT_BATCH_MAX_BYTES have been read, and NDJSON as soon
+    as it goes past PREDICT_BATCH_MAX_ROWS lines.
+    """
+    if request.content_length is not None and request.content_length > PREDICT_BATCH_MAX_BYTES:
+        raise ValueError(f"Batch too large: {request.content_length} bytes (max {PREDICT_BATCH_MAX_BYTES})")
+
+    if request.mimetype in _NDJSON_MIMETYPES:
+        rows, size = [], 0
+        for line in request.stream:
+            size += len(line)
+            if size > PREDICT_BATCH_MAX_BYTES:
+                raise ValueError(f"Batch too large: over {PREDICT_BATCH_MAX_BYTES} bytes")
+            line = line.strip()
+            if line:
+                if len(rows) == PREDICT_BATCH_MAX_ROWS:
+                    raise ValueError(f"Batch too large: over {PREDICT_BATCH_MAX_ROWS} rows (max {PREDICT_BATCH_MAX_ROWS})")
+                rows.append(json.loads(line))
+        return rows, True
+
+    data = None
+    if request.is_json:
+        body = request.stream.read(PREDICT_BATCH_MAX_BYTES + 1)
+        if len(body) > PREDICT_BATCH_MAX_BYTES:
+            raise ValueError(f"Batch too large: over {PREDICT_BATCH_MAX_BYTES} bytes")
+        try:
+            data = json.loads(body)
+        except ValueError:
+            pass
+    if isinstance(data, dict):
+        data = data.get("applications")
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of applications (or NDJSON lines)")
+    return data, False
+
+
+def _score_batch(rows):
+    """Score many applications with a single model call.
+
+    Returns one result dict per input row, in order. Rows that fail to parse get
+    `{"ok": False, "error": ...}` instead of failing the whole batch.
+    """
+    bundle = _load_artifacts()
+
+    results = [None] * len(rows)
+    parsed = []
+    parsed_index = []
+    for i, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("Each application must be a JSON object")
+            parsed.append(_parse_application(row))
+            parsed_index.append(i)
+        except Exception as e:
+            results[i] = {"index": i, "ok": False, "error": str(e)}
+
+    if parsed:
+        def _column(name):
+            return np.fromiter((a[name] for a in parsed), dtype=np.float64, count=len(parsed))
+
+        income = _column("income_annum")
+        loan_amount = _column("loan_amount")
+        loan_term = _column("loan_term")
+        cibil = _column("cibil_score")
+        interest_rate = _column("interest_rate")
+        existing_emi = _column("existing_emi")
+        relaxed_credit = np.fromiter(
+            (a["loan_type"] == "education" and a["applicant_profile"] == "student" for a in parsed),
+            dtype=bool,
+            count=len(parsed),
+        )
+
+        final_input = bundle.encoder.encode_batch(
+            {
+                "income_annum": income,
+                "loan_amount": loan_amount,
+                "loan_term": loan_term,
+                "cibil_score": cibil,
+            },
+            {column: [rows[i].get(column) for i in parsed_index] for column in bundle.encoder.categorical},
+        )
+
+        model_prediction, model_probability = bundle.scorer.predict(final_input)
+        model_prediction = model_prediction.astype(np.int64)
+
+        emi, total_interest, total_cost = amortization.emi(loan_amount, loan_term, interest_rate)
+        dti = _dti_vec(emi, existing_emi, income)
+
+        loan_to_income = loan_amount / np.maximum(income, 1.0)
+        health_score = _health_score(cibil, loan_to_income).astype(np.int64)
+
+        final_prediction, final_probability, guardrail_applied = _hybrid_decision(
+            model_prediction, model_probability, loan_term, dti, cibil, relaxed_credit
+        )
+
+        with np.errstate(invalid="ignore"):
+            dti_percent = np.clip(np.rint(dti * 100), 0, 200)
+
+        def _nullable(values, cast):
+            return [cast(v) if np.isfinite(v) else None for v in values.tolist()]
+
+        columns_out = zip(
+            parsed_index,
+            final_prediction.tolist(),
+            final_probability.tolist(),
+            model_prediction.tolist(),
+            model_probability.tolist(),
+            guardrail_applied.tolist(),
+            _nullable(emi, lambda v: round(v, 2)),
+            _nullable(total_interest, lambda v: round(v, 2)),
+            _nullable(total_cost, lambda v: round(v, 2)),
+            _nullable(dti_percent, int),
+            health_score.tolist(),
+        )
+        for i, pred, prob, m_pred, m_prob, applied, emi_m, emi_i, emi_t, dti_p, health in columns_out:
+            result = {
+                "index": i,
+                "ok": True,
+                "prediction": pred,
+                "approval_probability": round(prob, 6),
+                "model_prediction": m_pred,
+                "model_probability": round(m_prob, 6),
+                "guardrail_applied": applied,
+                "emi_monthly": emi_m,
+                "emi_total_interest": emi_i,
+                "emi_total_cost": emi_t,
+                "dti_percent": dti_p,
+                "health_score": health,
+            }
+            if "id" in rows[i]:
+                result["id"] = rows[i]["id"]
+            results[i] = result
+
+    return results
+
+
+@app.route("/predict_batch", methods=["POST"])
+def predict_batch():
+    """Score a JSON array (or NDJSON stream) of applications in one vectorized pass."""
+    try:
+        rows, ndjson = _read_batch_rows()
+        if len(rows) > PREDICT_BATCH_MAX_ROWS:
+            raise ValueError(f"Batch too large: {len(rows)} rows (max {PREDICT_BATCH_MAX_ROWS})")
+        results = _score_batch(rows)
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    if ndjson:
+        def _lines():
+            for result in results:
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+
+        return Response(_lines(), mimetype="application/x-ndjson")
+
+    return jsonify({"ok": True, "count": len(results), "results": results})
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# WHAT-IF SCENARIOS - Amount x tenure x rate grids in one vectorized pass
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Upper bound on grid cells per /predict_scenarios call.
+SCENARIO_MAX_CELLS = int(os.environ.get("SCENARIO_MAX_CELLS", "100000"))
+
+# Grid axes, in the order of the returned matrices.
+_SCENARIO_AXES = ("loan_amount", "loan_term", "interest_rate")
+
+
+def _scenario_axis(name: str, spec):
+    """Values of one grid axis from a list, `{"values": [...]}` or `{"start", "stop", "step"}`.
+
+    Ranges include `stop`. `loan_term` specs may add `"unit": "years"`.
+    """
+    unit = "months"
+    if isinstance(spec, dict):
+        unit = str(spec.get("unit") or "months").strip().lower()
+        if "values" in spec:
+            values = np.asarray(spec["values"], dtype=np.float64)
+        else:
+            start, stop = float(spec["start"]), float(spec["stop"])
+            step = float(spec.get("step") or 0)
+            if step <= 0:
+                raise ValueError(f"{name}: `step` must be positive")
+            count = int(np.floor((stop - start) / step + 1e-9)) + 1
+            if count > SCENARIO_MAX_CELLS:
+                raise ValueError(f"{name}: too many values ({count})")
+            values = start + step * np.arange(max(count, 0))
+    elif isinstance(spec, (list, tuple)):
+        values = np.asarray(spec, dtype=np.float64)
+    else:
+        values = np.asarray([spec], dtype=np.float64)
+
+    if name == "loan_term" and unit == "years":
+        values = np.round(values * 12)
+    if values.ndim != 1 or values.size == 0 or not np.all(np.isfinite(values)):
+        raise ValueError(f"{name}: expected a non-empty list of numbers")
+    if name in ("loan_amount", "loan_term") and np.any(values <= 0):
+        raise ValueError(f"{name}: values must be positive")
+    return values
+
+
+def _scenario_grid(application: dict, categorical, axes: dict):
+    """Evaluate every (amount, term, rate) combination for one applicant.
+
+    The model only sees amount and term, so it scores the amount x term plane once and
+    the result is broadcast over rates; EMI, DTI and the guardrail run on the full grid.
+    Returns a dict of arrays shaped (len(amounts), len(terms), len(rates)).
+    """
+    bundle = _load_artifacts()
+    amounts = axes["loan_amount"][:, None, None]
+    terms = axes["loan_term"][None, :, None]
+    rates = axes["interest_rate"][None, None, :]
+
+    base = bundle.encoder.encode_one(application, categorical).copy()
+    plane = np.repeat(base, amounts.size * terms.size, axis=0)
+    plane[:, bundle.encoder.index["loan_amount"]] = np.repeat(axes["loan_amount"], terms.size)
+    plane[:, bundle.encoder.index["loan_term"]] = np.tile(axes["loan_term"], amounts.size)
+    model_prediction, model_probability = bundle.scorer.predict(plane)
+    model_prediction = model_prediction.astype(np.int64).reshape(amounts.size, terms.size, 1)
+    model_probability = model_probability.reshape(amounts.size, terms.size, 1)
+
+    emi, total_interest, total_cost = amortization.emi(amounts, terms, rates)
+    dti = _dti_vec(emi, application["existing_emi"], application["income_annum"])
+    relaxed_credit = application["loan_type"] == "education" and application["applicant_profile"] == "student"
+    shape = emi.shape
+    final_prediction, final_probability, guardrail_applied = _hybrid_decision(
+        np.broadcast_to(model_prediction, shape),
+        np.broadcast_to(model_probability, shape),
+        np.broadcast_to(terms, shape),
+        dti,
+        application["cibil_score"],
+        relaxed_credit,
+    )
+    return {
+        "emi": emi,
+        "total_interest": total_interest,
+        "dti": dti,
+        "model_probability": np.broadcast_to(model_probability, shape),
+        "approval_probability": final_probability,
+        "prediction": final_prediction,
+        "guardrail_applied": guardrail_applied,
+    }
+
+
+@app.route("/predict_scenarios", methods=["POST"])
+def predict_scenarios():
+    """Score one application over a grid of loan amounts, tenures and interest rates.
+
+    Body: `{"application": {...}, "ranges": {"loan_amount": ..., "loan_term": ...,
+    "interest_rate": ...}}`; an axis without a range keeps the application's value.
+    Matrices are indexed [amount][term][rate].
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object with `application` and `ranges`")
+        application = dict(data.get("application") or {})
+        ranges = data.get("ranges") or {}
+        unknown = set(ranges) - set(_SCENARIO_AXES)
+        if unknown:
+            raise ValueError(f"Unsupported range(s): {sorted(unknown)}; use {list(_SCENARIO_AXES)}")
+
+        axes = {}
+        for name in _SCENARIO_AXES:
+            if name in ranges:
+                axes[name] = _scenario_axis(name, ranges[name])
+                application.setdefault(name, float(axes[name][0]))
+        parsed = _parse_application(application)
+        for name in _SCENARIO_AXES:
+            axes.setdefault(name, np.array([parsed[name]], dtype=np.float64))
+
+        cells = int(np.prod([axes[name].size for name in _SCENARIO_AXES]))
+        if cells > SCENARIO_MAX_CELLS:
+            raise ValueError(f"Grid too large: {cells} cells (max {SCENARIO_MAX_CELLS})")
+        grid = _scenario_grid(parsed, application, axes)
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    def _matrix(values, decimals):
+        with np.errstate(invalid="ignore"):
+            rounded = np.round(values, decimals)
+        # NaN (no EMI / DTI for that cell) becomes null.
+        return np.where(np.isfinite(rounded), rounded, None).tolist()
+
+    return jsonify({
+        "ok": True,
+        "dims": list(_SCENARIO_AXES),
+        "axes": {name: axes[name].tolist() for name in _SCENARIO_AXES},
+        "cells": cells,
+        "emi_monthly": _matrix(grid["emi"], 2),
+        "emi_total_interest": _matrix(grid["total_interest"], 2),
+        "dti_percent": _matrix(grid["dti"] * 100, 1),
+        "model_probability": _matrix(grid["model_probability"], 6),
+        "approval_probability": _matrix(grid["approval_probability"], 6),
+        "prediction": grid["prediction"].astype(np.int64).tolist(),
+        "guardrail_applied": grid["guardrail_applied"].tolist(),
+    })
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REVERSE SOLVER - Affordability limits and the model's approval boundary
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Upper bound on applicants per /solve call.
+SOLVE_MAX_ROWS = int(os.environ.get("SOLVE_MAX_ROWS", "50000"))
+# EMI burden the hybrid guardrail accepts (see _guardrail_profile).
+_GUARDRAIL_MAX_DTI = 0.35
+# Search brackets when the model is not linear and has to be bisected.
+_SOLVE_AMOUNT_RANGE = (1.0, 1e11)
+_CIBIL_RANGE = (300.0, 900.0)
+
+
+def _model_boundary(bundle, X, feature: str, bracket, iterations: int = 60):
+    """Value of `feature` at which each row's approval probability crosses the threshold.
+
+    Returns (boundary, direction): direction is +1 where the model approves values above
+    the boundary, -1 below, 0 where the feature does not move the decision. Linear
+    scorers are solved exactly on the logit; other estimators are bisected inside
+    `bracket`. There the boundary is NaN when the decision never flips, and direction
+    is then +1 / -1 if every value in the bracket is approved / rejected.
+    """
+    scorer = bundle.scorer
+    column = bundle.encoder.index[feature]
+    threshold = min(max(scorer.threshold, 1e-12), 1 - 1e-12)
+    logit = np.log(threshold / (1 - threshold))
+
+    if scorer.coef is not None:
+        weight = scorer.coef[column]
+        if weight == 0:
+            return np.full(X.shape[0], np.nan), np.zeros(X.shape[0])
+        boundary = X[:, column] + (logit - scorer.decision_function(X)) / weight
+        return boundary, np.full(X.shape[0], np.sign(weight))
+
+    def _approved(values):
+        probe = X.copy()
+        probe[:, column] = values
+        return scorer.predict_proba(probe) > threshold
+
+    lo = np.full(X.shape[0], float(bracket[0]))
+    hi = np.full(X.shape[0], float(bracket[1]))
+    at_lo, at_hi = _approved(lo), _approved(hi)
+    flips = at_lo != at_hi
+    for _ in range(iterations):
+        mid = (lo + hi) / 2
+        same_as_lo = _approved(mid) == at_lo
+        lo = np.where(same_as_lo, mid, lo)
+        hi = np.where(same_as_lo, hi, mid)
+    boundary = np.where(flips, (lo + hi) / 2, np.nan)
+    direction = np.where(flips, np.where(at_hi, 1.0, -1.0), np.where(at_hi, 1.0, -1.0))
+    return boundary, direction
+
+
+def _solve_batch(rows, max_dti: float = _GUARDRAIL_MAX_DTI):
+    """Affordability limits and approval boundaries for many applicants in one pass.
+
+    Per applicant: the EMI budget (max_dti of monthly income minus existing EMIs), and
+    what it allows in closed form (max amount at the given term and rate, min term
+    and break-even rate for the given amount). Also the largest amount and the lowest
+    CIBIL score the hybrid decision (model or guardrail) approves.
+    """
+    bundle = _load_artifacts()
+
+    results = [None] * len(rows)
+    parsed, parsed_index = [], []
+    for i, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("Each application must be a JSON object")
+            parsed.append(_parse_application(row))
+            parsed_index.append(i)
+        except Exception as e:
+            results[i] = {"index": i, "ok": False, "error": str(e)}
+    if not parsed:
+        return results
+
+    def _column(name):
+        return np.fromiter((a[name] for a in parsed), dtype=np.float64, count=len(parsed))
+
+    income = _column("income_annum")
+    loan_amount = _column("loan_amount")
+    loan_term = _column("loan_term")
+    cibil = _column("cibil_score")
+    interest_rate = _column("interest_rate")
+    existing_emi = np.maximum(0.0, _column("existing_emi"))
+    relaxed_credit = np.fromiter(
+        (a["loan_type"] == "education" and a["applicant_profile"] == "student" for a in parsed),
+        dtype=bool,
+        count=len(parsed),
+    )
+
+    # Closed-form affordability limits.
+    emi_budget = np.maximum(0.0, np.where(income > 0, income / 12.0, 0.0) * max_dti - existing_emi)
+    max_amount_emi = amortization.max_principal(emi_budget, loan_term, interest_rate)
+    min_term = amortization.min_months(loan_amount, emi_budget, interest_rate)
+    break_even_rate = amortization.max_rate(loan_amount, loan_term, emi_budget)
+
+    X = bundle.encoder.encode_batch(
+        {"income_annum": income, "loan_amount": loan_amount, "loan_term": loan_term, "cibil_score": cibil},
+        {column: [rows[i].get(column) for i in parsed_index] for column in bundle.encoder.categorical},
+    )
+
+    # Largest approvable amount: model approvals united with the guardrail's DTI range.
+    guardrail_terms = loan_term <= 360
+    credit_ok = np.where(relaxed_credit, cibil >= 650, cibil >= 700)
+    guardrail_amount = np.where(
+        guardrail_terms & credit_ok,
+        amortization.max_principal(income / 12.0 * _GUARDRAIL_MAX_DTI - existing_emi, loan_term, interest_rate),
+        0.0,
+    )
+    amount_boundary, amount_direction = _model_boundary(bundle, X, "loan_amount", _SOLVE_AMOUNT_RANGE)
+    unbounded = amount_direction > 0
+    model_max_amount = np.where(amount_direction < 0, np.nan_to_num(amount_boundary, nan=0.0), 0.0)
+    max_approvable = np.maximum(np.maximum(model_max_amount, 0.0), guardrail_amount)
+    # Only report a boundary inside the search bracket (both solve paths agree there).
+    with np.errstate(invalid="ignore"):
+        in_bracket = (amount_boundary >= _SOLVE_AMOUNT_RANGE[0]) & (amount_boundary <= _SOLVE_AMOUNT_RANGE[1])
+    amount_boundary = np.where(in_bracket, amount_boundary, np.nan)
+    amount_direction = np.where(in_bracket, amount_direction, 0.0)
+
+    # Lowest approvable CIBIL at the requested amount.
+    emi_now = amortization.emi(loan_amount, loan_term, interest_rate)[0]
+    dti_ok = _dti_vec(emi_now, existing_emi, income) <= _GUARDRAIL_MAX_DTI
+    guardrail_cibil = np.where(guardrail_terms & dti_ok, np.where(relaxed_credit, 650.0, 700.0), np.inf)
+    cibil_boundary, cibil_direction = _model_boundary(bundle, X, "cibil_score", _CIBIL_RANGE)
+    # The model needs a score strictly above its boundary; the next whole point.
+    model_min_cibil = np.where(
+        cibil_direction > 0,
+        np.where(np.isnan(cibil_boundary), _CIBIL_RANGE[0], np.floor(cibil_boundary) + 1),
+        np.inf,
+    )
+    min_cibil = np.maximum(np.minimum(model_min_cibil, guardrail_cibil), _CIBIL_RANGE[0])
+    min_cibil = np.where(min_cibil <= _CIBIL_RANGE[1], min_cibil, np.nan)
+
+    def _nullable(values, cast):
+        return [cast(v) if np.isfinite(v) else None for v in np.asarray(values, dtype=np.float64).tolist()]
+
+    columns_out = zip(
+        parsed_index,
+        _nullable(emi_budget, lambda v: round(v, 2)),
+        _nullable(max_amount_emi, lambda v: round(v, 2)),
+        _nullable(min_term, int),
+        _nullable(break_even_rate, lambda v: round(v, 4)),
+        _nullable(amount_boundary, lambda v: round(v, 2)),
+        amount_direction.tolist(),
+        unbounded.tolist(),
+        _nullable(max_approvable, lambda v: round(v, 2)),
+        _nullable(min_cibil, int),
+    )
+    for i, budget, max_amt, term, rate, boundary, direction, is_unbounded, approvable, low_cibil in columns_out:
+        result = {
+            "index": i,
+            "ok": True,
+            "emi_budget": budget,
+            "max_loan_amount": max_amt,
+            "min_loan_term": term,
+            "break_even_rate": rate,
+            "model_amount_boundary": boundary,
+            "model_approves_amounts": {1.0: "above", -1.0: "below"}.get(direction),
+            "max_approvable_amount": None if is_unbounded else approvable,
+            "max_approvable_unbounded": is_unbounded,
+            "min_cibil_score": low_cibil,
+        }
+        if "id" in rows[i]:
+            result["id"] = rows[i]["id"]
+        results[i] = result
+    return results
+
+
+@app.route("/solve", methods=["POST"])
+def solve():
+    """Reverse questions for one application, or a batch as `{"applications": [...]}`.
+
+    `max_dti` (default 0.35, the guardrail's limit) sets the EMI budget.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object (one application, or {\"applications\": [...]})")
+        max_dti = data.get("max_dti")
+        max_dti = _GUARDRAIL_MAX_DTI if max_dti is None else float(max_dti)
+        if not 0 < max_dti <= 1:
+            raise ValueError("max_dti must be in (0, 1]")
+        batch = "applications" in data
+        rows = data["applications"] if batch else [data]
+        if not isinstance(rows, list):
+            raise ValueError("`applications` must be a JSON array")
+        if len(rows) > SOLVE_MAX_ROWS:
+            raise ValueError(f"Batch too large: {len(rows)} rows (max {SOLVE_MAX_ROWS})")
+        results = _solve_batch(rows, max_dti)
+        if not batch and not results[0]["ok"]:
+            raise ValueError(results[0]["error"])
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    if not batch:
+        single = results[0]
+        del single["index"]
+        return jsonify(single)
+    return jsonify({"ok": True, "count": len(results), "results": results})
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# AMORTIZATION SCHEDULES - Month-by-month schedules for one or many loans
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Upper bounds per /schedule call (protect worker memory); CSV output is streamed.
+SCHEDULE_MAX_LOANS = int(os.environ.get("SCHEDULE_MAX_LOANS", "10000"))
+SCHEDULE_MAX_MONTHS = int(os.environ.get("SCHEDULE_MAX_MONTHS", "600"))
+# Loans x periods in one JSON page; page with offset/limit or use format=csv beyond that.
+SCHEDULE_MAX_JSON_ROWS = int(os.environ.get("SCHEDULE_MAX_JSON_ROWS", "200000"))
+# Cells (loans x periods) computed per CSV chunk.
+_SCHEDULE_CSV_CELLS = 60000
+
+
+def _parse_schedule_loan(source):
+    """(loan_amount, months, annual_rate) of one loan; the term may be given in years."""
+    def _get_float(name, default=None):
+        raw = source.get(name)
+        if raw is None or str(raw).strip() == "":
+            if default is None:
+                raise ValueError(f"Missing required field: {name}")
+            return float(default)
+        return float(raw)
+
+    loan_amount = _get_float("loan_amount")
+    raw_term = source.get("loan_term")
+    if raw_term is not None and str(raw_term).strip() != "":
+        months = float(raw_term)
+    else:
+        term_value = _get_float("loan_term_value")
+        unit = (source.get("term_unit") or "months").strip().lower()
+        months = float(round(term_value * 12)) if unit == "years" else float(round(term_value))
+    interest_rate = _get_float("interest_rate", 10)
+
+    if amortization.emi_one(loan_amount, months, interest_rate) is None:
+        raise ValueError("loan_amount and loan_term must be positive and interest_rate non-negative")
+    if round(months) > SCHEDULE_MAX_MONTHS:
+        raise ValueError(f"loan_term too long: {months:g} months (max {SCHEDULE_MAX_MONTHS})")
+    return loan_amount, months, interest_rate
+
+
+def _read_schedule_request():
+    """Loans and options of a /schedule request.
+
+    GET takes one loan from the query string. POST takes one loan as a JSON object, or
+    many as `{"loans": [...]}`; query-string options (offset, limit, format) also apply.
+    """
+    if request.method == "GET":
+        return [request.args], request.args, False
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object (one loan, or {\"loans\": [...]})")
+    options = {**request.args.to_dict(), **{k: v for k, v in data.items() if k != "loans"}}
+    loans = data.get("loans")
+    if loans is None:
+        return [data], options, False
+    if not isinstance(loans, list):
+        raise ValueError("`loans` must be a JSON array")
+    return loans, options, True
+
+
+def _csv_field(value) -> str:
+    text = str(value)
+    if any(c in text for c in ',"\r\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def _schedule_csv(ids, principal, months, rate, offset, stop, errors=None):
+    """Stream `loan,month,emi,principal,interest,balance,error` rows, a chunk of loans at a time.
+
+    A loan that failed validation gets one row with only `loan` and `error` set, in its
+    place in the batch; `error` is empty on schedule rows.
+    """
+    errors = errors or {}
+    yield "loan,month,emi,principal,interest,balance,error\n"
+    loans_per_chunk = max(1, _SCHEDULE_CSV_CELLS // max(1, stop - offset))
+    for first in range(0, len(principal), loans_per_chunk):
+        last = first + loans_per_chunk
+        block = amortization.schedule_block(principal[first:last], months[first:last], rate[first:last], offset, stop)
+        columns = [block[name].tolist() for name in amortization.COLUMNS]
+        lines = []
+        for i, (month_row, emi_row, prin_row, int_row, bal_row) in enumerate(zip(*columns)):
+            loan_id = _csv_field(ids[first + i])
+            if first + i in errors:
+                lines.append(f"{loan_id},,,,,,{_csv_field(errors[first + i])}\n")
+                continue
+            for month, emi_value, prin, intr, bal in zip(month_row, emi_row, prin_row, int_row, bal_row):
+                if month == month:  # skip NaN cells past this loan's term
+                    lines.append(f"{loan_id},{int(month)},{emi_value:.2f},{prin:.2f},{intr:.2f},{bal:.2f},\n")
+        yield "".join(lines)
+
+
+@app.route("/schedule", methods=["GET", "POST"])
+def schedule():
+    """Amortization schedule(s) as paged JSON, or streamed CSV with `format=csv`."""
+    try:
+        loans, options, batch = _read_schedule_request()
+        if len(loans) > SCHEDULE_MAX_LOANS:
+            raise ValueError(f"Too many loans: {len(loans)} (max {SCHEDULE_MAX_LOANS})")
+
+        n_loans = len(loans)
+        principal = np.full(n_loans, np.nan)
+        months = np.full(n_loans, np.nan)
+        rate = np.full(n_loans, np.nan)
+        ids, errors = [], {}
+        for i, loan in enumerate(loans):
+            ids.append(loan.get("id", i) if batch and isinstance(loan, dict) else i)
+            try:
+                if not hasattr(loan, "get"):
+                    raise ValueError("Each loan must be a JSON object")
+                principal[i], months[i], rate[i] = _parse_schedule_loan(loan)
+            except Exception as e:
+                if not batch:
+                    raise
+                errors[i] = str(e)
+
+        offset = max(0, int(options.get("offset") or 0))
+        longest = int(np.nanmax(np.round(months))) if n_loans and not np.all(np.isnan(months)) else 0
+        limit = options.get("limit")
+        if limit not in (None, "") and int(limit) < 1:
+            raise ValueError("limit must be at least 1")
+        stop = longest if limit in (None, "") else min(longest, offset + int(limit))
+        stop = max(offset, stop)
+        fmt = str(options.get("format") or "").lower()
+        if not fmt and request.accept_mimetypes.best == "text/csv":
+            fmt = "csv"
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    if fmt == "csv":
+        return Response(
+            _schedule_csv(ids, principal, months, rate, offset, stop, errors),
+            mimetype="text/csv",
+            headers={"Content-Disposition": "attachment; filename=schedule.csv"},
+        )
+
+    if n_loans * (stop - offset) > SCHEDULE_MAX_JSON_ROWS:
+        return jsonify({
+            "ok": False,
+            "error": f"Page too large: {n_loans} loans x {stop - offset} months "
+                     f"(max {SCHEDULE_MAX_JSON_ROWS} rows); lower `limit` or use format=csv",
+        }), 400
+
+    payment, total_interest, total_cost = amortization.emi(principal, months, rate)
+    block = amortization.schedule_block(principal, months, rate, offset, stop)
+    page = {"offset": offset, "limit": stop - offset, "next_offset": stop if stop < longest else None}
+
+    schedules = []
+    for i in range(n_loans):
+        if i in errors:
+            schedules.append({"index": i, "ok": False, "error": errors[i]})
+            continue
+        item = {
+            "index": i,
+            "ok": True,
+            "loan_amount": float(principal[i]),
+            "loan_term": int(round(months[i])),
+            "interest_rate": float(rate[i]),
+            "emi": round(float(payment[i]), 2),
+            "total_interest": round(float(total_interest[i]), 2),
+            "total_cost": round(float(total_cost[i]), 2),
+            "rows": amortization.schedule_rows(block, i),
+        }
+        if batch and isinstance(loans[i], dict) and "id" in loans[i]:
+            item["id"] = loans[i]["id"]
+        schedules.append(item)
+
+    if not batch:
+        single = schedules[0]
+        del single["index"]
+        return jsonify({**single, **page})
+    return jsonify({"ok": True, "count": n_loans, **page, "schedules": schedules})
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LOAN SIMULATION - Prepayments, EMI step-ups and floating-rate paths
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Upper bound on Monte Carlo rate paths per /simulate call.
+SIMULATION_MAX_PATHS = int(os.environ.get("SIMULATION_MAX_PATHS", "20000"))
+
+
+def _simulation_plan(data: dict) -> dict:
+    """Keyword arguments for `simulation.simulate` from a /simulate body."""
+    lump_sums = {}
+    for item in data.get("prepayments") or []:
+        month = int(item["month"])
+        lump_sums[month] = lump_sums.get(month, 0.0) + float(item["amount"])
+    recurring = data.get("recurring_prepayment") or {}
+    step_up = data.get("step_up") or {}
+    plan = {
+        "lump_sums": lump_sums,
+        "recurring_amount": float(recurring.get("amount") or 0),
+        "recurring_every": int(recurring.get("every") or 1),
+        "recurring_start": int(recurring.get("start") or 1),
+        "recurring_stop": int(recurring["stop"]) if recurring.get("stop") else None,
+        "step_up_percent": float(step_up.get("percent") or 0),
+        "step_up_every": int(step_up.get("every") or 12),
+        "on_prepay": str(data.get("prepayment_effect") or "tenure"),
+        "on_reset": str(data.get("rate_reset_effect") or "tenure"),
+    }
+    if data.get("max_months"):
+        plan["max_months"] = min(int(data["max_months"]), SCHEDULE_MAX_MONTHS)
+    return plan
+
+
+def _simulation_rates(data: dict, horizon: int, interest_rate: float):
+    """Rate input for `simulation.simulate`: fixed, explicit resets, or Monte Carlo paths.
+
+    Paths cover `horizon` months, the months the simulation runs for.
+    """
+    monte_carlo = data.get("monte_carlo")
+    if monte_carlo:
+        n_paths = int(monte_carlo.get("paths") or 1000)
+        if not 1 <= n_paths <= SIMULATION_MAX_PATHS:
+            raise ValueError(f"monte_carlo.paths must be between 1 and {SIMULATION_MAX_PATHS}")
+        options = {
+            key: float(monte_carlo[key])
+            for key in ("volatility", "drift", "mean_reversion", "long_run_rate", "floor", "cap")
+            if monte_carlo.get(key) is not None
+        }
+        return simulation.rate_paths(
+            interest_rate, horizon, n_paths,
+            reset_every=int(monte_carlo.get("reset_every") or 12),
+            seed=monte_carlo.get("seed"),
+            **options,
+        )
+    resets = data.get("rate_resets")
+    if resets:
+        return simulation.reset_path(
+            interest_rate, horizon, {int(item["month"]): float(item["rate"]) for item in resets}
+        )
+    return interest_rate
+
+
+def _simulation_view(result: dict, single: bool) -> dict:
+    """Per-path simulation arrays as JSON: plain values for one path, else mean/percentiles."""
+    if single:
+        return {
+            key: int(values[0]) if key in {"months", "months_saved"} else round(float(values[0]), 2)
+            for key, values in result.items()
+        }
+    return {key: simulation.summarize(values) for key, values in result.items()}
+
+
+@app.route("/simulate", methods=["POST"])
+def simulate():
+    """Simulate prepayments, EMI step-ups and rate resets against the plain loan.
+
+    Rates are fixed unless `rate_resets` ([{month, rate}]) or `monte_carlo` (paths,
+    reset_every, volatility, drift, mean_reversion, long_run_rate, floor, cap, seed) is
+    given; Monte Carlo results are reported as mean and 5th/50th/95th percentiles.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        loan_amount, months, interest_rate = _parse_schedule_loan(data)
+        months = int(round(months))
+        plan = _simulation_plan(data)
+        rates = _simulation_rates(data, simulation.horizon_months(months, plan.get("max_months")), interest_rate)
+        outcome = simulation.compare(loan_amount, months, rates, **plan)
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    single = np.ndim(rates) < 2
+    response = {
+        "ok": True,
+        "loan_amount": loan_amount,
+        "loan_term": months,
+        "interest_rate": interest_rate,
+        "baseline": _simulation_view(outcome["baseline"], single),
+        "plan": _simulation_view(outcome["plan"], single),
+        "savings": _simulation_view(
+            {"interest_saved": outcome["interest_saved"], "months_saved": outcome["months_saved"]}, single
+        ),
+    }
+    if not single:
+        response["paths"] = int(np.shape(rates)[0])
+    return jsonify(response)
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # FINANCIAL ADVISOR - Personalized Tips & Strategies via Gemini API
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -668,50 +2287,71 @@ FALLBACK_ADVICE = {
 def smart_advisor():
     """Get personalized financial advice based on loan type using Gemini AI."""
     try:
-        data = request.get_json() or {}
-        loan_type = data.get("loan_type", "personal").lower().strip()
-        loan_amount = data.get("loan_amount", 0)
-        income = data.get("income", 0)
-        credit_score = data.get("credit_score", 700)
-        currency = data.get("currency", "USD")
-        applicant_profile = data.get("applicant_profile", "salaried")
-        
-        # Normalize loan type
-        if loan_type not in FALLBACK_ADVICE:
-            loan_type = "personal"
-        
+        inputs = _smart_advisor_inputs(request.get_json() or {})
+        advice = None
         # Try Gemini API first
         if GEMINI_API_KEY:
             try:
-                response = _get_gemini_advice(loan_type, loan_amount, income, credit_score, currency, applicant_profile)
-                if response:
-                    return jsonify({
-                        "ok": True,
-                        "source": "gemini",
-                        "loan_type": loan_type,
-                        **response
-                    })
+                advice = _get_gemini_advice(**inputs)
             except Exception as e:
-                print(f"Gemini API error: {e}")
-        
-        # Fallback to static data
-        fallback = FALLBACK_ADVICE.get(loan_type, FALLBACK_ADVICE["personal"])
-        return jsonify({
-            "ok": True,
-            "source": "fallback",
-            "loan_type": loan_type,
-            "title": fallback["title"],
-            "advice": fallback["advice"],
-            "quick_tips": _get_quick_tips(loan_type, loan_amount, income, credit_score)
-        })
-        
+                app.logger.warning("Gemini API error: %s", e)
+        return jsonify(_smart_advisor_body(inputs, advice))
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 400
 
 
-def _get_gemini_advice(loan_type: str, loan_amount: float, income: float, credit_score: int, currency: str, profile: str):
-    """Query Gemini API for personalized financial advice."""
-    
+def _smart_advisor_inputs(data) -> dict:
+    """Normalized /smart_advisor inputs (the arguments of `_get_gemini_advice`)."""
+    loan_type = data.get("loan_type", "personal").lower().strip()
+    # Normalize loan type
+    if loan_type not in FALLBACK_ADVICE:
+        loan_type = "personal"
+    return {
+        "loan_type": loan_type,
+        "loan_amount": data.get("loan_amount", 0),
+        "income": data.get("income", 0),
+        "credit_score": data.get("credit_score", 700),
+        "currency": data.get("currency", "USD"),
+        "profile": data.get("applicant_profile", "salaried"),
+    }
+
+
+def _smart_advisor_body(inputs: dict, advice):
+    """/smart_advisor response: Gemini `advice` when there is one, else the static fallback."""
+    loan_type = inputs["loan_type"]
+    if advice:
+        metrics.REGISTRY.inc("credilume_advisor_responses_total", {"route": "smart_advisor", "source": "gemini"})
+        return {
+            "ok": True,
+            "source": "gemini",
+            "loan_type": loan_type,
+            **advice
+        }
+
+    # Fallback to static data
+    fallback = FALLBACK_ADVICE.get(loan_type, FALLBACK_ADVICE["personal"])
+    metrics.REGISTRY.inc("credilume_advisor_responses_total", {"route": "smart_advisor", "source": "fallback"})
+    return {
+        "ok": True,
+        "source": "fallback",
+        "loan_type": loan_type,
+        "title": fallback["title"],
+        "advice": fallback["advice"],
+        "quick_tips": _get_quick_tips(loan_type, inputs["loan_amount"], inputs["income"], inputs["credit_score"])
+    }
+
+
+def _advice_request(loan_type: str, loan_amount: float, income: float, credit_score: int, currency: str, profile: str):
+    """(cache key, prompt) of the Gemini advice call for one set of inputs."""
+    cache_key = llm_cache.make_key(f"advice:{GEMINI.model}", {
+        "loan_type": loan_type,
+        "loan": llm_cache.log_bucket(loan_amount),
+        "income": llm_cache.log_bucket(income),
+        "credit": llm_cache.band(credit_score, 10),
+        "currency": str(currency).upper(),
+        "profile": str(profile).strip().lower(),
+    })
+
     prompt = f"""You are a friendly, expert financial advisor. Provide personalized advice for someone seeking a {loan_type.upper()} LOAN with:
 - Loan Amount: {currency} {loan_amount:,.0f}
 - Annual Income: {currency} {income:,.0f}
@@ -745,23 +2385,37 @@ Provide 4-5 pieces of advice. Focus on:
 5. Ways to reduce total loan cost
 
 Be specific and actionable. Tailor advice to their income level and credit score. If credit score is below 670, emphasize improvement strategies. If loan amount is high relative to income, include warnings."""
+    return cache_key, prompt
+
 
+def _parse_advice(text: str) -> dict:
+    text = text.strip()
+    # Remove markdown code blocks if present
+    if text.startswith("```"):
+        text = text.split("```")[1]
+        if text.startswith("json"):
+            text = text[4:]
+    return json.loads(text.strip())
+
+
+def _get_gemini_advice(loan_type: str, loan_amount: float, income: float, credit_score: int, currency: str, profile: str):
+    """Query Gemini API for personalized financial advice."""
+    cache_key, prompt = _advice_request(loan_type, loan_amount, income, credit_score, currency, profile)
+    cached = LLM_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+    return ADVICE_FLIGHTS.do(cache_key, lambda: _fetch_advice(cache_key, prompt))
+
+
+def _fetch_advice(cache_key: str, prompt: str):
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        
-        # Parse JSON from response
-        text = response.text.strip()
-        # Remove markdown code blocks if present
-        if text.startswith("```"):
-            text = text.split("```")[1]
-            if text.startswith("json"):
-                text = text[4:]
-        text = text.strip()
-        
-        return json.loads(text)
+        advice = _parse_advice(GEMINI.generate(GEMINI_API_KEY, prompt, endpoint="advisor"))
+        LLM_CACHE.set(cache_key, advice)
+        return advice
+    except llm_client.CircuitOpenError:
+        return None
     except Exception as e:
-        print(f"Gemini parsing error: {e}")
+        app.logger.warning("Gemini parsing error: %s", e)
         return None
 
 
@@ -804,153 +2458,208 @@ def _get_quick_tips(loan_type: str, loan_amount: float, income: float, credit_sc
 # CHATBOT ENDPOINT - Gemini Conversational AI
 # ═══════════════════════════════════════════════════════════════════════════════
 
+_CHAT_STREAM_MIMETYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+
+def _chat_stream_format(data, req):
+    """"sse", "ndjson" or None (one JSON response) for a /chat_advisor request `req`.
+
+    Chosen by `"stream"` in the body (`true` means SSE) or `?stream=`, else by the
+    Accept header.
+    """
+    stream = data.get("stream", req.args.get("stream"))
+    if isinstance(stream, str):
+        stream = stream.strip().lower()
+        if stream in _CHAT_STREAM_MIMETYPES:
+            return stream
+        stream = stream in {"1", "true", "yes"}
+    if stream:
+        return "sse"
+    if stream is None:
+        best = req.accept_mimetypes.best
+        for fmt, mimetype in _CHAT_STREAM_MIMETYPES.items():
+            if best == mimetype or (fmt == "ndjson" and best in _NDJSON_MIMETYPES):
+                return fmt
+    return None
+
+
+def _record_prompt_tokens(endpoint, stats):
+    """Count the (estimated) input tokens sent upstream, split into static system prompt and per-request part.
+
+    Call it only once the breaker has admitted the call: a `CircuitOpenError` sends nothing.
+    """
+    metrics.REGISTRY.inc("credilume_llm_prompt_tokens_total", {"endpoint": endpoint, "part": "system"}, stats["system_tokens"])
+    metrics.REGISTRY.inc("credilume_llm_prompt_tokens_total", {"endpoint": endpoint, "part": "request"}, stats["request_tokens"])
+
+
+def _chat_event(fmt, event, payload):
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    return json.dumps({"type": event, **payload}, ensure_ascii=False) + "\n"
+
+
+def _stream_chat(fmt, prompt, fallback, prompt_stats):
+    """Stream a chat answer as `delta` events, then one `done` event with the full text.
+
+    The first Gemini chunk is awaited before the response starts, so an upstream that
+    fails early, ends without text, or is cut off by the breaker still falls back cleanly. The template answer then
+    streams line by line in the same format. A failure after the first chunk ends the
+    stream with an `error` event.
+    """
+    chunks, first, source = None, "", "fallback"
+    if GEMINI_API_KEY:
+        try:
+            chunks = GEMINI.stream(GEMINI_API_KEY, prompt, endpoint="chat", system_instruction=chat_prompt.SYSTEM_PROMPT)
+            first = next(chunks, "")
+            _record_prompt_tokens("chat", prompt_stats)
+            if first:
+                timing.mark("llm_first_chunk")
+                source = "gemini"
+            else:
+                # The upstream ended without any text (e.g. a blocked prompt).
+                chunks.close()
+                chunks = None
+        except llm_client.CircuitOpenError:
+            chunks = None
+        except Exception as e:
+            _record_prompt_tokens("chat", prompt_stats)
+            app.logger.warning("Gemini chat stream error: %s", e)
+            chunks = None
+    if chunks is None:
+        first, chunks = "", iter(fallback().splitlines(keepends=True))
+        timing.mark("fallback")
+    metrics.REGISTRY.inc("credilume_advisor_responses_total", {"route": "chat_advisor", "source": source})
+
+    def events():
+        parts = []
+        try:
+            for text in itertools.chain((first,), chunks):
+                if text:
+                    parts.append(text)
+                    yield _chat_event(fmt, "delta", {"text": text})
+        except Exception as e:
+            app.logger.warning("Gemini chat stream error: %s", e)
+            yield _chat_event(fmt, "error", {"ok": False, "error": "The answer was interrupted; please try again."})
+            return
+        yield _chat_event(fmt, "done", {
+            "ok": True, "source": source, "response": "".join(parts).strip(), "prompt": prompt_stats,
+        })
+
+    return _chat_stream_response(fmt, events())
+
+
+def _chat_stream_response(fmt, events):
+    return Response(
+        events,
+        mimetype=_CHAT_STREAM_MIMETYPES[fmt],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/chat_advisor", methods=["POST"])
 def chat_advisor():
-    """Handle chat messages with Gemini AI for EMI and loan advice."""
+    """Handle chat messages with Gemini AI for EMI and loan advice.
+
+    Returns one JSON answer, or streams it (SSE or NDJSON) when asked to; see `_chat_stream_format`.
+    """
     try:
         data = request.get_json() or {}
-        user_message = data.get("message", "").strip()
-        history = data.get("history", [])
-        context = data.get("context", {})
-        
-        if not user_message:
+        if not data.get("message", "").strip():
             return jsonify({"ok": False, "error": "No message provided"}), 400
-        
-        # Extract context values
-        loan_amount = context.get('loan_amount', 0)
-        tenure_months = context.get('tenure_months', 120)
-        interest_rate = context.get('interest_rate', 10)
-        income = context.get('income', 0)
-        credit_score = context.get('credit_score', 700)
-        currency = context.get('currency', 'USD')
-        loan_type = context.get('loan_type', 'personal')
-        age = context.get('age', 0)
-        gender = context.get('gender', 'not specified')
-        
-        # Age eligibility rules
-        age_rules = {
-            'personal': {'min': 21, 'max': 60, 'tenure_max': 65},
-            'home': {'min': 21, 'max': 65, 'tenure_max': 70},
-            'education': {'min': 18, 'max': 35, 'tenure_max': 45},
-            'business': {'min': 21, 'max': 65, 'tenure_max': 70}
-        }
-        
-        rules = age_rules.get(loan_type, age_rules['personal'])
-        tenure_years = tenure_months // 12
-        age_at_loan_end = age + tenure_years if age > 0 else 0
-        
-        # Calculate EMI for context
-        calculated_emi = 0
-        total_interest = 0
-        if loan_amount > 0 and tenure_months > 0:
-            monthly_rate = (interest_rate / 100) / 12
-            if monthly_rate > 0:
-                emi = loan_amount * monthly_rate * ((1 + monthly_rate) ** tenure_months) / (((1 + monthly_rate) ** tenure_months) - 1)
-                calculated_emi = round(emi, 2)
-                total_interest = round((emi * tenure_months) - loan_amount, 2)
-        
-        # Build rich context string
-        age_info = f"• Age: {age} years ({gender.title()})" if age > 0 else "• Age: Not specified"
-        age_eligibility = ""
-        if age > 0:
-            if age < rules['min']:
-                age_eligibility = f"⚠️ Below minimum age ({rules['min']}) for {loan_type} loan"
-            elif age > rules['max']:
-                age_eligibility = f"⚠️ Above maximum age ({rules['max']}) for {loan_type} loan"
-            elif age_at_loan_end > rules['tenure_max']:
-                max_tenure = rules['tenure_max'] - age
-                age_eligibility = f"⚠️ Age at loan end ({age_at_loan_end}) exceeds {rules['tenure_max']}. Max tenure: {max_tenure} years"
-            else:
-                age_eligibility = f"✅ Age eligible for {loan_type} loan (ends at age {age_at_loan_end})"
-        
-        loan_context = f"""
-📊 USER'S CURRENT LOAN CALCULATOR VALUES:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-• Loan Amount: {currency} {loan_amount:,.0f}
-• Interest Rate: {interest_rate}% per annum
-• Tenure: {tenure_months} months ({tenure_months//12} years {tenure_months%12} months)
-• Loan Type: {loan_type.title()}
-{age_info}
-• Annual Income: {currency} {income:,.0f}
-• Credit Score: {credit_score}
-{f'• Age Eligibility: {age_eligibility}' if age_eligibility else ''}
-
-📈 CALCULATED VALUES:
-• Monthly EMI: {currency} {calculated_emi:,.2f}
-• Total Interest Payable: {currency} {total_interest:,.2f}
-• Total Amount Payable: {currency} {(loan_amount + total_interest):,.2f}
-• Interest as % of Principal: {(total_interest/loan_amount*100) if loan_amount > 0 else 0:.1f}%
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-        
-        # Build conversation history
-        history_text = ""
-        if history:
-            for msg in history[-6:]:
-                role = "User" if msg.get("role") == "user" else "Assistant"
-                history_text += f"{role}: {msg.get('content', '')}\n"
-        
-        # Enhanced EMI-focused system prompt
-        system_prompt = f"""You are an expert EMI & Loan Advisor chatbot for CrediLume loan calculator. You specialize in helping users understand EMI, optimize their loans, and make smart financial decisions.
-
-{loan_context}
-
-YOUR EXPERTISE AREAS:
-1. 📊 EMI CALCULATIONS - Explain how EMI works, the formula, components (principal vs interest)
-2. 💰 INTEREST OPTIMIZATION - Tips to reduce total interest paid
-3. ⏱️ TENURE PLANNING - Trade-offs between short and long tenures
-4. 🎯 PREPAYMENT STRATEGIES - When and how much to prepay
-5. 💵 AFFORDABILITY - Debt-to-income ratios, safe borrowing limits
-6. 📉 RATE COMPARISON - Fixed vs floating, negotiating better rates
-7. 🏦 LOAN SELECTION - Choosing the right loan type and lender
-8. 👤 AGE ELIGIBILITY - Loan eligibility based on applicant's age
-
-AGE ELIGIBILITY RULES:
-- Personal Loan: Min age 21, Max age 60, Loan must end by age 65
-- Home Loan: Min age 21, Max age 65, Loan must end by age 70
-- Education Loan: Min age 18, Max age 35, Loan must end by age 45
-- Business Loan: Min age 21, Max age 65, Loan must end by age 70
-
-RESPONSE GUIDELINES:
-- Give SPECIFIC advice using their actual loan numbers when relevant
-- Use bullet points and clear formatting
-- Include calculations/examples when explaining concepts
-- Be concise but thorough (3-5 key points)
-- Use emojis to make responses friendly but professional
-- If they ask about their loan, reference their specific amounts
-- Always provide actionable advice they can use immediately
-- If age is provided, consider age eligibility in your advice
-
-EMI FORMULA REFERENCE:
-EMI = P × r × (1+r)^n / ((1+r)^n - 1)
-Where: P = Principal, r = Monthly interest rate, n = Number of months
-
-AFFORDABILITY RULES:
-- EMI should ideally be ≤40% of monthly income
-- Total debt payments ≤50% of income
-- Emergency fund of 6 months expenses recommended before taking loan
-
-Previous conversation:
-{history_text}
+        prompt, prompt_stats, fallback = _chat_request(data)
 
-User's question: {user_message}
-
-Provide helpful, specific advice:"""
+        stream_format = _chat_stream_format(data, request)
+        if stream_format:
+            return _stream_chat(stream_format, prompt, fallback, prompt_stats)
 
         if GEMINI_API_KEY:
             try:
-                model = genai.GenerativeModel('gemini-1.5-flash')
-                response = model.generate_content(system_prompt)
-                
-                return jsonify({
-                    "ok": True,
-                    "response": response.text.strip()
-                })
+                with timing.span("llm_chat"):
+                    response_text = GEMINI.generate(GEMINI_API_KEY, prompt, endpoint="chat",
+                                                    system_instruction=chat_prompt.SYSTEM_PROMPT)
+                _record_prompt_tokens("chat", prompt_stats)
+                return jsonify(_chat_body(response_text, "gemini", prompt_stats))
+            except llm_client.CircuitOpenError:
+                pass
             except Exception as e:
-                print(f"Gemini chat error: {e}")
+                _record_prompt_tokens("chat", prompt_stats)
+                app.logger.warning("Gemini chat error: %s", e)
         
         # Enhanced fallback responses
-        fallback_responses = _get_smart_fallback(
+        fallback_responses = fallback()
+        timing.mark("fallback")
+        return jsonify(_chat_body(fallback_responses, "fallback", prompt_stats))
+        
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+
+def _chat_body(text: str, source: str, prompt_stats: dict) -> dict:
+    """Non-streamed /chat_advisor response (counts the answer's source)."""
+    metrics.REGISTRY.inc("credilume_advisor_responses_total", {"route": "chat_advisor", "source": source})
+    return {
+        "ok": True,
+        "response": text.strip() if source == "gemini" else text,
+        "prompt": prompt_stats,
+    }
+
+
+def _chat_request(data):
+    """Prompt for one /chat_advisor message: (prompt, prompt_stats, fallback).
+
+    `fallback()` renders the template answer; it is only called when Gemini can't answer.
+    """
+    user_message = data.get("message", "").strip()
+    history = data.get("history", [])
+    context = data.get("context", {})
+
+    # Extract context values
+    loan_amount = context.get('loan_amount', 0)
+    tenure_months = context.get('tenure_months', 120)
+    interest_rate = context.get('interest_rate', 10)
+    income = context.get('income', 0)
+    credit_score = context.get('credit_score', 700)
+    currency = context.get('currency', 'USD')
+    loan_type = context.get('loan_type', 'personal')
+    age = context.get('age', 0)
+    gender = context.get('gender', 'not specified')
+    
+    rules = chat_prompt.AGE_RULES.get(loan_type, chat_prompt.AGE_RULES['personal'])
+    tenure_years = tenure_months // 12
+    age_at_loan_end = age + tenure_years if age > 0 else 0
+    
+    # Calculate EMI for context
+    calculated_emi = 0
+    total_interest = 0
+    emi_tuple = amortization.emi_one(loan_amount, tenure_months, interest_rate)
+    if emi_tuple is not None:
+        calculated_emi = round(emi_tuple[0], 2)
+        total_interest = round(emi_tuple[1], 2)
+    
+    # Compact per-request context; the static instructions live in chat_prompt.SYSTEM_PROMPT
+    age_info = f"{age} years ({gender.title()})" if age > 0 else "not specified"
+    age_eligibility = ""
+    if age > 0:
+        if age < rules['min']:
+            age_eligibility = f"⚠️ Below minimum age ({rules['min']}) for {loan_type} loan"
+        elif age > rules['max']:
+            age_eligibility = f"⚠️ Above maximum age ({rules['max']}) for {loan_type} loan"
+        elif age_at_loan_end > rules['tenure_max']:
+            max_tenure = rules['tenure_max'] - age
+            age_eligibility = f"⚠️ Age at loan end ({age_at_loan_end}) exceeds {rules['tenure_max']}. Max tenure: {max_tenure} years"
+        else:
+            age_eligibility = f"✅ Age eligible for {loan_type} loan (ends at age {age_at_loan_end})"
+    
+    loan_summary = f"""- Loan: {currency} {loan_amount:,.0f} {loan_type} loan at {interest_rate}% p.a. for {tenure_months} months ({tenure_months//12}y {tenure_months%12}m)
+- Applicant: age {age_info}; annual income {currency} {income:,.0f}; credit score {credit_score}
+{f'- Age eligibility: {age_eligibility}' if age_eligibility else ''}
+- EMI {currency} {calculated_emi:,.2f}/month; total interest {currency} {total_interest:,.2f}; total payable {currency} {(loan_amount + total_interest):,.2f} (interest {(total_interest/loan_amount*100) if loan_amount > 0 else 0:.1f}% of principal)"""
+    
+    prompt, prompt_stats = chat_prompt.user_prompt(loan_summary, history, user_message)
+    timing.mark("prompt")
+
+    def fallback():
+        return _get_smart_fallback(
             user_message,
             loan_amount,
             tenure_months,
@@ -964,31 +2673,25 @@ Provide helpful, specific advice:"""
             age,
             gender,
         )
-        
-        return jsonify({
-            "ok": True,
-            "response": fallback_responses
-        })
-        
-    except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 400
+
+    return prompt, prompt_stats, fallback
 
 
 def _get_smart_fallback(message: str, loan_amount: float, tenure: int, rate: float, income: float, credit_score: int, currency: str, emi: float, total_interest: float, loan_type: str = 'personal', age: int = 0, gender: str = 'not specified') -> str:
     """Generate smart fallback responses based on keywords and user's loan data."""
     
-    message_lower = message.lower()
+    # One pass scores every intent; the best match wins (see chat_router.py).
+    intent = chat_router.route(message)
     
     # Age eligibility check
-    if any(word in message_lower for word in ["age", "eligible", "eligibility", "old enough", "too old", "too young"]):
-        age_rules = {
-            'personal': {'min': 21, 'max': 60, 'tenure_max': 65, 'desc': 'Personal Loan'},
-            'home': {'min': 21, 'max': 65, 'tenure_max': 70, 'desc': 'Home Loan'},
-            'education': {'min': 18, 'max': 35, 'tenure_max': 45, 'desc': 'Education Loan'},
-            'business': {'min': 21, 'max': 65, 'tenure_max': 70, 'desc': 'Business Loan'}
-        }
-        
-        rules = age_rules.get(loan_type, age_rules['personal'])
+    if intent == "age":
+        # Same rules as the Gemini system prompt (chat_prompt.AGE_RULES).
+        rule_type = loan_type if loan_type in chat_prompt.AGE_RULES else 'personal'
+        rules = {**chat_prompt.AGE_RULES[rule_type], 'desc': f"{rule_type.title()} Loan"}
+        criteria_rows = "\n".join(
+            f"| {name.title():<9} | {rule['min']:<7} | {rule['max']:<7} | {rule['tenure_max']:<11} |"
+            for name, rule in chat_prompt.AGE_RULES.items()
+        )
         tenure_years = tenure // 12
         age_at_end = age + tenure_years if age > 0 else 0
         max_allowed_tenure = rules['tenure_max'] - age if age > 0 else rules['tenure_max'] - rules['min']
@@ -1025,15 +2728,12 @@ def _get_smart_fallback(message: str, loan_amount: float, tenure: int, rate: flo
 📋 **All Loan Types Age Criteria:**
 | Loan Type | Min Age | Max Age | Must End By |
 |-----------|---------|---------|-------------|
-| Personal  | 21      | 60      | 65          |
-| Home      | 21      | 65      | 70          |
-| Education | 18      | 35      | 45          |
-| Business  | 21      | 65      | 70          |
+{criteria_rows}
 
 💡 **Tip:** If you're near the upper age limit, consider a shorter tenure or add a co-applicant."""
 
     # EMI Calculation explanation
-    if any(word in message_lower for word in ["emi", "calculate", "formula", "how is", "explain"]):
+    if intent == "emi":
         return f"""📊 **How EMI is Calculated**
 
 EMI = P × r × (1+r)^n / ((1+r)^n - 1)
@@ -1051,7 +2751,7 @@ Where:
 💡 Each EMI payment includes both principal and interest. Early payments are interest-heavy, later ones are principal-heavy!"""
 
     # Interest reduction tips
-    if any(word in message_lower for word in ["reduce", "lower", "save", "less interest", "minimize"]):
+    if intent == "reduce":
         potential_savings = total_interest * 0.15  # Rough estimate
         return f"""💰 **Ways to Reduce Your Interest ({currency} {total_interest:,.0f} currently)**
 
@@ -1066,7 +2766,7 @@ Where:
 Potential savings with these strategies: **{currency} {potential_savings:,.0f}+**"""
 
     # Tenure advice
-    if any(word in message_lower for word in ["tenure", "term", "years", "months", "short", "long"]):
+    if intent == "tenure":
         short_tenure = max(12, tenure - 36)
         long_tenure = tenure + 36
         return f"""⏱️ **Tenure Trade-offs for Your {currency} {loan_amount:,.0f} Loan**
@@ -1088,8 +2788,28 @@ Best for: Variable income, other investments
 💡 **Pro Tip:** Start with longer tenure for lower mandatory EMI, but make voluntary prepayments when you have extra cash. Best of both worlds!"""
 
     # Prepayment advice
-    if any(word in message_lower for word in ["prepay", "prepayment", "pay off", "early", "lump sum"]):
+    if intent == "prepay":
         prepay_amount = loan_amount * 0.1
+        annual_effect = "Can reduce tenure by 3-4 years!"
+        topup_effect = "Barely noticeable, huge impact"
+        one_time_effect = f"Prepaying {currency} {prepay_amount:,.0f} in year 1 cuts your interest noticeably!"
+        if amortization.emi_one(loan_amount, tenure, rate) is not None:
+            # Exact outcomes at your rate (see simulation.py), each against the plain loan.
+            baseline = simulation.simulate(loan_amount, tenure, rate)
+            annual = simulation.simulate(loan_amount, tenure, rate, recurring_amount=prepay_amount, recurring_every=12, recurring_start=12)
+            topup = simulation.simulate(loan_amount, tenure, rate, recurring_amount=emi * 0.1)
+            one_time = simulation.simulate(loan_amount, tenure, rate, lump_sums={12: prepay_amount})
+
+            def _saved(plan):
+                return (int(baseline["months"][0] - plan["months"][0]),
+                        float(baseline["total_interest"][0] - plan["total_interest"][0]))
+
+            months_saved, interest_saved = _saved(annual)
+            annual_effect = f"Closes {months_saved} months ({months_saved / 12:.1f} years) early and saves {currency} {interest_saved:,.0f} in interest"
+            months_saved, interest_saved = _saved(topup)
+            topup_effect = f"Closes {months_saved} months early and saves {currency} {interest_saved:,.0f} in interest"
+            months_saved, interest_saved = _saved(one_time)
+            one_time_effect = f"Prepaying {currency} {prepay_amount:,.0f} once in month 12 saves {currency} {interest_saved:,.0f} in interest and {months_saved} EMIs!"
         return f"""🎯 **Prepayment Strategy for Your Loan**
 
 **When to Prepay:**
@@ -1101,22 +2821,23 @@ Best for: Variable income, other investments
 
 1. **Annual Bonus Method**
    - Put {currency} {prepay_amount:,.0f} (10% of loan) annually
-   - Can reduce tenure by 3-4 years!
+   - {annual_effect}
 
 2. **EMI Top-up Method**  
    - Pay {currency} {emi*0.1:,.0f} extra each month
-   - Barely noticeable, huge impact
+   - {topup_effect}
 
 3. **Part Prepay vs Full Closure**
    - Part prepay to reduce tenure (not EMI) for max savings
 
-💡 **Your Potential Savings:** Prepaying {currency} {prepay_amount:,.0f} in year 1 could save ~{currency} {prepay_amount*0.3:,.0f} in interest!"""
+💡 **Your Potential Savings:** {one_time_effect}"""
 
     # Affordability check
-    if any(word in message_lower for word in ["afford", "income", "budget", "can i", "how much", "salary"]):
+    if intent == "afford":
         monthly_income = income / 12 if income > 0 else 0
         emi_ratio = (emi / monthly_income * 100) if monthly_income > 0 else 0
         max_affordable_emi = monthly_income * 0.4
+        max_affordable_loan = float(np.nan_to_num(amortization.max_principal(max_affordable_emi, tenure, rate)))
         return f"""💵 **Affordability Analysis**
 
 **Your Numbers:**
@@ -1133,10 +2854,23 @@ Best for: Variable income, other investments
 {"✅ Your EMI is within healthy limits!" if emi_ratio < 40 else "⚠️ Consider reducing loan amount or extending tenure for comfort."}
 
 **Max Affordable EMI (40% rule):** {currency} {max_affordable_emi:,.0f}/month
-**That supports a loan of approximately:** {currency} {max_affordable_emi * tenure * 0.85:,.0f}"""
+**That supports a loan of up to:** {currency} {max_affordable_loan:,.0f} (at {rate}% over {tenure} months)"""
 
     # Fixed vs Floating
-    if any(word in message_lower for word in ["fixed", "floating", "variable", "type of rate"]):
+    if intent == "rate_type":
+        rate_moves = ""
+        if amortization.emi_one(loan_amount, tenure, rate) is not None:
+            # A 1-point reset after year 1, with the bank re-pricing the EMI or the tenure.
+            lines = []
+            for label, new_rate in (("+1%", rate + 1), ("-1%", max(0.0, rate - 1))):
+                path = simulation.reset_path(rate, tenure, {13: new_rate})
+                by_emi = simulation.simulate(loan_amount, tenure, path, on_reset="emi")
+                by_tenure = simulation.simulate(loan_amount, tenure, path, on_reset="tenure", max_months=tenure + 240)
+                lines.append(
+                    f"• Rates {label} after year 1: EMI becomes {currency} {by_emi['last_emi'][0]:,.0f}, "
+                    f"or the EMI stays and the loan runs {int(by_tenure['months'][0])} months"
+                )
+            rate_moves = "\n**What a 1% rate move would mean for you:**\n" + "\n".join(lines) + "\n"
         return f"""📉 **Fixed vs Floating Interest Rates**
 
 **Fixed Rate:**
@@ -1157,11 +2891,11 @@ Best for: Variable income, other investments
 • If rates are HIGH now → **Floating** (likely to decrease)
 • If rates are LOW now → **Fixed** (lock in the good rate)
 • If uncertain → **Floating with prepayment plan** (pay off faster if rates rise)
-
+{rate_moves}
 💡 Currently at {rate}%? Check if this is historically high or low in your region."""
 
     # Credit score
-    if any(word in message_lower for word in ["credit", "score", "cibil", "rating"]):
+    if intent == "credit":
         return f"""📈 **Credit Score Impact on Your Loan**
 
 **Score Ranges & Rates:**
@@ -1199,6 +2933,10 @@ Based on your loan of **{currency} {loan_amount:,.0f}** at **{rate}%** for **{te
 I'll give you personalized advice based on your numbers! 💡"""
 
 
+if os.environ.get("CREDILUME_PRELOAD") == "1":
+    _preload()
+
+
 if __name__ == "__main__":
     # For hackathon/demo dev: enable auto-reload by default.
     # Artifacts are lazy-loaded, so reloader won't unpickle models on import.
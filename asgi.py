@@ -0,0 +1,388 @@
+"""ASGI entry point: async serving mode for the LLM-bound endpoints.
+
+    pip install uvicorn
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+
+Under gunicorn's sync workers (`app:app`), every in-flight Gemini call holds a whole
+worker process. Here each worker runs one event loop that awaits those calls instead:
+
+- `/smart_advisor`, `/chat_advisor` (JSON and streamed) and `/predict_json` are served
+  natively. Parsing, prompts, scoring and fallbacks reuse the helpers in app.py, and
+  the Gemini calls are awaited on `llm_client.AsyncHTTPPool`. A slow upstream call costs
+  a coroutine, not a process. `/predict_json` scores the application on the thread
+  pool below; only its explanation is awaited on the loop.
+- Every other route runs the Flask app unchanged on a bounded thread pool
+  (`ASGI_THREADS`, default 16), so CPU-only work such as `/predict_batch` never blocks
+  the loop. Streamed responses (NDJSON, CSV) are forwarded chunk by chunk.
+
+Request bodies are buffered before a handler runs. Bodies over `ASGI_MAX_BODY_BYTES`
+(default: app.PREDICT_BATCH_MAX_BYTES, the largest body any route accepts) get a 413
+as soon as the declared length or the bytes received pass it.
+
+Responses, `Server-Timing` headers and /metrics samples match the WSGI app. Set
+`METRICS_DIR` to aggregate /metrics across `--workers`, as gunicorn.conf.py does.
+"""
+
+import asyncio
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.wrappers import Request
+
+# Load and warm up the model at import, like gunicorn's preload_app.
+os.environ.setdefault("CREDILUME_PRELOAD", "1")
+
+import app as credilume  # noqa: E402
+import chat_prompt  # noqa: E402
+import llm_client  # noqa: E402
+import metrics  # noqa: E402
+import single_flight  # noqa: E402
+import timing  # noqa: E402
+
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", "16"))
+ASGI_MAX_BODY_BYTES = int(os.environ.get("ASGI_MAX_BODY_BYTES", str(credilume.PREDICT_BATCH_MAX_BYTES)))
+
+flask_app = credilume.app
+log = flask_app.logger
+
+# Async counterpart of app.ADVICE_FLIGHTS (same LLM_COALESCE settings and metric).
+ADVICE_FLIGHTS = single_flight.async_flight_from_env(credilume._record_coalesced)
+
+
+def _json(body: dict, status: int = 200):
+    response = flask_app.json.response(body)
+    response.status_code = status
+    return response
+
+
+# ─── Native async handlers ─────────────────────────────────────────────────────
+
+async def _get_gemini_advice(inputs: dict):
+    """Async `app._get_gemini_advice`: cache, then one shared in-flight call per key."""
+    cache_key, prompt = credilume._advice_request(**inputs)
+    cached = credilume.LLM_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+    return await ADVICE_FLIGHTS.do(cache_key, lambda: _fetch_advice(cache_key, prompt))
+
+
+async def _fetch_advice(cache_key: str, prompt: str):
+    try:
+        text = await credilume.GEMINI.agenerate(credilume.GEMINI_API_KEY, prompt, endpoint="advisor")
+        advice = credilume._parse_advice(text)
+        credilume.LLM_CACHE.set(cache_key, advice)
+        return advice
+    except llm_client.CircuitOpenError:
+        return None
+    except Exception as e:
+        log.warning("Gemini parsing error: %s", e)
+        return None
+
+
+async def smart_advisor(request):
+    inputs = credilume._smart_advisor_inputs(request.get_json() or {})
+    advice = None
+    if credilume.GEMINI_API_KEY:
+        try:
+            advice = await _get_gemini_advice(inputs)
+        except Exception as e:
+            log.warning("Gemini API error: %s", e)
+    return _json(credilume._smart_advisor_body(inputs, advice))
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+async def _stream_chat(fmt, prompt, fallback, prompt_stats):
+    """Async `app._stream_chat` (same events, same fallback rules)."""
+    chunks, first, source = None, "", "fallback"
+    if credilume.GEMINI_API_KEY:
+        try:
+            chunks = credilume.GEMINI.astream(credilume.GEMINI_API_KEY, prompt, endpoint="chat",
+                                              system_instruction=chat_prompt.SYSTEM_PROMPT)
+            first = await anext(chunks, "")
+            credilume._record_prompt_tokens("chat", prompt_stats)
+            if first:
+                timing.mark("llm_first_chunk")
+                source = "gemini"
+            else:
+                # The upstream ended without any text (e.g. a blocked prompt).
+                await chunks.aclose()
+                chunks = None
+        except llm_client.CircuitOpenError:
+            chunks = None
+        except Exception as e:
+            credilume._record_prompt_tokens("chat", prompt_stats)
+            log.warning("Gemini chat stream error: %s", e)
+            chunks = None
+    if chunks is None:
+        first, chunks = "", _aiter(fallback().splitlines(keepends=True))
+        timing.mark("fallback")
+    metrics.REGISTRY.inc("credilume_advisor_responses_total", {"route": "chat_advisor", "source": source})
+
+    async def events():
+        parts = []
+        try:
+            if first:
+                parts.append(first)
+                yield credilume._chat_event(fmt, "delta", {"text": first})
+            async for text in chunks:
+                if text:
+                    parts.append(text)
+                    yield credilume._chat_event(fmt, "delta", {"text": text})
+        except Exception as e:
+            log.warning("Gemini chat stream error: %s", e)
+            yield credilume._chat_event(fmt, "error", {"ok": False, "error": "The answer was interrupted; please try again."})
+            return
+        finally:
+            await chunks.aclose()
+        yield credilume._chat_event(fmt, "done", {
+            "ok": True, "source": source, "response": "".join(parts).strip(), "prompt": prompt_stats,
+        })
+
+    return credilume._chat_stream_response(fmt, events())
+
+
+async def chat_advisor(request):
+    data = request.get_json() or {}
+    if not data.get("message", "").strip():
+        return _json({"ok": False, "error": "No message provided"}, 400)
+    prompt, prompt_stats, fallback = credilume._chat_request(data)
+
+    stream_format = credilume._chat_stream_format(data, request)
+    if stream_format:
+        return await _stream_chat(stream_format, prompt, fallback, prompt_stats)
+
+    if credilume.GEMINI_API_KEY:
+        try:
+            with timing.span("llm_chat"):
+                response_text = await credilume.GEMINI.agenerate(credilume.GEMINI_API_KEY, prompt, endpoint="chat",
+                                                                 system_instruction=chat_prompt.SYSTEM_PROMPT)
+            credilume._record_prompt_tokens("chat", prompt_stats)
+            return _json(credilume._chat_body(response_text, "gemini", prompt_stats))
+        except llm_client.CircuitOpenError:
+            pass
+        except Exception as e:
+            credilume._record_prompt_tokens("chat", prompt_stats)
+            log.warning("Gemini chat error: %s", e)
+
+    fallback_responses = fallback()
+    timing.mark("fallback")
+    return _json(credilume._chat_body(fallback_responses, "fallback", prompt_stats))
+
+
+async def _gemini_explain(api_key: str, payload: dict):
+    """Async `app._gemini_explain`."""
+    cache_key = credilume._explain_cache_key(credilume.GEMINI.model, payload)
+    cached = credilume.LLM_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+    text = await credilume.GEMINI.agenerate(api_key, credilume._explain_prompt(payload), endpoint="explain",
+                                            temperature=0.2, max_output_tokens=300)
+    parsed = credilume._parse_explanation(text)
+    if parsed is not None:
+        credilume.LLM_CACHE.set(cache_key, parsed)
+    return parsed
+
+
+async def predict_json(request):
+    # Scoring is CPU work: run it on the pool (the timeline context is copied along).
+    result = await asyncio.to_thread(credilume._predict_payload, request.form, True)
+    if result.get("explain_request"):
+        with timing.span("llm_explain"):
+            try:
+                credilume._merge_explanation(result, await _gemini_explain(*result["explain_request"]))
+            except Exception:
+                # Silent fallback to rule-based explanations
+                pass
+    return _json(credilume._predict_json_body(result, request.args.get("timings") in {"1", "true", "yes"}))
+
+
+# (path) -> (route name as in Flask, handler); POST only.
+NATIVE_ROUTES = {
+    "/smart_advisor": ("smart_advisor", smart_advisor),
+    "/chat_advisor": ("chat_advisor", chat_advisor),
+    "/predict_json": ("predict_json", predict_json),
+}
+
+
+# ─── ASGI plumbing ─────────────────────────────────────────────────────────────
+
+def _environ(scope, body: bytes) -> dict:
+    """WSGI environ (PEP 3333) for an ASGI HTTP scope."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": client[0],
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # The body is fully buffered and already de-chunked: describe it exactly.
+    environ.pop("HTTP_TRANSFER_ENCODING", None)
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+def _headers(pairs):
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in pairs]
+
+
+async def _read_body(scope, receive) -> bytes | None:
+    """The whole request body, or None as soon as it is known to exceed ASGI_MAX_BODY_BYTES."""
+    for name, value in scope.get("headers", []):
+        if name.lower() == b"content-length" and value.strip().isdigit() and int(value) > ASGI_MAX_BODY_BYTES:
+            return None
+    parts, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > ASGI_MAX_BODY_BYTES:
+            return None
+        parts.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(parts)
+
+
+async def _call_wsgi(environ, send):
+    """Run the Flask app on the thread pool, forwarding its body chunks as they are produced."""
+    loop = asyncio.get_running_loop()
+
+    def push(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run():
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["start"] = {"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+                                 "headers": _headers(headers)}
+            return lambda data: push({"type": "http.response.body", "body": data, "more_body": True})
+
+        body = flask_app(environ, start_response)
+        try:
+            started = False
+            for chunk in body:
+                if not chunk:
+                    continue
+                if not started:
+                    push(response["start"])
+                    started = True
+                push({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not started:
+                push(response["start"])
+            push({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+    await loop.run_in_executor(None, run)
+
+
+async def _send_stream(body, receive, send):
+    """Forward an async body; stop early (closing the upstream stream) if the client leaves."""
+    disconnected = asyncio.Event()
+
+    async def watch():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    watcher = asyncio.create_task(watch())
+    try:
+        async for chunk in body:
+            if disconnected.is_set():
+                break
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8") if isinstance(chunk, str) else chunk,
+                        "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        watcher.cancel()
+        await body.aclose()
+
+
+async def _call_native(route, handler, environ, receive, send):
+    request = Request(environ)
+    started = time.perf_counter()
+    timing.start()
+    try:
+        response = await handler(request)
+    except Exception as e:
+        response = _json({"ok": False, "error": str(e)}, 400)
+    credilume._finish_request(route, request.method, response, started)
+
+    await send({"type": "http.response.start", "status": response.status_code,
+                "headers": _headers(response.headers.to_wsgi_list())})
+    if hasattr(response.response, "__aiter__"):
+        await _send_stream(response.response, receive, send)
+    else:
+        await send({"type": "http.response.body", "body": response.get_data()})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="wsgi")
+            )
+            # Same per-worker threads gunicorn.conf.py starts in post_worker_init. Preload
+            # deferred the watcher for a fork that never happens here (uvicorn imports the
+            # app in each worker process), so this worker owns it.
+            credilume._REGISTRY.defer_watcher = False
+            credilume._REGISTRY.ensure_watcher()
+            metrics.REGISTRY.ensure_flusher()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            metrics.REGISTRY.flush()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    body = await _read_body(scope, receive)
+    if body is None:
+        response = _json({"ok": False, "error": f"Request body too large (max {ASGI_MAX_BODY_BYTES} bytes)"}, 413)
+        await send({"type": "http.response.start", "status": response.status_code,
+                    "headers": _headers(response.headers.to_wsgi_list())})
+        await send({"type": "http.response.body", "body": response.get_data()})
+        return
+    environ = _environ(scope, body)
+    native = NATIVE_ROUTES.get(scope["path"]) if scope["method"] == "POST" else None
+    if native is None:
+        await _call_wsgi(environ, send)
+    else:
+        await _call_native(*native, environ, receive, send)
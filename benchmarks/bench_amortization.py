@@ -0,0 +1,56 @@
+"""Microbenchmark: amortization schedules for many loans.
+
+Compares a month-by-month Python loop (the algorithm of `generateSchedule` in
+static/calculator.js) with the vectorized closed form in `amortization.py`. Their
+parity is checked in tests/test_amortization.py.
+
+Run from the repository root:
+
+    python benchmarks/bench_amortization.py [n_loans]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import amortization  # noqa: E402
+
+
+def _loop_schedule(principal: float, months: int, apr: float):
+    payment = amortization.emi_one(principal, months, apr)[0]
+    r = apr / 100 / 12
+    balance = principal
+    balances = []
+    for _ in range(months):
+        interest = balance * r
+        balance = max(0.0, balance - (payment - interest))
+        balances.append(balance)
+    return balances
+
+
+def main(n_loans: int = 5000):
+    rng = np.random.default_rng(42)
+    principal = rng.uniform(1e5, 5e7, n_loans)
+    months = rng.choice([60, 120, 240, 360], n_loans)
+    apr = rng.uniform(0, 18, n_loans)
+
+    started = time.perf_counter()
+    loop = [_loop_schedule(p, int(n), a) for p, n, a in zip(principal, months, apr)]
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    block = amortization.schedule_block(principal, months, apr)
+    vec_seconds = time.perf_counter() - started
+
+    assert len(loop) == block["balance"].shape[0]
+    rows = int(months.sum())
+    for name, seconds in (("python loop", loop_seconds), ("amortization.schedule_block", vec_seconds)):
+        print(f"{name:<28} {seconds * 1e3:9.1f} ms  {n_loans / seconds * 60:12,.0f} loans/min  {rows / seconds:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
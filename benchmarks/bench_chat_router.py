@@ -0,0 +1,74 @@
+"""Intent classification benchmark for the chat fallback.
+
+Compares the original keyword chain of `_get_smart_fallback` (lowercase the message,
+then `any(word in message_lower ...)` per intent, first match wins) with the compiled
+router in `chat_router.py`. It reports routing accuracy on a labeled corpus of chat
+messages (`chat_corpus.jsonl`, one `{"message", "intent"}` per line, intent null for
+the default answer) and classification throughput.
+
+Run from the repository root:
+
+    python benchmarks/bench_chat_router.py [--corpus benchmarks/chat_corpus.jsonl] [--show-misses]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chat_router  # noqa: E402
+
+# The chain as it was in app.py, in its original order.
+_LEGACY_CHAIN = (
+    ("age", ["age", "eligible", "eligibility", "old enough", "too old", "too young"]),
+    ("emi", ["emi", "calculate", "formula", "how is", "explain"]),
+    ("reduce", ["reduce", "lower", "save", "less interest", "minimize"]),
+    ("tenure", ["tenure", "term", "years", "months", "short", "long"]),
+    ("prepay", ["prepay", "prepayment", "pay off", "early", "lump sum"]),
+    ("afford", ["afford", "income", "budget", "can i", "how much", "salary"]),
+    ("rate_type", ["fixed", "floating", "variable", "type of rate"]),
+    ("credit", ["credit", "score", "cibil", "rating"]),
+)
+
+
+def legacy_route(message: str):
+    message_lower = message.lower()
+    for intent, words in _LEGACY_CHAIN:
+        if any(word in message_lower for word in words):
+            return intent
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_corpus.jsonl"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--show-misses", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    messages = [item["message"] for item in corpus]
+
+    for name, classify in (("keyword chain", legacy_route), ("chat_router", chat_router.route)):
+        misses = [(item["message"], item["intent"], classify(item["message"]))
+                  for item in corpus if classify(item["message"]) != item["intent"]]
+        accuracy = 1 - len(misses) / len(corpus)
+
+        def run():
+            for message in messages:
+                classify(message)
+
+        best = min(timeit.repeat(run, repeat=args.repeat, number=20)) / (20 * len(messages))
+        print(f"{name:<14} accuracy {accuracy:6.1%} ({len(corpus) - len(misses)}/{len(corpus)})"
+              f"  {best * 1e6:6.2f} µs/message  {1 / best:12,.0f} messages/s")
+        if args.show_misses:
+            for message, expected, got in misses:
+                print(f"    {message!r}: expected {expected}, got {got}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Microbenchmark: feature-vector construction.
+
+Compares the old per-request path (`dict.fromkeys(FEATURE_NAMES, 0)` + four key
+writes + `np.array(list(...)).reshape(1, -1)`) with `_FeatureEncoder`, for single
+rows and for a batch encoded into a preallocated buffer.
+
+Run from the repository root:
+
+    python benchmarks/bench_encoding.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+APPLICATION = {
+    "income_annum": 960000.0,
+    "loan_amount": 2500000.0,
+    "loan_term": 120.0,
+    "cibil_score": 742.0,
+}
+
+
+def dict_path():
+    input_data = dict.fromkeys(app.FEATURE_NAMES, 0)
+    for name, value in APPLICATION.items():
+        input_data[name] = value
+    return np.array(list(input_data.values())).reshape(1, -1)
+
+
+def main(repeat: int = 5, number: int = 20000, batch_rows: int = 100_000):
+    encoder = app._load_artifacts().encoder
+
+    assert np.array_equal(dict_path(), encoder.encode_one(APPLICATION)), "encoder disagrees with dict path"
+    one_hot = encoder.encode_one(APPLICATION, {"education": "Not Graduate", "self_employed": "Yes"})
+    assert one_hot[0, encoder.index["education_ Not Graduate"]] == 1.0
+    assert one_hot[0, encoder.index["self_employed_ Yes"]] == 1.0
+    print("parity: OK")
+
+    for name, fn in (
+        ("dict + np.array", dict_path),
+        ("encode_one", lambda: encoder.encode_one(APPLICATION)),
+    ):
+        best = min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+        print(f"{name:<22} {best * 1e6:8.2f} µs/row")
+
+    rng = np.random.default_rng(0)
+    columns = {name: rng.uniform(1, 1e6, batch_rows) for name in APPLICATION}
+    buffer = np.empty((batch_rows, encoder.n_features))
+
+    def batch_dict_path():
+        rows = []
+        for i in range(batch_rows):
+            input_data = dict.fromkeys(app.FEATURE_NAMES, 0)
+            for name in APPLICATION:
+                input_data[name] = columns[name][i]
+            rows.append(list(input_data.values()))
+        return np.array(rows)
+
+    for name, fn in (
+        ("batch: per-row dicts", batch_dict_path),
+        ("batch: encode_batch", lambda: encoder.encode_batch(columns, out=buffer)),
+    ):
+        best = min(timeit.repeat(fn, repeat=3, number=1))
+        print(f"{name:<22} {best * 1e3:8.2f} ms/{batch_rows} rows")
+
+
+if __name__ == "__main__":
+    main()
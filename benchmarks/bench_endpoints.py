@@ -0,0 +1,359 @@
+"""End-to-end latency benchmark for the Flask endpoints.
+
+Drives `/predict`, `/predict_json`, `/smart_advisor` and `/chat_advisor` (plain and
+streamed as NDJSON) against the local Gemini stub (configurable delay, first-token delay
+and failure rate). It runs them through Flask's
+test client (in-process, no network), a real gunicorn server started from
+`gunicorn.conf.py`, and/or the async ASGI app (`uvicorn asgi:app`). It reports p50/p95/p99 latency, p50 time to first byte, throughput,
+error count and RSS
+(per server worker), and writes everything to JSON so runs can be compared:
+
+    python benchmarks/bench_endpoints.py --target both --requests 300 --out before.json
+    python benchmarks/bench_endpoints.py --target both --requests 300 --compare before.json
+    python benchmarks/bench_endpoints.py --target servers --concurrency 64 --llm-delay 0.5
+
+The LLM response cache is off by default so every advisor call reaches the stub;
+pass `--cache memory` to measure the warm-cache path instead. `--same-inputs` sends
+identical requests (campaign traffic with default inputs), which exercises request
+coalescing (`--coalesce worker|host|off`).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import llm_stub  # noqa: E402
+
+ENDPOINTS = ("/predict", "/predict_json", "/smart_advisor", "/chat_advisor", "/chat_advisor?stream=ndjson")
+LOAN_TYPES = ("personal", "home", "education", "business")
+CHAT_MESSAGES = (
+    "What is my EMI?",
+    "Should I prepay my loan?",
+    "How can I improve my credit score?",
+    "Is a shorter tenure better for me?",
+    "What is the difference between fixed and floating rates?",
+)
+
+
+def _request(endpoint: str, rng: random.Random):
+    """One randomized request for `endpoint`: (content_type, body bytes)."""
+    income = rng.randrange(300_000, 5_000_000, 10_000)
+    amount = rng.randrange(100_000, 8_000_000, 10_000)
+    loan_type = rng.choice(LOAN_TYPES)
+    if endpoint in ("/predict", "/predict_json"):
+        form = {
+            "income_annum": income,
+            "loan_amount": amount,
+            "loan_term": rng.choice((12, 36, 60, 120, 240)),
+            "cibil_score": rng.randrange(450, 880),
+            "loan_type": loan_type,
+            "applicant_profile": rng.choice(("salaried", "self_employed", "student")),
+            "interest_rate": rng.choice((8.5, 10, 12.5)),
+        }
+        return "application/x-www-form-urlencoded", urllib.parse.urlencode(form).encode("ascii")
+    if endpoint == "/smart_advisor":
+        body = {
+            "loan_type": loan_type,
+            "loan_amount": amount,
+            "income": income,
+            "credit_score": rng.randrange(450, 880),
+            "currency": "INR",
+        }
+    else:
+        body = {
+            "message": rng.choice(CHAT_MESSAGES),
+            "history": [],
+            "context": {
+                "loan_amount": amount,
+                "tenure_months": rng.choice((60, 120, 240)),
+                "interest_rate": 10,
+                "income": income,
+                "credit_score": rng.randrange(450, 880),
+                "currency": "INR",
+                "loan_type": loan_type,
+            },
+        }
+    return "application/json", json.dumps(body).encode("utf-8")
+
+
+def _summary(latencies, errors: int, wall: float, first_bytes=()) -> dict:
+    latencies = sorted(latencies)
+    first_bytes = sorted(first_bytes)
+    n = len(latencies)
+
+    def pct(q, values=latencies):
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1e3, 3) if values else None
+
+    return {
+        "requests": n,
+        "errors": errors,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "ttfb_p50_ms": pct(0.50, first_bytes),
+        "mean_ms": round(sum(latencies) / n * 1e3, 3) if n else None,
+        "throughput_rps": round(n / wall, 1) if wall else None,
+    }
+
+
+def _rss_mb(pid: int) -> float | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _children(pid: int):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    children.append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    return sorted(children)
+
+
+def run_test_client(args) -> dict:
+    """In-process run: measures app code only (no sockets, no WSGI server)."""
+    import app
+
+    client = app.app.test_client()
+    rng = random.Random(args.seed)
+    results = {}
+    for endpoint in args.endpoints:
+        for _ in range(args.warmup):
+            content_type, body = _request(endpoint, rng)
+            client.post(endpoint, data=body, content_type=content_type)
+        latencies, first_bytes, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            content_type, body = _request(endpoint, random.Random(args.seed) if args.same_inputs else rng)
+            t0 = time.perf_counter()
+            resp = client.post(endpoint, data=body, content_type=content_type, buffered=False)
+            chunks = iter(resp.response)
+            next(chunks, None)
+            first_bytes.append(time.perf_counter() - t0)
+            for _ in chunks:
+                pass
+            resp.close()
+            latencies.append(time.perf_counter() - t0)
+            errors += resp.status_code >= 400
+        results[endpoint] = _summary(latencies, errors, time.perf_counter() - started, first_bytes)
+    return {
+        "endpoints": results,
+        "rss_mb": {"process": _rss_mb(os.getpid())},
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _drive_http(port: int, endpoint: str, requests: int, concurrency: int, seed: int, same_inputs: bool = False):
+    """`requests` POSTs over `concurrency` keep-alive connections; returns (latencies, first_bytes, errors, wall)."""
+    latencies, first_bytes, errors = [], [], [0]
+    lock = threading.Lock()
+    per_worker = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+
+    def worker(index: int, count: int):
+        rng = random.Random(seed * 1000 + index)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        local, local_first = [], []
+        for _ in range(count):
+            content_type, body = _request(endpoint, random.Random(seed) if same_inputs else rng)
+            t0 = time.perf_counter()
+            try:
+                conn.request("POST", endpoint, body=body, headers={"Content-Type": content_type})
+                resp = conn.getresponse()
+                resp.read1(65536)
+                local_first.append(time.perf_counter() - t0)
+                resp.read()
+                failed = resp.status >= 400
+                if resp.getheader("Connection", "").lower() == "close":
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                failed = True
+            local.append(time.perf_counter() - t0)
+            if failed:
+                with lock:
+                    errors[0] += 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            first_bytes.extend(local_first)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for future in [pool.submit(worker, i, n) for i, n in enumerate(per_worker) if n]:
+            future.result()
+    return latencies, first_bytes, errors[0], time.perf_counter() - started
+
+
+def _wait_ready(port: int, proc, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with code {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health?ready=1")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("server did not become ready in time")
+
+
+def run_gunicorn(args, env: dict) -> dict:
+    """Real server: `gunicorn -c gunicorn.conf.py app:app` with --workers sync workers."""
+    env = {**env, "PORT": str(args.port), "WEB_CONCURRENCY": str(args.workers)}
+    return _run_server(args, env, ["-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", "/dev/null", "app:app"])
+
+
+def run_uvicorn(args, env: dict) -> dict:
+    """Async serving mode: `uvicorn asgi:app` with --workers event-loop workers."""
+    return _run_server(args, env, ["-m", "uvicorn", "asgi:app", "--port", str(args.port),
+                                   "--workers", str(args.workers), "--no-access-log"])
+
+
+def _run_server(args, env: dict, argv) -> dict:
+    proc = subprocess.Popen(
+        [sys.executable, *argv], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(args.port, proc)
+        results = {}
+        for endpoint in args.endpoints:
+            _drive_http(args.port, endpoint, args.warmup, min(args.concurrency, max(args.warmup, 1)), args.seed)
+            latencies, first_bytes, errors, wall = _drive_http(args.port, endpoint, args.requests, args.concurrency, args.seed,
+                                                               args.same_inputs)
+            results[endpoint] = _summary(latencies, errors, wall, first_bytes)
+        workers = _children(proc.pid)
+        return {
+            "endpoints": results,
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "rss_mb": {"master": _rss_mb(proc.pid), **{f"worker_{pid}": _rss_mb(pid) for pid in workers}},
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _print_results(report: dict, baseline: dict | None):
+    for target, result in report["targets"].items():
+        print(f"\n[{target}]  rss_mb={result['rss_mb']}")
+        print(f"{'endpoint':<30}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ttfb ms':>10}{'req/s':>10}{'errors':>8}")
+        for endpoint, row in result["endpoints"].items():
+            line = (f"{endpoint:<30}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+                    f"{row.get('ttfb_p50_ms') or 0:>10.2f}{row['throughput_rps']:>10.1f}{row['errors']:>8}")
+            base = ((baseline or {}).get("targets", {}).get(target, {}).get("endpoints", {}).get(endpoint))
+            if base and base.get("p50_ms"):
+                line += f"   p50 {100 * (row['p50_ms'] / base['p50_ms'] - 1):+.1f}%"
+                line += f"  p99 {100 * (row['p99_ms'] / base['p99_ms'] - 1):+.1f}%"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=("testclient", "gunicorn", "uvicorn", "both", "servers"), default="both",
+                        help="both = testclient + gunicorn; servers = gunicorn + uvicorn")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="client connections (servers)")
+    parser.add_argument("--workers", type=int, default=2, help="server worker processes")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--llm-delay", type=float, default=0.05, help="stub seconds per LLM call")
+    parser.add_argument("--llm-first-token-delay", type=float, default=None,
+                        help="stub seconds before the first streamed chunk (default: --llm-delay)")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="fraction of stub 503s")
+    parser.add_argument("--explain-mode", choices=("sync", "async", "off"), default="sync")
+    parser.add_argument("--cache", choices=("off", "memory", "sqlite"), default="off", help="LLM_CACHE_BACKEND")
+    parser.add_argument("--same-inputs", action="store_true", help="send the same request body every time")
+    parser.add_argument("--coalesce", choices=("worker", "host", "off"), default="worker", help="LLM_COALESCE")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    args = parser.parse_args()
+
+    server, state, base_url = llm_stub.start(delay=args.llm_delay, failure_rate=args.llm_failure_rate,
+                                             first_token_delay=args.llm_first_token_delay)
+    env = {
+        **os.environ,
+        "GEMINI_API_BASE": base_url,
+        "GEMINI_API_KEY": "stub",
+        "GEMINI_EXPLAIN_MODE": args.explain_mode,
+        "LLM_CACHE_BACKEND": args.cache,
+        "LLM_COALESCE": args.coalesce,
+        "PYTHONWARNINGS": "ignore",
+    }
+    # The in-process app reads its config from the environment at import time.
+    os.environ.update({k: v for k, v in env.items() if k != "PYTHONWARNINGS"})
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "targets": {},
+    }
+    try:
+        if args.target in ("testclient", "both"):
+            report["targets"]["testclient"] = run_test_client(args)
+        if args.target in ("gunicorn", "both", "servers"):
+            report["targets"]["gunicorn"] = run_gunicorn(args, env)
+        if args.target in ("uvicorn", "servers"):
+            report["targets"]["uvicorn"] = run_uvicorn(args, env)
+    finally:
+        report["llm_stub"] = {"requests": state.requests, "connections": state.connections}
+        server.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_results(report, baseline)
+    print(f"\nLLM stub: {state.requests} requests over {state.connections} connections")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
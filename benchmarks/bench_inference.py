@@ -0,0 +1,64 @@
+"""Microbenchmark: per-request model inference cost.
+
+Compares the old hot path (`model.predict` + `model.predict_proba` on the same row)
+with the single-pass `_LinearScorer` used by `_predict_payload`, and checks that both
+produce identical labels and probabilities.
+
+Run from the repository root:
+
+    python benchmarks/bench_inference.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Compare against the real sklearn estimator, not the compact export.
+os.environ["MODEL_FORMAT"] = "pickle"
+
+import app  # noqa: E402
+
+
+def _random_rows(n: int, n_features: int) -> np.ndarray:
+    rng = np.random.default_rng(42)
+    rows = np.zeros((n, n_features))
+    idx = {name: i for i, name in enumerate(app.FEATURE_NAMES)}
+    rows[:, idx["income_annum"]] = rng.uniform(2e5, 1e7, n)
+    rows[:, idx["loan_amount"]] = rng.uniform(1e5, 4e7, n)
+    rows[:, idx["loan_term"]] = rng.integers(2, 361, n)
+    rows[:, idx["cibil_score"]] = rng.integers(300, 901, n)
+    return rows
+
+
+def main(repeat: int = 5, number: int = 2000):
+    bundle = app._load_artifacts()
+    model, scorer = bundle.model, bundle.scorer
+    rows = _random_rows(10_000, len(app.FEATURE_NAMES))
+
+    # Parity against sklearn on many rows (labels exact, probabilities to 1e-12).
+    labels, proba = scorer.predict(rows)
+    assert np.array_equal(labels, model.predict(rows)), "label mismatch vs model.predict"
+    assert np.allclose(proba, model.predict_proba(rows)[:, 1], rtol=0, atol=1e-12), "probability mismatch"
+    print(f"parity: OK on {len(rows)} rows")
+
+    row = rows[:1]
+
+    def old_path():
+        int(model.predict(row)[0])
+        float(model.predict_proba(row)[0][1])
+
+    def new_path():
+        labels_, proba_ = scorer.predict(row)
+        int(labels_[0])
+        float(proba_[0])
+
+    for name, fn in (("predict + predict_proba", old_path), ("_LinearScorer.predict", new_path)):
+        best = min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+        print(f"{name:<26} {best * 1e6:8.2f} µs/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Microbenchmark: pooled keep-alive client vs a fresh connection per LLM call.
+
+Drives the local Gemini stub (no network) with the old `urllib.request.urlopen`
+pattern and with `llm_client.GeminiClient`, and reports per-call latency and the
+number of TCP connections the stub accepted.
+
+    python benchmarks/bench_llm_client.py --calls 500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import llm_client  # noqa: E402
+import llm_stub  # noqa: E402
+
+
+def _urllib_call(base_url: str, prompt: str):
+    body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    req = urllib.request.Request(
+        f"{base_url}/v1beta/models/gemini-1.5-flash:generateContent?key=stub",
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=6) as resp:
+        return resp.read()
+
+
+def _run(name, fn, calls, state):
+    before = state.connections
+    timings = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    print(
+        f"{name:<22} p50 {timings[len(timings) // 2] * 1e3:7.3f} ms"
+        f"  p99 {timings[int(len(timings) * 0.99) - 1] * 1e3:7.3f} ms"
+        f"  mean {statistics.fmean(timings) * 1e3:7.3f} ms"
+        f"  connections {state.connections - before}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    server, state, base_url = llm_stub.start()
+    client = llm_client.GeminiClient(llm_client.HTTPPool(), base_url, "gemini-1.5-flash")
+    prompt = "Explain this loan decision."
+    try:
+        _run("urllib (per call)", lambda: _urllib_call(base_url, prompt), args.calls, state)
+        _run("pooled keep-alive", lambda: client.generate("stub", prompt), args.calls, state)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark: cold start and memory of the pickle vs the compact model format.
+
+For each format, a fresh interpreter imports `app`, loads the artifacts and scores one
+row; the script reports wall time, whether scikit-learn got imported and peak RSS. It
+then checks that both formats give identical labels and probabilities.
+
+    python benchmarks/bench_model_load.py
+"""
+
+import json
+import os
+import pickle
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import model_format  # noqa: E402
+
+_CHILD = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import app
+bundle = app._load_artifacts()
+bundle.scorer.predict(bundle.encoder.encode_one({"income_annum": 9e5, "loan_amount": 5e5, "loan_term": 60, "cibil_score": 750}))
+print(json.dumps({
+    "seconds": time.perf_counter() - t0,
+    "load_seconds": bundle.info["load_seconds"],
+    "sklearn_imported": "sklearn" in sys.modules,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def cold_start(fmt: str) -> dict:
+    env = {**os.environ, "MODEL_FORMAT": fmt, "PYTHONWARNINGS": "ignore"}
+    out = subprocess.run([sys.executable, "-c", _CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def parity(n: int = 20_000):
+    with open(os.path.join(ROOT, "loan_model.pkl"), "rb") as f:
+        estimator = pickle.load(f)
+    compact = model_format.load(os.path.join(ROOT, "loan_model.clm"))
+
+    rng = np.random.default_rng(7)
+    X = np.zeros((n, compact.n_features_in_))
+    idx = {name: i for i, name in enumerate(compact.feature_names)}
+    X[:, idx["income_annum"]] = rng.uniform(2e5, 1e7, n)
+    X[:, idx["loan_amount"]] = rng.uniform(1e5, 4e7, n)
+    X[:, idx["loan_term"]] = rng.integers(2, 361, n)
+    X[:, idx["cibil_score"]] = rng.integers(300, 901, n)
+    X[:, idx["education_ Not Graduate"]] = rng.integers(0, 2, n)
+
+    assert np.array_equal(compact.predict(X), estimator.predict(X)), "label mismatch"
+    assert np.allclose(compact.predict_proba(X), estimator.predict_proba(X), rtol=0, atol=1e-12), "probability mismatch"
+    print(f"parity: compact == pickle on {n} rows")
+
+
+def main():
+    for fmt in ("pickle", "compact"):
+        r = cold_start(fmt)
+        print(
+            f"{fmt:<8} import+load+score {r['seconds'] * 1e3:8.1f} ms"
+            f"  artifact load {r['load_seconds'] * 1e3:8.2f} ms"
+            f"  sklearn imported: {r['sklearn_imported']!s:<5}"
+            f"  peak RSS {r['max_rss_mb']:6.1f} MB"
+        )
+    parity()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Local stand-in for the Gemini REST API, for benchmarks and offline runs.
+
+Serves `POST /v1beta/models/<model>:generateContent` (and `:streamGenerateContent`)
+with canned JSON over HTTP/1.1 keep-alive. Delay and failure rate are configurable,
+and the server counts the TCP connections it accepted so connection reuse is visible.
+
+    python benchmarks/llm_stub.py --port 8765 --delay 0.05 --failure-rate 0.1
+    GEMINI_API_BASE=http://127.0.0.1:8765 GEMINI_API_KEY=stub python app.py
+"""
+
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_TEXT = json.dumps({
+    "reasons": ["Stable income supports the requested EMI"],
+    "suggestions": ["Keep EMIs within 40% of monthly income"],
+    "cibil_info": ["Scores above 750 usually get the best rates"],
+    "title": "Your Personalized Loan Advice",
+    "advice": [{"title": "Compare offers", "description": "Get three quotes.", "impact": "High", "category": "Savings"}],
+    "quick_tips": ["Pay on time", "Keep utilization low", "Avoid new debt"],
+    "estimated_savings": "5-10% of total interest",
+})
+
+
+class StubState:
+    def __init__(self, delay: float = 0.0, failure_rate: float = 0.0, first_token_delay: float | None = None):
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.first_token_delay = delay if first_token_delay is None else first_token_delay
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # Headers and body are separate writes; avoid Nagle/delayed-ACK stalls.
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with state.lock:
+                state.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            with state.lock:
+                state.requests += 1
+
+            if random.random() < state.failure_rate:
+                time.sleep(state.delay)
+                self._send_json(503, {"error": {"code": 503, "message": "stub failure"}})
+                return
+
+            if ":streamGenerateContent" in self.path:
+                self._stream()
+                return
+
+            time.sleep(state.delay)
+            self._send_json(200, {"candidates": [{"content": {"parts": [{"text": CANNED_TEXT}]}}]})
+
+        def _stream(self):
+            # Server-Sent Events, one chunk per word, like `?alt=sse`.
+            time.sleep(state.first_token_delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            words = "Here is a streamed answer about your EMI and tenure options.".split(" ")
+            step = max(0.0, state.delay - state.first_token_delay) / max(1, len(words))
+            for i, word in enumerate(words):
+                text = word if i == 0 else " " + word
+                event = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+                data = f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+                if step:
+                    time.sleep(step)
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Async clients open hundreds of connections at once; the default backlog is 5.
+    request_queue_size = 1024
+
+
+def start(port: int = 0, delay: float = 0.0, failure_rate: float = 0.0, first_token_delay: float | None = None):
+    """Start the stub in a background thread; returns (server, state, base_url)."""
+    state = StubState(delay, failure_rate, first_token_delay)
+    server = _Server(("127.0.0.1", port), make_handler(state))
+    # Clients that hit their latency budget hang up mid-response; that's expected here.
+    server.handle_error = lambda request, client_address: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds per response")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of 503 responses")
+    args = parser.parse_args()
+    server, state, url = start(args.port, args.delay, args.failure_rate)
+    print(f"Gemini stub listening on {url} (delay={args.delay}s, failure_rate={args.failure_rate})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Prompt assembly for /chat_advisor.
+
+`SYSTEM_PROMPT` holds everything that does not depend on the request: the advisor
+role, expertise areas, age rules, guidelines, and the EMI and affordability
+references. It is built once at import and sent as Gemini's `systemInstruction`, so
+every call starts with the same bytes and the upstream can reuse that prefix for
+context caching. Per request, only `user_prompt` is built. It contains a compact loan
+summary, the conversation history trimmed to a token budget, and the question.
+
+Token counts are estimates of about 4 characters per token, so no tokenizer is needed.
+
+Configuration (environment):
+- CHAT_HISTORY_TOKEN_BUDGET     tokens of history kept per request (default 600; 0 drops history)
+- CHAT_HISTORY_MAX_MESSAGES     most recent messages considered (default 6)
+- CHAT_HISTORY_MESSAGE_TOKENS   longer messages are cut to this many tokens (default 200)
+
+    prompt, stats = chat_prompt.user_prompt(loan_summary, history, "Should I prepay?")
+    GEMINI.generate(key, prompt, system_instruction=chat_prompt.SYSTEM_PROMPT)
+"""
+
+import os
+
+HISTORY_TOKEN_BUDGET = int(os.environ.get("CHAT_HISTORY_TOKEN_BUDGET", "600"))
+HISTORY_MAX_MESSAGES = int(os.environ.get("CHAT_HISTORY_MAX_MESSAGES", "6"))
+HISTORY_MESSAGE_TOKENS = int(os.environ.get("CHAT_HISTORY_MESSAGE_TOKENS", "200"))
+
+_CHARS_PER_TOKEN = 4
+
+# Applicant age limits per loan type: min / max age at application, max age at loan end.
+AGE_RULES = {
+    "personal": {"min": 21, "max": 60, "tenure_max": 65},
+    "home": {"min": 21, "max": 65, "tenure_max": 70},
+    "education": {"min": 18, "max": 35, "tenure_max": 45},
+    "business": {"min": 21, "max": 65, "tenure_max": 70},
+}
+
+_AGE_RULE_LINES = "\n".join(
+    f"- {loan_type.title()} Loan: Min age {rule['min']}, Max age {rule['max']}, Loan must end by age {rule['tenure_max']}"
+    for loan_type, rule in AGE_RULES.items()
+)
+
+SYSTEM_PROMPT = f"""You are an expert EMI & Loan Advisor chatbot for CrediLume loan calculator. You specialize in helping users understand EMI, optimize their loans, and make smart financial decisions.
+
+YOUR EXPERTISE AREAS:
+1. 📊 EMI CALCULATIONS - Explain how EMI works, the formula, components (principal vs interest)
+2. 💰 INTEREST OPTIMIZATION - Tips to reduce total interest paid
+3. ⏱️ TENURE PLANNING - Trade-offs between short and long tenures
+4. 🎯 PREPAYMENT STRATEGIES - When and how much to prepay
+5. 💵 AFFORDABILITY - Debt-to-income ratios, safe borrowing limits
+6. 📉 RATE COMPARISON - Fixed vs floating, negotiating better rates
+7. 🏦 LOAN SELECTION - Choosing the right loan type and lender
+8. 👤 AGE ELIGIBILITY - Loan eligibility based on applicant's age
+
+AGE ELIGIBILITY RULES:
+{_AGE_RULE_LINES}
+
+RESPONSE GUIDELINES:
+- Give SPECIFIC advice using their actual loan numbers when relevant
+- Use bullet points and clear formatting
+- Include calculations/examples when explaining concepts
+- Be concise but thorough (3-5 key points)
+- Use emojis to make responses friendly but professional
+- If they ask about their loan, reference their specific amounts
+- Always provide actionable advice they can use immediately
+- If age is provided, consider age eligibility in your advice
+
+EMI FORMULA REFERENCE:
+EMI = P × r × (1+r)^n / ((1+r)^n - 1)
+Where: P = Principal, r = Monthly interest rate, n = Number of months
+
+AFFORDABILITY RULES:
+- EMI should ideally be ≤40% of monthly income
+- Total debt payments ≤50% of income
+- Emergency fund of 6 months expenses recommended before taking loan
+
+Each message gives the user's current calculator values, the recent conversation and their question."""
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // _CHARS_PER_TOKEN)
+
+
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
+
+
+def trim_history(history, budget: int = HISTORY_TOKEN_BUDGET, max_messages: int = HISTORY_MAX_MESSAGES,
+                 message_tokens: int = HISTORY_MESSAGE_TOKENS):
+    """Most recent history lines ("User: ..." / "Assistant: ...") that fit in `budget` tokens.
+
+    Messages are taken newest first. Each one is cut to `message_tokens`, and the walk
+    stops at the first message that no longer fits. Returns (lines in chronological
+    order, number of messages left out).
+    """
+    if not isinstance(history, list):
+        history = []
+    recent = history[-max_messages:] if max_messages > 0 else []
+    max_chars = max(0, message_tokens) * _CHARS_PER_TOKEN
+    lines, used = [], 0
+    for msg in reversed(recent):
+        if not isinstance(msg, dict):
+            continue
+        content = " ".join(str(msg.get("content", "")).split())
+        if len(content) > max_chars:
+            content = content[:max(0, max_chars - 1)].rstrip() + "…"
+        line = f"{'User' if msg.get('role') == 'user' else 'Assistant'}: {content}"
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    lines.reverse()
+    return lines, len(history) - len(lines)
+
+
+def user_prompt(loan_summary: str, history, message: str):
+    """Per-request part of the prompt. Returns (prompt, stats) with token estimates in `stats`."""
+    lines, dropped = trim_history(history)
+    parts = [f"Current loan values:\n{loan_summary.strip()}"]
+    if lines:
+        earlier = f" ({dropped} earlier messages omitted)" if dropped else ""
+        parts.append(f"Previous conversation{earlier}:\n" + "\n".join(lines))
+    parts.append(f"User's question: {message}\n\nProvide helpful, specific advice:")
+    prompt = "\n\n".join(parts)
+    stats = {
+        "system_tokens": SYSTEM_PROMPT_TOKENS,
+        "request_tokens": estimate_tokens(prompt),
+        "history_messages": len(lines),
+        "history_omitted": dropped,
+    }
+    return prompt, stats
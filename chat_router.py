@@ -0,0 +1,135 @@
+"""Keyword intent router for the chat fallback (`_get_smart_fallback` in app.py).
+
+Every intent's keywords (words, `reduc*` stems and phrases) are compiled at import into
+one regex, factored as a character trie. A single `findall` over the message finds
+every keyword, and each match adds its weight to its intent's score. The highest
+score wins, and ties go to the intent listed first in `INTENTS`.
+
+Matching is on whole words, so "age" no longer fires inside "mortgage" or
+"percentage". Specific words outweigh generic ones, so "reduce EMI" routes to
+"reduce" instead of "emi", which came first in the old chain.
+
+    chat_router.route("How can I reduce my EMI?")   # -> "reduce"
+    chat_router.scores("Fixed or floating?")         # -> {"rate_type": 7}
+"""
+
+import functools
+import re
+
+# intent -> ((keyword, weight), ...). A trailing "*" makes the (last) word a stem;
+# keywords with spaces are phrases. Order is the tie-break priority (same order as
+# the original keyword chain).
+INTENTS = {
+    "age": (
+        ("age", 2), ("aged", 2), ("eligib*", 2),
+        ("old enough", 3), ("too old", 3), ("too young", 3),
+    ),
+    "emi": (
+        ("emi", 1), ("emis", 1), ("calculat*", 2), ("formula", 3), ("how is", 1), ("explain*", 1),
+    ),
+    "reduce": (
+        ("reduc*", 3), ("lower*", 2), ("save", 2), ("saves", 2), ("saved", 2), ("saving*", 2),
+        ("less interest", 3), ("minimi*", 3), ("cut", 2), ("cuts", 2), ("cutting", 2),
+    ),
+    "tenure": (
+        ("tenure", 3), ("term", 2), ("terms", 2), ("year", 1), ("years", 1), ("month", 1), ("months", 1),
+        ("short*", 1), ("long*", 1),
+    ),
+    "prepay": (
+        ("prepay*", 4), ("pre pay*", 4), ("pay off", 3), ("paying off", 3), ("early", 2),
+        ("lumpsum", 4), ("lump sum", 4), ("partpayment", 4), ("part payment", 4), ("foreclos*", 3),
+    ),
+    "afford": (
+        ("afford*", 3), ("income", 2), ("budget*", 2), ("can i", 1), ("how much", 1), ("salary", 2),
+        ("eligible amount", 3),
+    ),
+    "rate_type": (
+        ("fixed", 3), ("floating", 4), ("variable", 3), ("type of rate", 4), ("repo rate", 3),
+    ),
+    "credit": (
+        ("credit", 2), ("score", 2), ("scores", 2), ("cibil", 4), ("rating", 2),
+    ),
+}
+
+_PRIORITY = {intent: i for i, intent in enumerate(INTENTS)}
+
+
+def _trie_pattern(keywords) -> str:
+    """Regex for a set of keywords, factored as a character trie.
+
+    Shared prefixes are matched once, so the engine rejects a position after a
+    character or two instead of retrying every keyword: the Aho-Corasick idea,
+    expressed as a regex. A "*" ends a stem (`\\w*`), and a space matches any whitespace.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node) -> str:
+        alternatives = [
+            (r"\s+" if ch == " " else re.escape(ch)) + emit(child)
+            for ch, child in sorted(node.items()) if ch and ch != "*"
+        ]
+        if "*" in node:
+            # Longer keywords under a stem ("eligible amount" under "eligib*") first.
+            alternatives.append(r"\w*")
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        if "" in node:
+            body = f"(?:{body})?"
+        return body
+
+    return emit(trie)
+
+
+def _compile():
+    exact, stems = {}, []
+    for intent, keywords in INTENTS.items():
+        for keyword, weight in keywords:
+            if keyword.endswith("*"):
+                stems.append((keyword[:-1], (intent, weight)))
+            else:
+                exact[keyword] = (intent, weight)
+    # Longest stem first, so the most specific one classifies a match.
+    stems.sort(key=lambda item: -len(item[0]))
+    pattern = re.compile(r"\b(?:" + _trie_pattern([kw for keywords in INTENTS.values() for kw, _ in keywords]) + r")\b")
+    return pattern, exact, tuple(stems)
+
+
+_PATTERN, _EXACT, _STEMS = _compile()
+_SPACES = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def _classify(text: str):
+    """(intent, weight) of one matched keyword; cached per distinct matched text."""
+    text = _SPACES.sub(" ", text)
+    hit = _EXACT.get(text)
+    if hit is not None:
+        return hit
+    for stem, hit in _STEMS:
+        if text.startswith(stem):
+            return hit
+    return None
+
+
+def scores(message: str) -> dict:
+    """Score of every intent mentioned in `message` (one regex pass)."""
+    totals = {}
+    for text in _PATTERN.findall(message.lower()):
+        hit = _classify(text)
+        if hit is not None:
+            totals[hit[0]] = totals.get(hit[0], 0) + hit[1]
+    return totals
+
+
+def route(message: str):
+    """Best-scoring intent for `message`, or None when no keyword matches."""
+    totals = scores(message)
+    if not totals:
+        return None
+    return max(totals, key=lambda intent: (totals[intent], -_PRIORITY[intent]))
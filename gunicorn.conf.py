@@ -0,0 +1,48 @@
+"""Gunicorn settings for production (used by render.yaml).
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (`preload_app`), which loads and warms up the
+ML artifacts before forking, so every worker starts ready and shares the model pages
+copy-on-write instead of unpickling its own copy on the first /predict.
+
+Workers publish their /metrics samples to METRICS_DIR so a scrape of any worker
+reports totals for the whole server (see metrics.py).
+"""
+
+import os
+import tempfile
+
+# Read by app.py at import time: load + warm up artifacts eagerly.
+os.environ.setdefault("CREDILUME_PRELOAD", "1")
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"credilume_metrics_{os.environ.get('PORT', '5000')}"))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+accesslog = "-"
+
+
+def on_starting(server):
+    # Counters restart with the server; drop the previous run's worker snapshots.
+    import metrics
+
+    metrics.clear_directory(os.environ["METRICS_DIR"])
+
+
+def post_worker_init(worker):
+    # Threads don't survive fork(): start this worker's model-reload watcher and
+    # metrics flusher.
+    import app
+
+    app._REGISTRY.ensure_watcher()
+    app.metrics.REGISTRY.ensure_flusher()
+
+
+def worker_exit(server, worker):
+    # Write the final snapshot; samples since the last flush would otherwise be lost
+    # when the worker is recycled (max_requests, timeouts).
+    import metrics
+
+    metrics.REGISTRY.flush()
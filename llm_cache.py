@@ -0,0 +1,223 @@
+"""Response cache for LLM calls (Gemini explanations and advisor tips).
+
+Prompts built from loan inputs are highly repetitive, so responses are cached under a
+canonicalized, *bucketed* version of the prompt inputs (CIBIL in 10-point bands, money
+amounts on a ~5% log scale). Repeat and near-repeat requests skip the outbound call.
+
+Backends:
+- `MemoryBackend`: in-process LRU with TTL (per gunicorn worker).
+- `SQLiteBackend`: on-disk LRU with TTL, shared by every worker on the host.
+
+Configuration (environment):
+- LLM_CACHE_BACKEND   memory (default) | sqlite | off
+- LLM_CACHE_PATH      SQLite file (default: <tmp>/credilume_llm_cache.sqlite3)
+- LLM_CACHE_TTL       seconds (default 86400)
+- LLM_CACHE_MAX_ENTRIES  (default 5000)
+"""
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Money buckets: ~5% wide on a log scale.
+_LOG_BUCKET_BASE = math.log(1.05)
+
+
+def log_bucket(amount) -> int | None:
+    """Bucket a positive money amount on a log scale (None for missing / non-positive)."""
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(amount) or amount <= 0:
+        return None
+    return int(round(math.log(amount) / _LOG_BUCKET_BASE))
+
+
+def band(value, width: float):
+    """Bucket a score into fixed-width bands (e.g. CIBIL in 10-point bands)."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(value):
+        return None
+    return int(value // width)
+
+
+def make_key(namespace: str, parts) -> str:
+    """Stable cache key for JSON-serializable `parts`."""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{namespace}:{canonical}".encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """On-disk LRU with expiry; safe to share between processes (WAL mode)."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self):
+        # One connection per thread and per process (connections must not cross fork()).
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache(accessed)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str):
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT value, expires FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires < now:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value, ttl: float):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + ttl, now),
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now: float):
+        conn.execute("DELETE FROM llm_cache WHERE expires < ?", (now,))
+        conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            " SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+class LLMCache:
+    """TTL + LRU cache in front of LLM calls, with hit/miss counters."""
+
+    def __init__(self, backend=None, ttl: float = 86400):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def get(self, key: str):
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            value = None
+            with self._lock:
+                self.errors += 1
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value):
+        if self.backend is None or value is None:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses, errors = self.hits, self.misses, self.errors
+        total = hits + misses
+        return {
+            "backend": self.backend.name if self.backend is not None else "off",
+            "hits": hits,
+            "misses": misses,
+            "errors": errors,
+            "hit_ratio": round(hits / total, 4) if total else None,
+        }
+
+
+def cache_from_env() -> LLMCache:
+    kind = os.environ.get("LLM_CACHE_BACKEND", "memory").strip().lower()
+    ttl = float(os.environ.get("LLM_CACHE_TTL", "86400"))
+    max_entries = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+    if kind == "off":
+        return LLMCache(None, ttl)
+    if kind == "sqlite":
+        path = os.environ.get("LLM_CACHE_PATH") or os.path.join(
+            tempfile.gettempdir(), "credilume_llm_cache.sqlite3"
+        )
+        return LLMCache(SQLiteBackend(path, max_entries), ttl)
+    return LLMCache(MemoryBackend(max_entries), ttl)
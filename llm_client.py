@@ -0,0 +1,798 @@
+"""Pooled, keep-alive HTTP client for the Gemini REST API.
+
+One `HTTPPool` per worker process keeps persistent connections per host, so TLS
+handshakes are paid once per connection instead of once per LLM call. `AsyncHTTPPool`
+does the same on asyncio streams for the async serving mode (asgi.py), where one
+event loop awaits many LLM calls at once. Requests get
+separate connect / read timeouts and bounded retries with jittered exponential backoff.
+
+Configuration (environment):
+- GEMINI_API_BASE        default https://generativelanguage.googleapis.com (point at a stub for local runs)
+- GEMINI_MODEL           default gemini-1.5-flash
+- LLM_HTTP_POOL_SIZE     idle connections kept per host (default 8)
+- LLM_CONNECT_TIMEOUT    seconds (default 3)
+- LLM_READ_TIMEOUT       seconds (default 6)
+- LLM_MAX_RETRIES        retries after the first attempt (default 2)
+- LLM_ASYNC_POOL_SIZE    idle connections kept per host by the async pool (default 64)
+
+Every call also runs under a per-endpoint latency budget (total time including retries;
+for a stream, the time to its first chunk, after which each chunk must arrive within
+LLM_READ_TIMEOUT) and a shared `CircuitBreaker`: after N consecutive failures or slow calls, calls fail
+fast with `CircuitOpenError` for a cool-down window so callers go straight to their
+fallback path.
+
+- LLM_BUDGET_EXPLAIN / LLM_BUDGET_ADVISOR / LLM_BUDGET_CHAT   seconds (default 6 / 8 / 20)
+- LLM_BREAKER_FAILURES   consecutive failures/slow calls that open the breaker (default 5)
+- LLM_BREAKER_COOLDOWN   seconds the breaker stays open (default 30)
+- LLM_BREAKER_SLOW_FRACTION   a call slower than this fraction of its budget counts as a failure (default 0.8)
+"""
+
+import asyncio
+import http.client
+import json
+import os
+import queue
+import random
+import socket
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """The upstream LLM call did not produce a usable answer."""
+
+
+class LLMHTTPError(LLMError):
+    """Non-success HTTP status from the upstream API."""
+
+    def __init__(self, status: int, body: bytes = b""):
+        super().__init__(f"HTTP {status}: {body[:200].decode('utf-8', errors='replace')}")
+        self.status = status
+        self.body = body
+
+
+class LLMEmptyResponseError(LLMError):
+    """A 200 reply without text: the prompt or answer was blocked, or there were no candidates."""
+
+    def __init__(self, reason: str = ""):
+        super().__init__(f"Empty LLM response{f' ({reason})' if reason else ''}")
+        self.reason = reason
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open; the upstream call was not attempted."""
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker shared by all LLM calls in a worker.
+
+    - closed: calls flow; consecutive failures (or slow calls) are counted.
+    - open: calls are rejected until `cooldown` seconds have passed.
+    - half-open: a single probe call is let through; success closes the breaker,
+      failure re-opens it for another cool-down window.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return self.HALF_OPEN
+            return self._state
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (no side effects)."""
+        return self.state == self.OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """The call ended without a verdict (e.g. cancelled): let the next call probe."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        state = self.state
+        with self._lock:
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = round(max(0.0, self.cooldown - (time.monotonic() - self._opened_at)), 3)
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "cooldown_seconds": self.cooldown,
+                "retry_in_seconds": retry_in,
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected,
+            }
+
+
+class HTTPPool:
+    """Per-process pool of persistent HTTP(S) connections, keyed by (scheme, host, port)."""
+
+    def __init__(self, pool_size: int = 8, connect_timeout: float = 3.0, read_timeout: float = 6.0,
+                 max_retries: int = 2, backoff: float = 0.2):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._ssl_context = ssl.create_default_context()
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.connections_opened = 0
+
+    def _idle(self, key):
+        # Connections must never be shared across fork(); start fresh in a new process.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pools = {}
+                    self._pid = os.getpid()
+                    self.connections_opened = 0
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.setdefault(key, queue.LifoQueue(maxsize=self.pool_size))
+        return pool
+
+    def _new_connection(self, scheme: str, host: str, port: int, connect_timeout: float | None = None):
+        connect_timeout = self.connect_timeout if connect_timeout is None else connect_timeout
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=connect_timeout, context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=connect_timeout)
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self.connections_opened += 1
+        return conn
+
+    def _checkout(self, key, connect_timeout: float):
+        try:
+            return self._idle(key).get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(*key, connect_timeout=connect_timeout), False
+
+    def _backoff_sleep(self, attempt: int, deadline: float | None):
+        # Full jitter exponential backoff, never sleeping past the deadline.
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if deadline is not None:
+            delay = min(delay, max(0.0, deadline - time.monotonic()))
+        time.sleep(delay)
+
+    def _checkin(self, key, conn):
+        try:
+            self._idle(key).put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def open(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None,
+             read_timeout: float | None = None, deadline: float | None = None):
+        """Send a request and return (key, conn, response) with the body still unread.
+
+        Used for streaming; the caller must hand the connection back via `release`.
+        Bounded retries apply to connection failures and retryable statuses. `deadline`
+        (a `time.monotonic()` value) caps the total time spent, retries included.
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        read_timeout = self.read_timeout if read_timeout is None else read_timeout
+
+        attempt = 0
+        while True:
+            conn = None
+            timeout, connect_timeout = read_timeout, self.connect_timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout("LLM latency budget exhausted")
+                timeout, connect_timeout = min(timeout, remaining), min(connect_timeout, remaining)
+            try:
+                conn, reused = self._checkout(key, connect_timeout)
+                conn.sock.settimeout(timeout)
+                try:
+                    conn.request(method, path, body=body, headers=headers or {})
+                    resp = conn.getresponse()
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    if not reused:
+                        raise
+                    # The server closed an idle keep-alive connection; retry once on a fresh one.
+                    conn.close()
+                    conn = self._new_connection(*key, connect_timeout=connect_timeout)
+                    conn.sock.settimeout(timeout)
+                    conn.request(method, path, body=body, headers=headers or {})
+                    resp = conn.getresponse()
+
+                if resp.status in RETRY_STATUSES and attempt < self.max_retries:
+                    resp.read()
+                    self.release(key, conn, resp)
+                    conn = None
+                    raise LLMHTTPError(resp.status)
+                return key, conn, resp
+            except socket.timeout:
+                if conn is not None:
+                    # A read timeout already spent the latency budget; don't multiply it.
+                    conn.close()
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+                self._backoff_sleep(attempt, deadline)
+                attempt += 1
+            except (OSError, http.client.HTTPException, LLMHTTPError):
+                if conn is not None:
+                    conn.close()
+                if attempt >= self.max_retries:
+                    raise
+                self._backoff_sleep(attempt, deadline)
+                attempt += 1
+
+    def release(self, key, conn, resp):
+        if resp.will_close or not resp.isclosed():
+            conn.close()
+        else:
+            self._checkin(key, conn)
+
+    def request(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None,
+                read_timeout: float | None = None, deadline: float | None = None):
+        """Send a request over a pooled connection; returns (status, body bytes)."""
+        key, conn, resp = self.open(method, url, body=body, headers=headers, read_timeout=read_timeout,
+                                    deadline=deadline)
+        try:
+            data = resp.read()
+        except BaseException:
+            conn.close()
+            raise
+        self.release(key, conn, resp)
+        return resp.status, data
+
+
+class _AsyncResponse:
+    """Status, headers and an incrementally read body (Content-Length, chunked, or until close)."""
+
+    def __init__(self, reader, status: int, headers: dict, timeout: float):
+        self.reader = reader
+        self.status = status
+        self.headers = headers
+        self.timeout = timeout
+        self.chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        length = headers.get("content-length")
+        self._left = None if self.chunked or length is None else int(length)
+        self.will_close = headers.get("connection", "").lower() == "close" or (not self.chunked and length is None)
+        self._chunk_left = 0
+        self._buffer = b""
+        self.done = self._left == 0
+
+    async def _read_some(self) -> bytes:
+        if self.done:
+            return b""
+        if self.chunked:
+            if self._chunk_left == 0:
+                size = int((await self.reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass  # trailers
+                    self.done = True
+                    return b""
+                self._chunk_left = size
+            data = await self.reader.read(min(self._chunk_left, 65536))
+            if not data:
+                raise http.client.IncompleteRead(b"")
+            self._chunk_left -= len(data)
+            if self._chunk_left == 0:
+                await self.reader.readexactly(2)
+            return data
+        if self._left is not None:
+            data = await self.reader.read(min(self._left, 65536))
+            if not data:
+                raise http.client.IncompleteRead(b"", self._left)
+            self._left -= len(data)
+            self.done = self._left == 0
+            return data
+        data = await self.reader.read(65536)
+        self.done = not data
+        return data
+
+    async def read_some(self) -> bytes:
+        """Next piece of the body (b"" at the end), bounded by `timeout`."""
+        return await asyncio.wait_for(self._read_some(), self.timeout)
+
+    async def read(self) -> bytes:
+        parts = [self._buffer]
+        self._buffer = b""
+        while not self.done:
+            parts.append(await self.read_some())
+        return b"".join(parts)
+
+    async def readline(self) -> bytes:
+        while b"\n" not in self._buffer and not self.done:
+            self._buffer += await self.read_some()
+        line, sep, rest = self._buffer.partition(b"\n")
+        self._buffer = rest
+        return line + sep
+
+
+class AsyncHTTPPool:
+    """asyncio counterpart of `HTTPPool`: keep-alive HTTP/1.1 connections for one event loop.
+
+    Same timeouts, retry and backoff rules as `HTTPPool`; a connection is (reader, writer).
+    """
+
+    def __init__(self, pool_size: int = 8, connect_timeout: float = 3.0, read_timeout: float = 6.0,
+                 max_retries: int = 2, backoff: float = 0.2):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._ssl_context = ssl.create_default_context()
+        self._pools = {}
+        self._loop = None
+        self.connections_opened = 0
+
+    def _idle(self, key) -> list:
+        # Streams belong to the loop that opened them.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._pools = {}
+            self._loop = loop
+            self.connections_opened = 0
+        return self._pools.setdefault(key, [])
+
+    async def _new_connection(self, scheme: str, host: str, port: int, connect_timeout: float):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=self._ssl_context if scheme == "https" else None),
+            connect_timeout,
+        )
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connections_opened += 1
+        return reader, writer
+
+    async def _send(self, conn, key, method: str, path: str, body: bytes | None, headers: dict, timeout: float):
+        reader, writer = conn
+        body = body or b""
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {key[1]}" + ("" if key[2] in (80, 443) else f":{key[2]}"),
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        async def head():
+            status_line = await reader.readline()
+            if not status_line:
+                raise http.client.RemoteDisconnected("Remote end closed connection without response")
+            status = int(status_line.split(None, 2)[1])
+            fields = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                fields[name.strip().lower()] = value.strip()
+            return status, fields
+
+        status, fields = await asyncio.wait_for(head(), timeout)
+        return _AsyncResponse(reader, status, fields, timeout)
+
+    def _close(self, conn):
+        conn[1].close()
+
+    def release(self, key, conn, resp):
+        idle = self._idle(key)
+        if resp.will_close or not resp.done or len(idle) >= self.pool_size or conn[0].at_eof():
+            self._close(conn)
+        else:
+            idle.append(conn)
+
+    async def _backoff_sleep(self, attempt: int, deadline: float | None):
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if deadline is not None:
+            delay = min(delay, max(0.0, deadline - time.monotonic()))
+        await asyncio.sleep(delay)
+
+    async def open(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None,
+                   read_timeout: float | None = None, deadline: float | None = None):
+        """Send a request and return (key, conn, response) with the body still unread (see `HTTPPool.open`)."""
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        read_timeout = self.read_timeout if read_timeout is None else read_timeout
+
+        attempt = 0
+        while True:
+            conn = None
+            timeout, connect_timeout = read_timeout, self.connect_timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout("LLM latency budget exhausted")
+                timeout, connect_timeout = min(timeout, remaining), min(connect_timeout, remaining)
+            try:
+                idle = self._idle(key)
+                reused = bool(idle)
+                conn = idle.pop() if idle else await self._new_connection(*key, connect_timeout)
+                try:
+                    resp = await self._send(conn, key, method, path, body, headers or {}, timeout)
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    if not reused:
+                        raise
+                    # The server closed an idle keep-alive connection; retry once on a fresh one.
+                    self._close(conn)
+                    conn = await self._new_connection(*key, connect_timeout)
+                    resp = await self._send(conn, key, method, path, body, headers or {}, timeout)
+
+                if resp.status in RETRY_STATUSES and attempt < self.max_retries:
+                    await resp.read()
+                    self.release(key, conn, resp)
+                    conn = None
+                    raise LLMHTTPError(resp.status)
+                return key, conn, resp
+            except asyncio.TimeoutError:
+                if conn is not None:
+                    self._close(conn)
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+                await self._backoff_sleep(attempt, deadline)
+                attempt += 1
+            except (OSError, ValueError, http.client.HTTPException, LLMHTTPError):
+                if conn is not None:
+                    self._close(conn)
+                if attempt >= self.max_retries:
+                    raise
+                await self._backoff_sleep(attempt, deadline)
+                attempt += 1
+
+    async def request(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None,
+                      read_timeout: float | None = None, deadline: float | None = None):
+        """Send a request over a pooled connection; returns (status, body bytes)."""
+        key, conn, resp = await self.open(method, url, body=body, headers=headers, read_timeout=read_timeout,
+                                          deadline=deadline)
+        try:
+            data = await resp.read()
+        except BaseException:
+            self._close(conn)
+            raise
+        self.release(key, conn, resp)
+        return resp.status, data
+
+
+class GeminiClient:
+    """Minimal Gemini `generateContent` / `streamGenerateContent` client on top of `HTTPPool`
+    (and `AsyncHTTPPool` for the `agenerate` / `astream` coroutines).
+
+    Calls are guarded by `breaker` and bounded by the latency budget of the calling
+    endpoint (`budgets`, seconds; "default" is used for unknown endpoints).
+    """
+
+    def __init__(self, pool: HTTPPool, base_url: str, model: str, breaker: CircuitBreaker | None = None,
+                 budgets: dict | None = None, slow_fraction: float = 0.8, async_pool: AsyncHTTPPool | None = None):
+        self.pool = pool
+        # Used by `agenerate` / `astream`; defaults to the sync pool's settings.
+        self.async_pool = async_pool or AsyncHTTPPool(pool.pool_size, pool.connect_timeout, pool.read_timeout,
+                                                      pool.max_retries, pool.backoff)
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.breaker = breaker or CircuitBreaker()
+        self.budgets = {"default": pool.read_timeout, **(budgets or {})}
+        self.slow_fraction = slow_fraction
+        # Optional `on_call(endpoint, outcome, seconds)` hook for metrics; outcome is
+        # "success", "failure", "rejected" (breaker open, seconds is None) or "cancelled"
+        # (caller cancelled or stream consumer gone mid-call; not counted against the breaker).
+        self.on_call = None
+
+    def budget(self, endpoint: str) -> float:
+        return self.budgets.get(endpoint, self.budgets["default"])
+
+    def _report(self, endpoint: str, outcome: str, seconds: float | None):
+        if self.on_call is not None:
+            try:
+                self.on_call(endpoint, outcome, seconds)
+            except Exception:
+                pass
+
+    def _begin(self, endpoint: str, timeout: float | None):
+        """Admit one call through the breaker; returns (budget seconds, start time)."""
+        if not self.breaker.allow():
+            self._report(endpoint, "rejected", None)
+            raise CircuitOpenError(f"LLM circuit open; skipping {endpoint} call")
+        budget = self.budget(endpoint) if timeout is None else timeout
+        return budget, time.monotonic()
+
+    def _succeeded(self, endpoint: str, budget: float, started: float, latency: float | None = None):
+        # `latency` is what the slow-call rule judges (streams pass their time to first chunk).
+        elapsed = time.monotonic() - started
+        self._report(endpoint, "success", elapsed)
+        if (elapsed if latency is None else latency) > budget * self.slow_fraction:
+            # Succeeded, but so slowly that the next call will likely blow the budget.
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _failed(self, endpoint: str, started: float):
+        self.breaker.record_failure()
+        self._report(endpoint, "failure", time.monotonic() - started)
+
+    def _cancelled(self, endpoint: str, started: float):
+        # Our side gave up (client disconnect, task cancelled): no evidence about the upstream.
+        self.breaker.release_probe()
+        self._report(endpoint, "cancelled", time.monotonic() - started)
+
+    def _guarded(self, endpoint: str, timeout: float | None, call):
+        """Run `call(deadline)` under the breaker and the endpoint's latency budget."""
+        budget, started = self._begin(endpoint, timeout)
+        try:
+            result = call(started + budget)
+        except BaseException:
+            self._failed(endpoint, started)
+            raise
+        self._succeeded(endpoint, budget, started)
+        return result
+
+    def _url(self, model: str | None, method: str) -> str:
+        return f"{self.base_url}/v1beta/models/{model or self.model}:{method}"
+
+    def _post(self, api_key: str, model: str | None, method: str, body: dict):
+        """(url, body bytes, headers) of one Gemini REST call."""
+        url = self._url(model, method) + ("?alt=sse" if method == "streamGenerateContent" else "")
+        headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+        return url, json.dumps(body).encode("utf-8"), headers
+
+    def _sse_text(self, line: bytes) -> str:
+        if not line.startswith(b"data:"):
+            return ""
+        return self.response_text(json.loads(line[5:].decode("utf-8", errors="replace")))
+
+    def build_body(self, prompt: str, temperature: float | None = None, max_output_tokens: int | None = None,
+                   system_instruction: str | None = None) -> dict:
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if system_instruction:
+            body["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+        config = {}
+        if temperature is not None:
+            config["temperature"] = temperature
+        if max_output_tokens is not None:
+            config["maxOutputTokens"] = max_output_tokens
+        if config:
+            body["generationConfig"] = config
+        return body
+
+    @staticmethod
+    def response_text(data: dict) -> str:
+        """Text of the first candidate ("" when there is none, e.g. a stream's closing chunk)."""
+        candidate = (data.get("candidates") or [{}])[0]
+        parts = candidate.get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    @classmethod
+    def completion_text(cls, data: dict) -> str:
+        """`response_text` of a whole reply; raises `LLMEmptyResponseError` if it has no text."""
+        text = cls.response_text(data)
+        if not text.strip():
+            candidate = (data.get("candidates") or [{}])[0]
+            raise LLMEmptyResponseError(data.get("promptFeedback", {}).get("blockReason")
+                                        or candidate.get("finishReason") or "no candidates")
+        return text
+
+    def generate(self, api_key: str, prompt: str, *, endpoint: str = "default", model: str | None = None,
+                 temperature: float | None = None, max_output_tokens: int | None = None,
+                 system_instruction: str | None = None, timeout: float | None = None) -> str:
+        """Run one `generateContent` call and return the concatenated response text.
+
+        Raises `CircuitOpenError` without calling upstream while the breaker is open, and
+        `LLMEmptyResponseError` for a blocked or empty reply (the upstream itself is
+        healthy, so that does not count against the breaker).
+        """
+        body = self.build_body(prompt, temperature, max_output_tokens, system_instruction)
+
+        url, data, headers = self._post(api_key, model, "generateContent", body)
+
+        def call(deadline):
+            status, raw = self.pool.request("POST", url, body=data, headers=headers, deadline=deadline)
+            if status != 200:
+                raise LLMHTTPError(status, raw)
+            return json.loads(raw.decode("utf-8", errors="replace"))
+
+        return self.completion_text(self._guarded(endpoint, timeout, call))
+
+    def stream(self, api_key: str, prompt: str, *, endpoint: str = "default", model: str | None = None,
+               temperature: float | None = None, max_output_tokens: int | None = None,
+               system_instruction: str | None = None, timeout: float | None = None):
+        """Run one `streamGenerateContent` call (`alt=sse`), yielding text chunks as they arrive.
+
+        Nothing is sent until the first `next()`, which raises (like `generate`) if the
+        breaker is open or the upstream fails before its first chunk. The latency budget
+        and the slow-call rule apply to the first chunk; after it, each chunk only has to
+        arrive within the pool's read timeout, so a long answer is not cut off for its
+        length. Closing the generator early closes the connection.
+        """
+        budget, started = self._begin(endpoint, timeout)
+        deadline = started + budget
+        first_chunk = None  # seconds from the start to the first text chunk
+        body = self.build_body(prompt, temperature, max_output_tokens, system_instruction)
+        conn = None
+        try:
+            url, data, headers = self._post(api_key, model, "streamGenerateContent", body)
+            key, conn, resp = self.pool.open("POST", url, body=data, headers=headers, deadline=deadline)
+            if resp.status != 200:
+                raise LLMHTTPError(resp.status, resp.read())
+            while True:
+                idle = self.pool.read_timeout
+                if first_chunk is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise socket.timeout("LLM latency budget exhausted")
+                    idle = min(idle, remaining)
+                conn.sock.settimeout(idle)
+                line = resp.readline()
+                if not line:
+                    break
+                text = self._sse_text(line)
+                if text:
+                    if first_chunk is None:
+                        first_chunk = time.monotonic() - started
+                    yield text
+            self.pool.release(key, conn, resp)
+            conn = None
+        except GeneratorExit:
+            # The consumer went away (client disconnect): no verdict on the upstream.
+            self._cancelled(endpoint, started)
+            raise
+        except BaseException:
+            self._failed(endpoint, started)
+            raise
+        finally:
+            if conn is not None:
+                conn.close()
+        self._succeeded(endpoint, budget, started, first_chunk)
+
+    async def agenerate(self, api_key: str, prompt: str, *, endpoint: str = "default", model: str | None = None,
+                        temperature: float | None = None, max_output_tokens: int | None = None,
+                        system_instruction: str | None = None, timeout: float | None = None) -> str:
+        """`generate` for asyncio code: same breaker, budget and metrics, awaited on `async_pool`."""
+        budget, started = self._begin(endpoint, timeout)
+        body = self.build_body(prompt, temperature, max_output_tokens, system_instruction)
+        url, data, headers = self._post(api_key, model, "generateContent", body)
+        try:
+            status, raw = await self.async_pool.request("POST", url, body=data, headers=headers,
+                                                        deadline=started + budget)
+            if status != 200:
+                raise LLMHTTPError(status, raw)
+            reply = json.loads(raw.decode("utf-8", errors="replace"))
+        except asyncio.CancelledError:
+            self._cancelled(endpoint, started)
+            raise
+        except BaseException:
+            self._failed(endpoint, started)
+            raise
+        self._succeeded(endpoint, budget, started)
+        return self.completion_text(reply)
+
+    async def astream(self, api_key: str, prompt: str, *, endpoint: str = "default", model: str | None = None,
+                      temperature: float | None = None, max_output_tokens: int | None = None,
+                      system_instruction: str | None = None, timeout: float | None = None):
+        """`stream` for asyncio code: an async generator of text chunks (same budget rules)."""
+        budget, started = self._begin(endpoint, timeout)
+        deadline = started + budget
+        first_chunk = None
+        body = self.build_body(prompt, temperature, max_output_tokens, system_instruction)
+        conn = None
+        try:
+            url, data, headers = self._post(api_key, model, "streamGenerateContent", body)
+            key, conn, resp = await self.async_pool.open("POST", url, body=data, headers=headers, deadline=deadline)
+            if resp.status != 200:
+                raise LLMHTTPError(resp.status, await resp.read())
+            while True:
+                idle = self.async_pool.read_timeout
+                if first_chunk is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise socket.timeout("LLM latency budget exhausted")
+                    idle = min(idle, remaining)
+                resp.timeout = idle
+                line = await resp.readline()
+                if not line:
+                    break
+                text = self._sse_text(line)
+                if text:
+                    if first_chunk is None:
+                        first_chunk = time.monotonic() - started
+                    yield text
+            self.async_pool.release(key, conn, resp)
+            conn = None
+        except (GeneratorExit, asyncio.CancelledError):
+            self._cancelled(endpoint, started)
+            raise
+        except BaseException:
+            self._failed(endpoint, started)
+            raise
+        finally:
+            if conn is not None:
+                self.async_pool._close(conn)
+        self._succeeded(endpoint, budget, started, first_chunk)
+
+
+def client_from_env() -> GeminiClient:
+    pool = HTTPPool(
+        pool_size=int(os.environ.get("LLM_HTTP_POOL_SIZE", "8")),
+        connect_timeout=float(os.environ.get("LLM_CONNECT_TIMEOUT", "3")),
+        read_timeout=float(os.environ.get("LLM_READ_TIMEOUT", "6")),
+        max_retries=int(os.environ.get("LLM_MAX_RETRIES", "2")),
+    )
+    async_pool = AsyncHTTPPool(
+        pool_size=int(os.environ.get("LLM_ASYNC_POOL_SIZE", "64")),
+        connect_timeout=pool.connect_timeout,
+        read_timeout=pool.read_timeout,
+        max_retries=pool.max_retries,
+    )
+    breaker = CircuitBreaker(
+        failure_threshold=int(os.environ.get("LLM_BREAKER_FAILURES", "5")),
+        cooldown=float(os.environ.get("LLM_BREAKER_COOLDOWN", "30")),
+    )
+    return GeminiClient(
+        pool,
+        os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com"),
+        os.environ.get("GEMINI_MODEL", "gemini-1.5-flash"),
+        breaker=breaker,
+        budgets={
+            "explain": float(os.environ.get("LLM_BUDGET_EXPLAIN", "6")),
+            "advisor": float(os.environ.get("LLM_BUDGET_ADVISOR", "8")),
+            "chat": float(os.environ.get("LLM_BUDGET_CHAT", "20")),
+        },
+        slow_fraction=float(os.environ.get("LLM_BREAKER_SLOW_FRACTION", "0.8")),
+        async_pool=async_pool,
+    )
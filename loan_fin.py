@@ -1,101 +1,616 @@
 # -*- coding: utf-8 -*-
-"""loan_fin.ipynb
+"""Train the loan approval model and write every serving artifact in one go.
 
-Automatically generated by Colab.
+    python loan_fin.py --data loan.csv
+    python loan_fin.py --data history.parquet --out-dir build/ --chunksize 500000
 
-Original file is located at
-    https://colab.research.google.com/drive/1ApUftH9s0D0FevJitYmS9ZBr99J-Dl3d
-"""
-
-import pandas as pd
-
-df = pd.read_csv("loan.csv")
+The dataset is read once, with explicit dtypes (in chunks for CSV, column-pruned for
+Parquet). A one-hot encoder is fitted on it and persisted, and the encoded matrix is
+built directly in its final column order. The run then writes, from that single
+source of truth:
 
-# Remove extra spaces from column names
-df.columns = df.columns.str.strip()
+    loan_model.pkl        fitted scikit-learn estimator
+    features.pkl          feature names, in model column order
+    loan_model.clm        pickle-free export used for serving (see model_format.py)
+    model_manifest.json   data hash, encoder, metrics, timings, versions
 
-# Convert target to binary
-df['loan_status'] = df['loan_status'].map({
-    'Approved': 1,
-    'Rejected': 0
-})
-
-# Convert categorical columns
-df = pd.get_dummies(df, drop_first=True)
-
-df.head()
-
-import pandas as pd
-import numpy as np
+Every file is written atomically (temp file + rename), so a running app that
+hot-reloads artifacts never sees a half-written file.
 
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import accuracy_score, classification_report
+Originally a Colab notebook (loan_fin.ipynb).
+"""
 
+import argparse
+import json
+import os
 import pickle
+import platform
+import time
 
-# Load dataset
-df = pd.read_csv("loan.csv")
-
-# Remove extra spaces from column names
-df.columns = df.columns.str.strip()
-
-# Check first rows
-df.head()
-
-# Load dataset again to ensure 'loan_status' is string type
-df = pd.read_csv("loan.csv")
-
-# Remove extra spaces from column names (as done in other cells)
-df.columns = df.columns.str.strip()
-
-# Convert loan_status to binary
-df['loan_status'] = df['loan_status'].str.strip().map({
-    'Approved': 1,
-    'Rejected': 0
-})
-
-df['loan_status'].value_counts()
-
-# Convert categorical columns into numeric
-df = pd.get_dummies(df, drop_first=True)
-
-df.head()
-
-X = df.drop("loan_status", axis=1)
-y = df["loan_status"]
-
-X.shape, y.shape
-
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y,
-    test_size=0.2,
-    random_state=42
-)
-
-valid_indices = y_train.dropna().index
-
-
-X_train_cleaned = X_train.loc[valid_indices]
-y_train_cleaned = y_train.loc[valid_indices]
-
-model = LogisticRegression(max_iter=1000)
-model.fit(X_train_cleaned, y_train_cleaned)
-
-y_pred = model.predict(X_test)
-
-print("Accuracy:", accuracy_score(y_test, y_pred))
-print("\nClassification Report:\n")
-print(classification_report(y_test, y_pred))
-
-importance = model.coef_[0]
-features = X.columns
-
-explain_df = pd.DataFrame({
-    "Feature": features,
-    "Impact": importance
-}).sort_values(by="Impact", ascending=False)
-
-explain_df.head(10)
+import numpy as np
+import pandas as pd
 
-pickle.dump(model, open("loan_model.pkl", "wb"))
\ No newline at end of file
+import model_format
+
+TARGET = "loan_status"
+TARGET_MAP = {"Approved": 1, "Rejected": 0}
+
+# Column name (whitespace-stripped) -> dtype. Order defines the model's feature order:
+# numeric columns first, then the one-hot columns of CATEGORICAL in this order.
+NUMERIC = {
+    "loan_id": "int64",
+    "no_of_dependents": "int8",
+    "income_annum": "float64",
+    "loan_amount": "float64",
+    "loan_term": "int16",
+    "cibil_score": "int16",
+    "residential_assets_value": "float64",
+    "commercial_assets_value": "float64",
+    "luxury_assets_value": "float64",
+    "bank_asset_value": "float64",
+}
+CATEGORICAL = ("education", "self_employed")
+
+
+class OneHotEncoder:
+    """`pd.get_dummies(drop_first=True)` fitted once and replayable on any frame.
+
+    Levels are kept verbatim (the raw CSV has leading spaces, hence feature names such
+    as ``education_ Not Graduate``), so the serving encoder in app.py sees the same
+    names the model was trained on.
+    """
+
+    def __init__(self, numeric=(), levels=None):
+        self.numeric = list(numeric)
+        self.levels = {column: list(values) for column, values in (levels or {}).items()}
+
+    @classmethod
+    def fit(cls, frame: pd.DataFrame, numeric, categorical):
+        levels = {}
+        for column in categorical:
+            values = frame[column].astype("category").cat.categories
+            levels[column] = sorted(str(v) for v in values)
+        return cls(numeric, levels)
+
+    @property
+    def feature_names(self):
+        names = list(self.numeric)
+        for column, values in self.levels.items():
+            # drop_first: the first (sorted) level is the all-zeros baseline.
+            names.extend(f"{column}_{value}" for value in values[1:])
+        return names
+
+    def transform(self, frame: pd.DataFrame) -> np.ndarray:
+        X = np.zeros((len(frame), len(self.feature_names)), dtype=np.float64)
+        for j, column in enumerate(self.numeric):
+            X[:, j] = frame[column].to_numpy(dtype=np.float64)
+        j = len(self.numeric)
+        for column, values in self.levels.items():
+            raw = frame[column].astype(str).to_numpy()
+            for value in values[1:]:
+                X[:, j] = raw == value
+                j += 1
+        return X
+
+    def to_dict(self) -> dict:
+        return {"numeric": self.numeric, "levels": self.levels, "feature_names": self.feature_names}
+
+    @classmethod
+    def from_dict(cls, spec: dict):
+        return cls(spec["numeric"], spec["levels"])
+
+
+def _raw_names(path: str, wanted) -> dict:
+    """Map stripped column names to the raw header (the CSV pads names with spaces)."""
+    header = pd.read_csv(path, nrows=0).columns
+    raw = {name.strip(): name for name in header}
+    missing = [name for name in wanted if name not in raw]
+    if missing:
+        raise SystemExit(f"{path} is missing columns: {missing}")
+    return raw
+
+
+def iter_chunks(path: str, chunksize: int = 250_000):
+    """Yield the model's columns in fixed-size chunks, names stripped, dtypes explicit."""
+    wanted = [*NUMERIC, *CATEGORICAL, TARGET]
+    dtypes = {**NUMERIC, **{name: "category" for name in (*CATEGORICAL, TARGET)}}
+
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        raw = {name.strip(): name for name in parquet.schema_arrow.names}
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=[raw[name] for name in wanted]):
+            frame = batch.to_pandas()
+            frame.columns = frame.columns.str.strip()
+            yield frame[wanted].astype(dtypes)
+        return
+
+    raw = _raw_names(path, wanted)
+    for frame in pd.read_csv(
+        path,
+        usecols=[raw[name] for name in wanted],
+        dtype={raw[name]: dtype for name, dtype in dtypes.items()},
+        chunksize=chunksize,
+    ):
+        frame.columns = frame.columns.str.strip()
+        yield frame[wanted]
+
+
+def read_dataset(path: str, chunksize: int = 250_000) -> pd.DataFrame:
+    """Read only the columns the model uses, with compact dtypes, in a single pass."""
+    frame = pd.concat(iter_chunks(path, chunksize), ignore_index=True)
+    # Chunks may see different category sets; unify once at the end.
+    for name in (*CATEGORICAL, TARGET):
+        frame[name] = frame[name].astype(str).astype("category")
+    return frame
+
+
+def encode_target(frame: pd.DataFrame):
+    """Binary target; rows whose status is neither Approved nor Rejected are dropped."""
+    y = frame[TARGET].astype(str).str.strip().map(TARGET_MAP)
+    keep = y.notna().to_numpy()
+    return keep, y.to_numpy()[keep].astype(np.int8)
+
+
+def split_indices(n: int, test_size: float, seed: int):
+    from sklearn.model_selection import train_test_split
+
+    return train_test_split(np.arange(n), test_size=test_size, random_state=seed)
+
+
+def train_logistic(X, y, max_iter: int = 1000, C: float = 1.0):
+    from sklearn.linear_model import LogisticRegression
+
+    model = LogisticRegression(max_iter=max_iter, C=C)
+    model.fit(X, y)
+    return model
+
+
+def evaluate(model, X, y, threshold: float = 0.5) -> dict:
+    return classification_metrics(y, model.predict_proba(X)[:, 1], threshold)
+
+
+def classification_metrics(y, proba, threshold: float = 0.5) -> dict:
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+
+    pred = (proba > threshold).astype(np.int8)
+    return {
+        "rows": int(len(y)),
+        "threshold": threshold,
+        "accuracy": round(float(accuracy_score(y, pred)), 6),
+        "precision": round(float(precision_score(y, pred, zero_division=0)), 6),
+        "recall": round(float(recall_score(y, pred, zero_division=0)), 6),
+        "f1": round(float(f1_score(y, pred, zero_division=0)), 6),
+        "roc_auc": round(float(roc_auc_score(y, proba)), 6) if len(np.unique(y)) == 2 else None,
+    }
+
+
+# ── Incremental (out-of-core) training ───────────────────────────────────────
+#
+# Memory stays bounded by one chunk: pass 1 streams the data for categorical levels
+# and numeric mean/std, then each epoch streams it again into SGDClassifier.partial_fit
+# on standardized features. The scaler is folded into coef_/intercept_ at the end, so
+# the exported model scores raw features like the batch model does. The held-out
+# split is a seeded per-chunk mask, identical in every pass (and in --compare-batch).
+
+
+def _holdout_mask(chunk_index: int, n: int, test_size: float, seed: int) -> np.ndarray:
+    return np.random.default_rng([seed, chunk_index]).random(n) < test_size
+
+
+class RunningMoments:
+    """Per-column mean/variance over streamed chunks (Chan et al. pairwise update)."""
+
+    def __init__(self, n_columns: int):
+        self.n = 0
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+
+    def update(self, X: np.ndarray):
+        n_b = len(X)
+        if not n_b:
+            return
+        mean_b = X.mean(axis=0)
+        m2_b = ((X - mean_b) ** 2).sum(axis=0)
+        delta = mean_b - self.mean
+        total = self.n + n_b
+        self.mean = self.mean + delta * (n_b / total)
+        self.m2 = self.m2 + m2_b + delta ** 2 * (self.n * n_b / total)
+        self.n = total
+
+    @property
+    def scale(self) -> np.ndarray:
+        std = np.sqrt(self.m2 / max(self.n, 1))
+        std[std == 0] = 1.0
+        return std
+
+
+def _encoded_chunks(path: str, chunksize: int, encoder: OneHotEncoder):
+    for chunk_index, frame in enumerate(iter_chunks(path, chunksize)):
+        keep, y = encode_target(frame)
+        yield chunk_index, encoder.transform(frame[keep]), y
+
+
+def _scan(path: str, chunksize: int, test_size: float, seed: int):
+    """Pass 1: categorical levels, plus mean/std of the numeric training columns."""
+    levels = {column: set() for column in CATEGORICAL}
+    moments = RunningMoments(len(NUMERIC))
+    rows = rows_used = 0
+    for chunk_index, frame in enumerate(iter_chunks(path, chunksize)):
+        keep, y = encode_target(frame)
+        frame = frame[keep]
+        rows += len(keep)
+        rows_used += len(y)
+        for column in CATEGORICAL:
+            levels[column].update(str(v) for v in frame[column].unique())
+        train = ~_holdout_mask(chunk_index, len(y), test_size, seed)
+        moments.update(frame[list(NUMERIC)].to_numpy(dtype=np.float64)[train])
+
+    encoder = OneHotEncoder(NUMERIC, {column: sorted(values) for column, values in levels.items()})
+    n_onehot = len(encoder.feature_names) - len(NUMERIC)
+    # One-hot columns are already 0/1; only the numeric block is standardized.
+    mean = np.concatenate([moments.mean, np.zeros(n_onehot)])
+    scale = np.concatenate([moments.scale, np.ones(n_onehot)])
+    return encoder, mean, scale, {"rows": rows, "rows_used": rows_used}
+
+
+def fold_scaler(model, mean: np.ndarray, scale: np.ndarray):
+    """Return a copy of a linear model fitted on (X - mean) / scale that scores raw X."""
+    import copy
+
+    folded = copy.deepcopy(model)
+    folded.coef_ = model.coef_ / scale
+    folded.intercept_ = model.intercept_ - folded.coef_ @ mean
+    return folded
+
+
+def _save_checkpoint(path: str, state: dict):
+    _atomic_write(path, pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def train_incremental(args, data_sha256: str, lap):
+    """Stream the data through SGD in chunks; returns (model, encoder, metrics, data, params)."""
+    from sklearn.linear_model import SGDClassifier
+
+    checkpoint_path = args.checkpoint or os.path.join(args.out_dir, "train_checkpoint.pkl")
+    state = None
+    if args.resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "rb") as f:
+            state = pickle.load(f)
+        if state["data_sha256"] != data_sha256:
+            raise SystemExit(f"{checkpoint_path} was written for different data; drop --resume to start over")
+        print(f"resuming from epoch {state['epoch']} chunk {state['chunk']} ({state['rows_seen']} rows seen)")
+
+    if state is None:
+        encoder, mean, scale, counts = _scan(args.data, args.chunksize, args.test_size, args.seed)
+        state = {
+            "data_sha256": data_sha256,
+            "encoder": encoder.to_dict(),
+            "mean": mean,
+            "scale": scale,
+            "counts": counts,
+            "model": SGDClassifier(loss="log_loss", alpha=args.alpha, random_state=args.seed),
+            "epoch": 0,
+            "chunk": -1,
+            "rows_seen": 0,
+        }
+    lap("scan_seconds")
+
+    encoder = OneHotEncoder.from_dict(state["encoder"])
+    sgd, mean, scale = state["model"], state["mean"], state["scale"]
+    os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+
+    for epoch in range(state["epoch"], args.epochs):
+        for chunk_index, X, y in _encoded_chunks(args.data, args.chunksize, encoder):
+            if epoch == state["epoch"] and chunk_index <= state["chunk"]:
+                continue  # already trained before the checkpoint
+            train = ~_holdout_mask(chunk_index, len(y), args.test_size, args.seed)
+            # Seeded per (epoch, chunk) so a resumed run replays the same shuffles.
+            order = np.random.default_rng([args.seed, epoch, chunk_index]).permutation(int(train.sum()))
+            sgd.partial_fit(((X[train] - mean) / scale)[order], y[train][order], classes=np.array([0, 1]))
+            state.update(epoch=epoch, chunk=chunk_index, rows_seen=state["rows_seen"] + len(order))
+            if (chunk_index + 1) % args.checkpoint_every == 0:
+                _save_checkpoint(checkpoint_path, state)
+        state.update(epoch=epoch + 1, chunk=-1)
+        _save_checkpoint(checkpoint_path, state)
+    lap("fit_seconds")
+
+    model = fold_scaler(sgd, mean, scale)
+    proba = {"train": [], "test": []}
+    labels = {"train": [], "test": []}
+    chunk_lengths = []
+    for chunk_index, X, y in _encoded_chunks(args.data, args.chunksize, encoder):
+        test = _holdout_mask(chunk_index, len(y), args.test_size, args.seed)
+        p = model.predict_proba(X)[:, 1].astype(np.float32)
+        for split, mask in (("train", ~test), ("test", test)):
+            proba[split].append(p[mask])
+            labels[split].append(y[mask])
+        chunk_lengths.append(len(y))
+    metrics = {
+        split: classification_metrics(np.concatenate(labels[split]), np.concatenate(proba[split]))
+        for split in ("train", "test")
+    }
+    lap("evaluate_seconds")
+
+    if args.compare_batch:
+        frame = read_dataset(args.data, args.chunksize)
+        keep, y = encode_target(frame)
+        X = encoder.transform(frame[keep])
+        del frame
+        test = np.concatenate([
+            _holdout_mask(i, n, args.test_size, args.seed) for i, n in enumerate(chunk_lengths)
+        ])
+        batch = train_logistic(X[~test], y[~test], max_iter=args.max_iter, C=args.C)
+        metrics["batch_test"] = evaluate(batch, X[test], y[test])
+        lap("compare_batch_seconds")
+
+    labels_all = np.concatenate(labels["train"] + labels["test"])
+    data = {**state["counts"], "positive_rate": round(float(labels_all.mean()), 6)}
+    params = {
+        "estimator": "SGDClassifier(loss=log_loss), scaler folded into coef",
+        "alpha": args.alpha,
+        "epochs": args.epochs,
+        "chunksize": args.chunksize,
+        "rows_seen": state["rows_seen"],
+    }
+    return model, encoder, metrics, data, params
+
+
+# ── Hyperparameter and threshold search ──────────────────────────────────────
+#
+# The data is encoded and standardized once; each worker process receives it once
+# (pool initializer) along with the cached CV fold indices, so a candidate costs only
+# its fits. Workers return out-of-fold metrics for every threshold on THRESHOLDS, and
+# the parent picks the best (candidate, threshold) pair.
+
+SEARCH_GRID = {
+    "C": [0.01, 0.1, 1.0, 10.0, 100.0],
+    "penalty": ["l2", "l1"],
+    "class_weight": [None, "balanced"],
+}
+THRESHOLDS = np.round(np.arange(0.30, 0.801, 0.01), 2)
+SEARCH_METRICS = ("f1", "accuracy", "balanced_accuracy")
+
+_SEARCH_DATA = {}
+
+
+def threshold_curve(y, proba, thresholds) -> dict:
+    """Confusion-based metrics at every threshold from one sort (predict 1 when proba > t)."""
+    order = np.argsort(proba, kind="stable")
+    p, ys = proba[order], y[order].astype(np.int64)
+    n, positives = len(ys), int(ys.sum())
+    negatives = n - positives
+    # pos_top[k] = positives among the k highest scores.
+    pos_top = np.concatenate([[0], np.cumsum(ys[::-1])])
+    predicted = n - np.searchsorted(p, thresholds, side="right")
+    tp = pos_top[predicted]
+    fp = predicted - tp
+    fn = positives - tp
+    tn = negatives - fp
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "accuracy": (tp + tn) / max(n, 1),
+            "f1": np.nan_to_num(2 * tp / (2 * tp + fp + fn)),
+            "balanced_accuracy": (np.nan_to_num(tp / positives) + np.nan_to_num(tn / negatives)) / 2,
+        }
+
+
+def _search_candidates():
+    keys = list(SEARCH_GRID)
+    for values in np.array(np.meshgrid(*[np.arange(len(SEARCH_GRID[k])) for k in keys])).T.reshape(-1, len(keys)):
+        yield {key: SEARCH_GRID[key][i] for key, i in zip(keys, values)}
+
+
+def _init_search_worker(X, y, folds, max_iter):
+    _SEARCH_DATA.update(X=X, y=y, folds=folds, max_iter=max_iter)
+
+
+def _cv_candidate(params: dict) -> dict:
+    from sklearn.linear_model import LogisticRegression
+
+    X, y = _SEARCH_DATA["X"], _SEARCH_DATA["y"]
+    oof = np.empty(len(y))
+    for train, val in _SEARCH_DATA["folds"]:
+        model = LogisticRegression(solver="liblinear", max_iter=_SEARCH_DATA["max_iter"], **params)
+        model.fit(X[train], y[train])
+        oof[val] = model.predict_proba(X[val])[:, 1]
+    curve = threshold_curve(y, oof, THRESHOLDS)
+    return {"params": params, "curve": {name: values.tolist() for name, values in curve.items()}}
+
+
+def search_hyperparameters(X, y, args) -> dict:
+    """Cross-validated grid search over SEARCH_GRID x THRESHOLDS on standardized X."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    from sklearn.model_selection import StratifiedKFold
+
+    folds = list(StratifiedKFold(n_splits=args.cv, shuffle=True, random_state=args.seed).split(X, y))
+    candidates = list(_search_candidates())
+    jobs = max(1, min(args.search_jobs or os.cpu_count() or 1, len(candidates)))
+    with ProcessPoolExecutor(jobs, initializer=_init_search_worker, initargs=(X, y, folds, args.max_iter)) as pool:
+        results = list(pool.map(_cv_candidate, candidates))
+
+    board = []
+    for result in results:
+        scores = np.asarray(result["curve"][args.search_metric])
+        best = int(np.argmax(scores))
+        board.append({
+            "params": result["params"],
+            "threshold": float(THRESHOLDS[best]),
+            "cv_score": round(float(scores[best]), 6),
+            "cv_score_at_0.5": round(float(scores[int(np.argmin(np.abs(THRESHOLDS - 0.5)))]), 6),
+        })
+    board.sort(key=lambda row: row["cv_score"], reverse=True)
+    return {
+        "metric": args.search_metric,
+        "cv_folds": args.cv,
+        "jobs": jobs,
+        "candidates": len(candidates),
+        "grid": SEARCH_GRID,
+        "thresholds": [float(THRESHOLDS[0]), float(THRESHOLDS[-1]), 0.01],
+        "best": board[0],
+        "leaderboard": board[:10],
+    }
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_artifacts(out_dir: str, model, encoder: OneHotEncoder, manifest: dict, threshold: float = 0.5):
+    """Write model, feature list, compact export and manifest (manifest last)."""
+    import sklearn
+
+    os.makedirs(out_dir, exist_ok=True)
+    model_path = os.path.join(out_dir, "loan_model.pkl")
+    features_path = os.path.join(out_dir, "features.pkl")
+    compact_path = os.path.join(out_dir, "loan_model.clm")
+    manifest_path = os.path.join(out_dir, "model_manifest.json")
+
+    _atomic_write(features_path, pickle.dumps(encoder.feature_names, protocol=pickle.HIGHEST_PROTOCOL))
+    _atomic_write(model_path, pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+    model_format.export_estimator(model, encoder.feature_names, compact_path, threshold=threshold, metadata={
+        "source": os.path.basename(model_path),
+        "source_sha256": model_format.file_sha256(model_path),
+        "data_sha256": manifest["data"]["sha256"],
+        "preprocessing": {
+            "strip_column_names": True,
+            "target": TARGET,
+            "one_hot": "pandas.get_dummies(drop_first=True)",
+            "encoder": encoder.to_dict(),
+        },
+    })
+
+    manifest["artifacts"] = {
+        os.path.basename(path): model_format.file_sha256(path)
+        for path in (model_path, features_path, compact_path)
+    }
+    manifest["threshold"] = threshold
+    manifest["versions"] = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scikit-learn": sklearn.__version__,
+    }
+    _atomic_write(manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    return manifest_path
+
+
+def train_batch(args, lap):
+    """Fit LogisticRegression in memory; returns (model, encoder, metrics, data, params)."""
+    frame = read_dataset(args.data, args.chunksize)
+    lap("read_seconds")
+
+    keep, y = encode_target(frame)
+    frame = frame[keep]
+    encoder = OneHotEncoder.fit(frame, NUMERIC, CATEGORICAL)
+    X = encoder.transform(frame)
+    del frame
+    lap("encode_seconds")
+
+    train_idx, test_idx = split_indices(len(y), args.test_size, args.seed)
+    params = {"estimator": "LogisticRegression", "C": args.C, "max_iter": args.max_iter, "threshold": 0.5}
+    if args.search:
+        moments = RunningMoments(X.shape[1])
+        moments.update(X[train_idx])
+        X_scaled = (X[train_idx] - moments.mean) / moments.scale
+        search = search_hyperparameters(X_scaled, y[train_idx], args)
+        lap("search_seconds")
+
+        from sklearn.linear_model import LogisticRegression
+
+        best = search["best"]
+        scaled_model = LogisticRegression(solver="liblinear", max_iter=args.max_iter, **best["params"])
+        scaled_model.fit(X_scaled, y[train_idx])
+        del X_scaled
+        model = fold_scaler(scaled_model, moments.mean, moments.scale)
+        params = {"estimator": "LogisticRegression(solver=liblinear), scaler folded into coef",
+                  **best["params"], "max_iter": args.max_iter, "threshold": best["threshold"], "search": search}
+    else:
+        model = train_logistic(X[train_idx], y[train_idx], max_iter=args.max_iter, C=args.C)
+    lap("fit_seconds")
+
+    threshold = params["threshold"]
+    metrics = {
+        "train": evaluate(model, X[train_idx], y[train_idx], threshold),
+        "test": evaluate(model, X[test_idx], y[test_idx], threshold),
+    }
+    if args.search:
+        metrics["test_at_0.5"] = evaluate(model, X[test_idx], y[test_idx])
+    lap("evaluate_seconds")
+
+    data = {"rows": int(len(keep)), "rows_used": int(len(y)), "positive_rate": round(float(y.mean()), 6)}
+    return model, encoder, metrics, data, params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="loan.csv", help="CSV or Parquet training data")
+    parser.add_argument("--out-dir", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--chunksize", type=int, default=250_000, help="rows per read chunk")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-iter", type=int, default=1000)
+    parser.add_argument("--C", type=float, default=1.0, help="inverse regularization strength")
+    incremental = parser.add_argument_group("incremental training (data larger than RAM)")
+    incremental.add_argument("--incremental", action="store_true", help="stream chunks through SGD partial_fit")
+    incremental.add_argument("--epochs", type=int, default=3)
+    incremental.add_argument("--alpha", type=float, default=1e-4, help="SGD L2 penalty")
+    incremental.add_argument("--checkpoint", help="checkpoint file (default: <out-dir>/train_checkpoint.pkl)")
+    incremental.add_argument("--checkpoint-every", type=int, default=1, help="chunks between checkpoints")
+    incremental.add_argument("--resume", action="store_true", help="continue from the checkpoint")
+    incremental.add_argument("--compare-batch", action="store_true",
+                             help="also fit the in-memory LogisticRegression on the same split and report it")
+    search = parser.add_argument_group("hyperparameter and threshold search (batch mode)")
+    search.add_argument("--search", action="store_true", help="grid-search C/penalty/class_weight and the threshold")
+    search.add_argument("--cv", type=int, default=5, help="cross-validation folds")
+    search.add_argument("--search-metric", choices=SEARCH_METRICS, default="f1")
+    search.add_argument("--search-jobs", type=int, default=0, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+    if args.search and args.incremental:
+        parser.error("--search applies to batch training only")
+
+    timings = {}
+    started = t0 = time.perf_counter()
+
+    def lap(name):
+        nonlocal t0
+        now = time.perf_counter()
+        timings[name] = round(now - t0, 4)
+        t0 = now
+
+    data_sha256 = model_format.file_sha256(args.data)
+    if args.incremental:
+        model, encoder, metrics, data, params = train_incremental(args, data_sha256, lap)
+    else:
+        model, encoder, metrics, data, params = train_batch(args, lap)
+
+    manifest = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "data": {"path": os.path.basename(args.data), "sha256": data_sha256, **data},
+        "params": {**params, "test_size": args.test_size, "seed": args.seed},
+        "encoder": encoder.to_dict(),
+        "metrics": metrics,
+        "timings": timings,
+    }
+    timings["total_seconds"] = round(time.perf_counter() - started, 4)
+    write_artifacts(args.out_dir, model, encoder, manifest, threshold=params.get("threshold", 0.5))
+
+    print(f"rows: {data['rows_used']} used / {data['rows']} read, features: {len(encoder.feature_names)}")
+    if "search" in params:
+        best = params["search"]["best"]
+        print(f"search: best {best['params']} threshold {best['threshold']} cv {params['search']['metric']} {best['cv_score']}")
+    for split in ("test", "test_at_0.5", "batch_test"):
+        if split in metrics:
+            m = metrics[split]
+            print(f"{split} accuracy: {m['accuracy']:.4f}  f1: {m['f1']:.4f}  auc: {m['roc_auc']}")
+    print("timings:", ", ".join(f"{k}={v}s" for k, v in timings.items()))
+    print(f"wrote artifacts to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""Prometheus-style metrics (`/metrics`) aggregated across gunicorn workers.
+
+Each process keeps its counters, histograms and gauges in memory. When `METRICS_DIR`
+is set (gunicorn.conf.py sets it), a daemon thread writes a snapshot of them to
+`<METRICS_DIR>/<pid>-<nonce>.json` every `METRICS_FLUSH_INTERVAL` seconds (atomic
+rename), and a scrape on any worker merges every snapshot file with its own live
+state. Counters and histograms of exited workers are kept, so totals never go
+backwards: a scrape folds their files into one `retired.json` (under an `flock`, so
+concurrent scrapes never count a worker twice), keeping the directory and the scrape
+small however often workers restart. Gauges are reported per live process (`pid` label).
+The snapshots also carry each worker's /health stage histograms (`stage_timings`).
+
+Without `METRICS_DIR` (dev server) the endpoint reports the current process only.
+
+    metrics.REGISTRY.inc("credilume_http_requests_total", {"route": "predict", "status": "200"})
+    metrics.REGISTRY.observe("credilume_http_request_duration_seconds", 0.012, {"route": "predict"})
+    metrics.REGISTRY.set_gauge("credilume_model_load_seconds", 0.08)
+    text = metrics.REGISTRY.render()
+"""
+
+import bisect
+import contextlib
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+import timing
+
+try:
+    import fcntl
+except ImportError:  # Windows: no worker processes to retire; files are kept as they are
+    fcntl = None
+
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "1"))
+
+# Same bucket layout as the /health stage histograms, in seconds.
+BUCKETS_SECONDS = tuple(ms / 1e3 for ms in timing.BUCKETS_MS)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Counters and histograms of exited workers, folded into one file.
+RETIRED_FILE = "retired.json"
+
+# name -> (type, help). render() only exports metrics declared here.
+METRICS = {
+    "credilume_http_requests_total": ("counter", "HTTP requests by route, method and status."),
+    "credilume_http_request_duration_seconds": ("histogram", "HTTP request latency by route."),
+    "credilume_llm_calls_total": ("counter", "Outbound LLM calls by endpoint and outcome (success, failure, rejected, cancelled)."),
+    "credilume_llm_call_duration_seconds": ("histogram", "Outbound LLM call latency by endpoint (calls that reached upstream)."),
+    "credilume_llm_coalesced_total": ("counter", "Requests answered by another request's in-flight LLM call, by endpoint and scope (worker or host)."),
+    "credilume_llm_prompt_tokens_total": ("counter", "Estimated LLM input tokens sent, by endpoint and part (system prefix or per-request)."),
+    "credilume_advisor_responses_total": ("counter", "Advisor responses by route and source (gemini or fallback)."),
+    "credilume_predictions_total": ("counter", "Loan decisions by final decision and whether the hybrid guardrail overrode the model."),
+    "credilume_model_load_seconds": ("gauge", "Seconds taken to load the currently served model version."),
+}
+
+
+def _label_key(labels) -> tuple:
+    return tuple(sorted((str(k), str(v)) for k, v in (labels or {}).items()))
+
+
+def _format_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    escaped = (
+        f'{k}="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Registry:
+    """In-process metric store with an optional per-process snapshot file."""
+
+    def __init__(self, directory: str = "", flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, label_key) -> float
+        self._histograms = {}  # (name, label_key) -> [bucket counts..., sum, count]
+        self._gauges = {}      # (name, label_key) -> float
+        self._dirty = False
+        self._flusher_pid = None
+        self._reset_identity()
+
+    def _reset_identity(self):
+        self._path = (
+            os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json") if self.directory else None
+        )
+
+    def after_fork(self):
+        # Samples recorded in the gunicorn master (preload warm-up) must not be counted
+        # once per worker; gauges describe state the worker inherited and are kept.
+        self._lock = threading.Lock()
+        self._counters.clear()
+        self._histograms.clear()
+        self._dirty = True
+        self._flusher_pid = None
+        self._reset_identity()
+
+    # -- recording ---------------------------------------------------------------------
+
+    def inc(self, name: str, labels=None, amount: float = 1.0):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+            self._dirty = True
+
+    def observe(self, name: str, seconds: float, labels=None):
+        key = (name, _label_key(labels))
+        with self._lock:
+            state = self._histograms.get(key)
+            if state is None:
+                state = self._histograms[key] = [0] * (len(BUCKETS_SECONDS) + 1) + [0.0, 0]
+            # Non-cumulative here; render() accumulates.
+            state[bisect.bisect_left(BUCKETS_SECONDS, seconds)] += 1
+            state[-2] += seconds
+            state[-1] += 1
+            self._dirty = True
+
+    def set_gauge(self, name: str, value: float, labels=None):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = float(value)
+            self._dirty = True
+
+    # -- multiprocess ------------------------------------------------------------------
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "counters": [[name, list(map(list, labels)), value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, list(map(list, labels)), list(state)] for (name, labels), state in self._histograms.items()],
+                "gauges": [[name, list(map(list, labels)), value] for (name, labels), value in self._gauges.items()],
+                "stages": timing.HISTOGRAMS.export(),
+            }
+
+    def flush(self):
+        """Write this process's snapshot file (no-op without a metrics directory)."""
+        if self._path is None:
+            return
+        with self._lock:
+            self._dirty = False
+        snapshot = self._snapshot()
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(tmp_path, self._path)
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._flusher_pid == pid:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+    def ensure_flusher(self):
+        # Threads don't survive fork(), so each worker starts its own on its first request.
+        if self._path is None or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True).start()
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    @contextlib.contextmanager
+    def _directory_lock(self, exclusive: bool):
+        """Shared lock to read the snapshot files, exclusive to fold retired ones."""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(os.path.join(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _load(path: str):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _retire_exited(self):
+        """Fold the snapshot files of exited workers into RETIRED_FILE and remove them."""
+        exited = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                pid = int(os.path.basename(path).split("-", 1)[0])
+            except ValueError:
+                continue  # RETIRED_FILE
+            if path != self._path and not self._alive(pid):
+                exited.append(path)
+        if not exited or fcntl is None:
+            return
+        retired_path = os.path.join(self.directory, RETIRED_FILE)
+        with self._directory_lock(exclusive=True):
+            exited = [path for path in exited if os.path.exists(path)]  # not folded by another worker
+            if not exited:
+                return
+            snapshots = [s for s in map(self._load, [retired_path] + exited) if s is not None]
+            counters, histograms = _merge(snapshots)
+            retired = {
+                "pid": None,
+                "counters": [[name, list(map(list, labels)), value] for (name, labels), value in counters.items()],
+                "histograms": [[name, list(map(list, labels)), state] for (name, labels), state in histograms.items()],
+                "stages": timing.StageHistograms.merged(s.get("stages", ()) for s in snapshots).export(),
+            }
+            tmp_path = f"{retired_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(retired, f, separators=(",", ":"))
+            os.replace(tmp_path, retired_path)
+            for path in exited:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _snapshots(self) -> list:
+        """Snapshots of every process (this one from memory) plus the retired workers."""
+        snapshots = [self._snapshot()]
+        if self.directory:
+            try:
+                self._retire_exited()
+            except OSError:
+                pass
+            with self._directory_lock(exclusive=False):
+                for path in glob.glob(os.path.join(self.directory, "*.json")):
+                    if path != self._path:
+                        snapshot = self._load(path)
+                        if snapshot is not None:
+                            snapshots.append(snapshot)
+        return snapshots
+
+    def stage_timings(self) -> dict:
+        """`timing.HISTOGRAMS.snapshot()` summed over every worker (this one live)."""
+        snapshots = self._snapshots()
+        return timing.StageHistograms.merged(s.get("stages", ()) for s in snapshots).snapshot()
+
+    def _collect(self):
+        """Merge the snapshots of every process (this one from memory)."""
+        snapshots = self._snapshots()
+        counters, histograms = _merge(snapshots)
+        gauges = {}
+        for snapshot in snapshots:
+            pid = snapshot.get("pid")
+            if snapshot is snapshots[0] or (pid and self._alive(pid)):
+                for name, labels, value in snapshot.get("gauges", ()):
+                    key = (name, tuple(map(tuple, labels)) + (("pid", str(pid)),))
+                    gauges[key] = value
+        return counters, histograms, gauges
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        counters, histograms, gauges = self._collect()
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            elif kind == "gauge":
+                for (metric, labels), value in sorted(gauges.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            else:
+                for (metric, labels), state in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for upper, n in zip(BUCKETS_SECONDS + (float("inf"),), state[:-2]):
+                        cumulative += n
+                        le = "+Inf" if upper == float("inf") else repr(upper)
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(state[-2])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {_format_value(state[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(snapshots):
+    """Summed counters and histograms of several snapshots, keyed by (name, labels)."""
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get("counters", ()):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, state in snapshot.get("histograms", ()):
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.get(key)
+            histograms[key] = list(state) if merged is None else [a + b for a, b in zip(merged, state)]
+    return counters, histograms
+
+
+def clear_directory(directory: str = METRICS_DIR):
+    """Remove snapshot files left by a previous server run (call before workers start)."""
+    if not directory:
+        return
+    for path in glob.glob(os.path.join(directory, "*.json")) + glob.glob(os.path.join(directory, "*.tmp")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+REGISTRY = Registry(METRICS_DIR, FLUSH_INTERVAL)
+if hasattr(os, "register_at_fork"):  # POSIX only; nothing forks on Windows
+    os.register_at_fork(after_in_child=REGISTRY.after_fork)
@@ -0,0 +1,165 @@
+"""Compact, pickle-free model format for the serving path (`loan_model.clm`).
+
+Layout (little-endian):
+
+    b"CLM1" | uint32 header_length | JSON header (space-padded to 8 bytes) | float64 data
+
+The JSON header carries the format version, model type, feature names, class labels,
+decision threshold, preprocessing metadata and the location of each array inside the
+data block. Arrays are read with `np.frombuffer` over a read-only memory map, so loading
+needs neither scikit-learn nor scipy and takes well under a millisecond.
+
+Export from a fitted estimator (needs scikit-learn only to unpickle it):
+
+    python model_format.py export loan_model.pkl features.pkl loan_model.clm
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+MAGIC = b"CLM1"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<4sI")
+
+
+class CompactModel:
+    """Binary logistic model loaded from the compact format.
+
+    Mirrors the parts of the sklearn API the app relies on (`predict`, `predict_proba`,
+    `coef_`, `intercept_`, `classes_`) using plain NumPy.
+    """
+
+    def __init__(self, header: dict, arrays: dict, buffer=None):
+        self.header = header
+        self.feature_names = list(header["feature_names"])
+        self.classes_ = np.asarray(header.get("classes", [0, 1]))
+        self.threshold = float(header.get("threshold", 0.5))
+        self.coef_ = arrays["coef"].reshape(1, -1)
+        self.intercept_ = arrays["intercept"].reshape(1)
+        self.n_features_in_ = self.coef_.shape[1]
+        # Keep the memory map alive for as long as the arrays that view it.
+        self._buffer = buffer
+
+    @property
+    def coef(self):
+        return self.coef_[0]
+
+    @property
+    def intercept(self) -> float:
+        return float(self.intercept_[0])
+
+    def decision_function(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef + self.intercept
+
+    def predict_proba(self, X):
+        p = np.exp(-np.logaddexp(0.0, -self.decision_function(X)))
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] > self.threshold).astype(np.intp)]
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save(path: str, coef, intercept: float, feature_names, classes=(0, 1), threshold: float = 0.5,
+         metadata: dict | None = None):
+    """Write a binary logistic model in the compact format (atomically)."""
+    coef = np.ascontiguousarray(coef, dtype="<f8").ravel()
+    if len(coef) != len(feature_names):
+        raise ValueError(f"coef has {len(coef)} values but there are {len(feature_names)} features")
+    intercept_arr = np.asarray([intercept], dtype="<f8")
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "model_type": "logistic_regression",
+        "feature_names": [str(name) for name in feature_names],
+        "classes": [int(c) if isinstance(c, (int, np.integer)) else str(c) for c in classes],
+        "threshold": float(threshold),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "arrays": {
+            "coef": {"offset": 0, "shape": [len(coef)]},
+            "intercept": {"offset": coef.nbytes, "shape": [1]},
+        },
+        **(metadata or {}),
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    # Pad so the float64 block starts 8-byte aligned.
+    pad = (-(_PREFIX.size + len(header_bytes))) % 8
+    header_bytes += b" " * pad
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(coef.tobytes())
+        f.write(intercept_arr.tobytes())
+    os.replace(tmp_path, path)
+
+
+def export_estimator(estimator, feature_names, path: str, threshold: float = 0.5, metadata: dict | None = None):
+    """Export a fitted binary linear classifier (e.g. LogisticRegression) to `path`."""
+    coef = np.asarray(estimator.coef_)
+    if coef.shape[0] != 1:
+        raise ValueError("Only binary linear classifiers can be exported")
+    save(path, coef[0], float(np.asarray(estimator.intercept_)[0]), list(feature_names),
+         classes=list(estimator.classes_), threshold=threshold, metadata=metadata)
+
+
+def read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        magic, header_length = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compact model file")
+        return json.loads(f.read(header_length))
+
+
+def load(path: str) -> CompactModel:
+    """Memory-map a compact model file and return a `CompactModel`."""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, header_length = _PREFIX.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a compact model file")
+    header = json.loads(buffer[_PREFIX.size:_PREFIX.size + header_length])
+    if header.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact model version: {header.get('format_version')}")
+
+    data_offset = _PREFIX.size + header_length
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        count = int(np.prod(spec["shape"]))
+        arrays[name] = np.frombuffer(buffer, dtype="<f8", count=count, offset=data_offset + spec["offset"]).reshape(spec["shape"])
+    return CompactModel(header, arrays, buffer)
+
+
+def _export_cli(model_path: str, features_path: str, out_path: str):
+    import pickle
+
+    with open(model_path, "rb") as f:
+        estimator = pickle.load(f)
+    with open(features_path, "rb") as f:
+        feature_names = pickle.load(f)
+    export_estimator(estimator, feature_names, out_path, metadata={
+        "source": os.path.basename(model_path),
+        "source_sha256": file_sha256(model_path),
+    })
+    print(f"Wrote {out_path} ({os.path.getsize(out_path)} bytes)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5 or sys.argv[1] != "export":
+        sys.exit("usage: python model_format.py export <model.pkl> <features.pkl> <out.clm>")
+    _export_cli(*sys.argv[2:])
@@ -0,0 +1,332 @@
+"""Single-flight coalescing for identical concurrent LLM calls.
+
+When several requests need the same upstream answer at the same moment (a campaign
+sending many users to /smart_advisor with the same defaults), only the first one, the
+*leader*, makes the call. The others wait for it and get the same result, errors
+included. The key is whatever identifies the answer. For the advisor that is the
+bucketed cache key from `llm_cache.make_key`, so near-identical inputs share a flight.
+
+- `SingleFlight`: threads in one process (gunicorn sync workers, the Flask app).
+- `AsyncSingleFlight`: tasks on one event loop (asgi.py), with `await flights.do(key, fetch)`.
+
+With `LLM_COALESCE=host`, flights are also coalesced across the worker processes of a
+host. The leader holds an `flock` on `<dir>/<key>.lock` while it calls upstream and
+then publishes its result to `<dir>/<key>.json`. A worker that finds the lock taken
+polls for a result published after it started waiting. If the lock comes free without
+one (the leader crashed), it leads the next flight itself; after LLM_COALESCE_WAIT it
+gives up waiting and makes the call. Without `fcntl`
+(Windows), only the in-process layer is used.
+
+This complements the response cache: the cache serves answers that have already
+arrived, and single flight covers the window while the first one is still in flight.
+
+Configuration (environment):
+- LLM_COALESCE        worker (default) | host (also across workers) | off
+- LLM_COALESCE_DIR    lock/result directory for `host` (default: <tmp>/credilume_llm_flights)
+- LLM_COALESCE_WAIT   seconds a worker waits for another worker's flight (default 30)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process coalescing only
+    fcntl = None
+
+_POLL_SECONDS = 0.01
+# Async waiters back off up to this interval; each poll costs a worker-thread hop.
+_MAX_ASYNC_POLL_SECONDS = 0.05
+_MISSING = object()
+
+
+class _FileFlight:
+    """Cross-process layer: one leader per key on the host, chosen by a non-blocking flock."""
+
+    def __init__(self, directory: str, wait_timeout: float = 30.0, max_age: float = 300.0):
+        self.directory = directory
+        self.wait_timeout = wait_timeout
+        self.max_age = max_age
+        self._published = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str, suffix: str) -> str:
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()[:40]
+        return os.path.join(self.directory, name + suffix)
+
+    def _try_lead(self, key: str):
+        """Locked file descriptor if this process is now the leader, else None."""
+        fd = os.open(self._path(key, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+            return None
+
+    @staticmethod
+    def _release(fd):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def _publish(self, key: str, value):
+        path = self._path(key, ".json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"finished": time.time(), "value": value}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError):
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        self._published += 1
+        if self._published % 100 == 0:
+            self._prune()
+
+    def _prune(self):
+        cutoff = time.time() - self.max_age
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.unlink(path)
+            except OSError:
+                continue
+
+    def _collect(self, key: str, since: float):
+        """Result of a flight that finished after `since` (i.e. the one we waited on), or _MISSING."""
+        try:
+            with open(self._path(key, ".json"), encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return _MISSING
+        if not isinstance(record, dict) or record.get("finished", 0) < since:
+            return _MISSING
+        return record.get("value")
+
+    def _poll(self, key: str, since: float):
+        """One wait step: (shared result or _MISSING, our fd if we took over the lock)."""
+        value = self._collect(key, since)
+        if value is not _MISSING:
+            return value, None
+        fd = self._try_lead(key)
+        if fd is None:
+            return _MISSING, None
+        # The leader may have published just before releasing.
+        value = self._collect(key, since)
+        if value is not _MISSING:
+            self._release(fd)
+            return value, None
+        return _MISSING, fd
+
+    def do(self, key: str, fn, on_share=None):
+        since = time.time()
+        fd = self._try_lead(key)
+        if fd is None:
+            # Check for the result on every step: a worker that just led may take the
+            # lock again for its next request before we see it free.
+            deadline = time.monotonic() + self.wait_timeout
+            while True:
+                value, fd = self._poll(key, since)
+                if value is not _MISSING:
+                    if on_share is not None:
+                        on_share("host")
+                    return value
+                if fd is not None or time.monotonic() >= deadline:
+                    break
+                time.sleep(_POLL_SECONDS)
+            if fd is None:
+                return fn()
+        # Leader, or the previous leader ended without a result: call and publish.
+        try:
+            value = fn()
+            self._publish(key, value)
+            return value
+        finally:
+            self._release(fd)
+
+    async def _off_loop(self, fn, *args):
+        """`fn(*args)` on a worker thread, so file and flock I/O never blocks the event loop.
+
+        If the caller is cancelled meanwhile, a lock the call went on to take is released.
+        """
+        task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            task.add_done_callback(self._release_abandoned)
+            raise
+
+    def _release_abandoned(self, task):
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        fd = result[1] if isinstance(result, tuple) else result
+        if isinstance(fd, int):
+            self._release(fd)
+
+    async def ado(self, key: str, fn, on_share=None):
+        since = time.time()
+        fd = await self._off_loop(self._try_lead, key)
+        if fd is None:
+            deadline = time.monotonic() + self.wait_timeout
+            delay = _POLL_SECONDS
+            while True:
+                value, fd = await self._off_loop(self._poll, key, since)
+                if value is not _MISSING:
+                    if on_share is not None:
+                        on_share("host")
+                    return value
+                if fd is not None or time.monotonic() >= deadline:
+                    break
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _MAX_ASYNC_POLL_SECONDS)
+            if fd is None:
+                return await fn()
+        try:
+            value = await fn()
+            await self._off_loop(self._publish, key, value)
+            return value
+        finally:
+            await self._off_loop(self._release, fd)
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _Coalescer:
+    def __init__(self, mode: str = "worker", shared: _FileFlight | None = None, on_share=None):
+        self.mode = mode
+        self.shared = shared
+        self.on_share = on_share
+        self.leaders = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _shared(self, scope: str):
+        with self._lock:
+            self.coalesced += 1
+        if self.on_share is not None:
+            self.on_share(scope)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+            }
+
+
+class SingleFlight(_Coalescer):
+    """At most one `fn()` in flight per key across the threads of this process.
+
+        advice = FLIGHTS.do(cache_key, lambda: fetch(prompt))
+
+    `on_share(scope)` is called for every caller that got another caller's result
+    (scope "worker" or "host"). With mode "off", `fn()` is simply called.
+    """
+
+    def do(self, key: str, fn):
+        if self.mode == "off":
+            return fn()
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+        if not leader:
+            flight.done.wait()
+            self._shared("worker")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = self.shared.do(key, fn, self._shared) if self.shared is not None else fn()
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+class AsyncSingleFlight(_Coalescer):
+    """`SingleFlight` for coroutine functions on one event loop: `await FLIGHTS.do(key, fetch)`."""
+
+    async def do(self, key: str, fn):
+        if self.mode == "off":
+            return await fn()
+        future = self._flights.get(key)
+        if future is not None:
+            try:
+                value = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled (not us): run the call ourselves.
+                return await self.do(key, fn)
+            self._shared("worker")
+            return value
+
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting: mark the outcome retrieved so asyncio does not log it.
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        with self._lock:
+            self._flights[key] = future
+            self.leaders += 1
+        try:
+            value = await (self.shared.ado(key, fn, self._shared) if self.shared is not None else fn())
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+
+def _config():
+    mode = os.environ.get("LLM_COALESCE", "worker").strip().lower()
+    if mode not in ("worker", "host", "off"):
+        mode = "worker"
+    if mode == "host" and fcntl is None:
+        mode = "worker"
+    shared = None
+    if mode == "host":
+        directory = os.environ.get("LLM_COALESCE_DIR") or os.path.join(tempfile.gettempdir(), "credilume_llm_flights")
+        shared = _FileFlight(directory, float(os.environ.get("LLM_COALESCE_WAIT", "30")))
+    return mode, shared
+
+
+def flight_from_env(on_share=None) -> SingleFlight:
+    return SingleFlight(*_config(), on_share)
+
+
+def async_flight_from_env(on_share=None) -> AsyncSingleFlight:
+    return AsyncSingleFlight(*_config(), on_share)
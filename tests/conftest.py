@@ -0,0 +1,16 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep the app from reaching out while it is imported by the tests.
+os.environ.setdefault("LLM_CACHE_BACKEND", "off")
+os.environ.setdefault("GEMINI_API_KEY", "")
+
+
+def pytest_configure(config):
+    # loan_model.pkl was pickled by an older scikit-learn release, and fitted on a
+    # DataFrame; the app scores plain arrays in the same column order.
+    config.addinivalue_line("filterwarnings", "ignore:Trying to unpickle estimator")
+    config.addinivalue_line("filterwarnings", "ignore:X does not have valid feature names")
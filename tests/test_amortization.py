@@ -0,0 +1,166 @@
+"""amortization.py against a month-by-month schedule, and the /schedule endpoint."""
+
+import csv
+import io
+
+import numpy as np
+import pytest
+
+import amortization
+
+
+def _loop_schedule(principal: float, months: int, apr: float):
+    """The algorithm of `generateSchedule` in static/calculator.js: (payment, principal, interest, balance) rows."""
+    payment = amortization.emi_one(principal, months, apr)[0]
+    r = apr / 100 / 12
+    balance = principal
+    rows = []
+    for _ in range(months):
+        interest = balance * r
+        principal_paid = payment - interest
+        balance = max(0.0, balance - principal_paid)
+        rows.append((payment, principal_paid, interest, balance))
+    return np.array(rows)
+
+
+def _balance_after(principal, payment, apr, months):
+    r = apr / 100 / 12
+    balance = principal
+    for _ in range(months):
+        balance = balance * (1 + r) - payment
+    return balance
+
+
+@pytest.fixture(scope="module")
+def loans():
+    rng = np.random.default_rng(42)
+    n = 300
+    principal = rng.uniform(1e4, 5e7, n)
+    months = rng.choice([1, 2, 12, 60, 120, 240, 360], n)
+    apr = rng.uniform(0, 24, n)
+    apr[:20] = 0.0
+    return principal, months, apr
+
+
+def test_schedule_block_matches_loop(loans):
+    principal, months, apr = loans
+    block = amortization.schedule_block(principal, months, apr)
+    for i in range(len(principal)):
+        expected = _loop_schedule(principal[i], int(months[i]), apr[i])
+        n = len(expected)
+        got = np.column_stack([block[name][i, :n] for name in ("payment", "principal", "interest", "balance")])
+        np.testing.assert_allclose(got, expected, rtol=0, atol=principal[i] * 1e-9)
+        np.testing.assert_array_equal(block["month"][i, :n], np.arange(1, n + 1))
+        assert np.all(np.isnan(block["balance"][i, n:]))
+
+
+def test_windows_and_iter_blocks_match_full_block(loans):
+    principal, months, apr = loans
+    full = amortization.schedule_block(principal, months, apr)
+    window = amortization.schedule_block(principal, months, apr, start=50, stop=130)
+    chunks = list(amortization.iter_blocks(principal, months, apr, chunk=47))
+    for name in amortization.COLUMNS:
+        np.testing.assert_allclose(window[name], full[name][:, 50:130], rtol=1e-12, atol=1e-6)
+        np.testing.assert_allclose(np.hstack([c[name] for c in chunks]), full[name], rtol=1e-12, atol=1e-6)
+
+
+def test_invalid_loans_are_nan():
+    block = amortization.schedule_block([0, 1000, 1000, 1000], [12, 0, 12, np.nan], [10, 10, -1, 10])
+    assert np.all(np.isnan(block["balance"]))
+    assert amortization.emi_one(1000, 12, -1) is None
+
+
+def test_max_principal_repays_exactly(loans):
+    _, months, apr = loans
+    payment = np.linspace(500, 200000, len(months))
+    principal = amortization.max_principal(payment, months, apr)
+    for p, pay, n, a in zip(principal, payment, months, apr):
+        assert abs(_balance_after(p, pay, a, int(n))) <= p * 1e-9
+    np.testing.assert_array_equal(amortization.max_principal([0.0, -5.0], 12, 10), [0.0, 0.0])
+    assert np.isnan(amortization.max_principal(1000, 0, 10))
+
+
+def test_min_months_is_the_first_month_that_repays(loans):
+    principal, _, apr = loans
+    payment = principal * np.linspace(0.005, 0.5, len(principal))
+    months = amortization.min_months(principal, payment, apr)
+    for p, pay, a, n in zip(principal, payment, apr, months):
+        if np.isinf(n):
+            assert pay <= p * a / 1200
+            continue
+        n = int(n)
+        assert _balance_after(p, pay, a, n) <= p * 1e-9
+        assert _balance_after(p, pay, a, n - 1) > 0
+
+
+def test_max_rate_is_the_break_even_rate(loans):
+    principal, months, _ = loans
+    payment = principal / months * np.linspace(0.8, 3.0, len(principal))
+    rates = amortization.max_rate(principal, months, payment)
+    for p, n, pay, rate in zip(principal, months, payment, rates):
+        n = int(n)
+        if np.isnan(rate):
+            assert pay < p / n  # even 0% needs a larger payment
+            continue
+        if rate >= 100.0:
+            continue
+        assert _balance_after(p, pay, rate, n) <= p * 1e-9
+        assert _balance_after(p, pay, rate + 1e-6, n) > -p * 1e-9
+
+
+# ─── /schedule ─────────────────────────────────────────────────────────────────
+
+@pytest.fixture(scope="module")
+def client():
+    app = pytest.importorskip("app")
+    return app.app.test_client()
+
+
+def test_schedule_pages_cover_the_whole_schedule(client):
+    query = "/schedule?loan_amount=2500000&loan_term_value=30&term_unit=years&interest_rate=8.5"
+    full = client.get(query).get_json()
+    assert full["ok"] and full["next_offset"] is None and len(full["rows"]) == 360
+
+    rows, offset = [], 0
+    while offset is not None:
+        page = client.get(f"{query}&offset={offset}&limit=100").get_json()
+        rows += page["rows"]
+        offset = page["next_offset"]
+    assert rows == full["rows"]
+    assert rows[-1]["balance"] == 0.0
+
+
+@pytest.mark.parametrize("limit", ["0", "-1"])
+def test_schedule_rejects_limit_below_one(client, limit):
+    response = client.get(f"/schedule?loan_amount=100000&loan_term=12&interest_rate=10&limit={limit}")
+    assert response.status_code == 400
+
+
+def test_schedule_batch_reports_per_loan_errors(client):
+    body = {"loans": [
+        {"id": "A1", "loan_amount": 100000, "loan_term": 12, "interest_rate": 10},
+        {"id": "B,2", "loan_amount": -5, "loan_term": 12},
+        {"loan_amount": 50000, "loan_term": 6, "interest_rate": 0},
+        "not a loan",
+    ]}
+    data = client.post("/schedule", json=body).get_json()
+    assert [s["ok"] for s in data["schedules"]] == [True, False, True, False]
+    assert data["schedules"][0]["id"] == "A1"
+    assert len(data["schedules"][0]["rows"]) == 12 and len(data["schedules"][2]["rows"]) == 6
+
+    response = client.post("/schedule?format=csv", json=body)
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [r["loan"] for r in rows] == ["A1"] * 12 + ["B,2"] + ["2"] * 6 + ["3"]
+    errors = {r["loan"]: r["error"] for r in rows if r["error"]}
+    assert set(errors) == {"B,2", "3"}
+    assert all(r["month"] == "" for r in rows if r["error"])
+    assert float(rows[11]["balance"]) == 0.0
+    json_rows = data["schedules"][0]["rows"]
+    assert [float(r["emi"]) for r in rows[:12]] == [r["emi"] for r in json_rows]
+
+
+def test_single_invalid_loan_is_a_400(client):
+    response = client.get("/schedule?loan_amount=-1&loan_term=12&format=csv")
+    assert response.status_code == 400
+    assert response.get_json()["ok"] is False
@@ -0,0 +1,59 @@
+"""asgi.py request plumbing, driven with raw ASGI messages."""
+
+import asyncio
+import json
+
+import pytest
+
+asgi = pytest.importorskip("asgi")
+
+ROW = {"income_annum": 900000, "loan_amount": 500000, "loan_term": 12, "cibil_score": 750}
+
+
+def _call(path, chunks, headers=()):
+    """(status, body, number of receive() calls) of one POST whose body arrives in `chunks`."""
+    scope = {
+        "type": "http", "method": "POST", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), *headers], "http_version": "1.1",
+        "scheme": "http", "server": ("test", 80), "client": ("127.0.0.1", 1), "root_path": "",
+    }
+    pending = list(chunks)
+    received = 0
+
+    async def receive():
+        nonlocal received
+        received += 1
+        if pending:
+            return {"type": "http.request", "body": pending.pop(0), "more_body": bool(pending)}
+        return {"type": "http.disconnect"}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return messages[0]["status"], body, received
+
+
+def test_chunked_body_reaches_flask():
+    body = json.dumps([ROW, ROW]).encode()
+    status, out, _ = _call("/predict_batch", [body[:10], body[10:]])
+    assert status == 200
+    assert json.loads(out)["count"] == 2
+
+
+def test_declared_length_over_limit_is_rejected_before_reading(monkeypatch):
+    monkeypatch.setattr(asgi, "ASGI_MAX_BODY_BYTES", 100)
+    status, out, received = _call("/predict_batch", [b"x" * 200], headers=[(b"content-length", b"200")])
+    assert status == 413
+    assert json.loads(out)["ok"] is False
+    assert received == 0
+
+
+def test_streamed_body_over_limit_is_rejected_while_receiving(monkeypatch):
+    monkeypatch.setattr(asgi, "ASGI_MAX_BODY_BYTES", 100)
+    status, _, received = _call("/predict_batch", [b"x" * 60] * 10)
+    assert status == 413
+    assert received == 2
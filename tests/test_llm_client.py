@@ -0,0 +1,271 @@
+"""GeminiClient against the local Gemini stub (benchmarks/llm_stub.py)."""
+
+import asyncio
+import json
+
+import pytest
+
+import llm_client
+from benchmarks import llm_stub
+
+STREAM_TEXT = "Here is a streamed answer about your EMI and tenure options."
+
+
+@pytest.fixture(scope="module")
+def stub():
+    server, state, base = llm_stub.start()
+    yield state, base
+    server.shutdown()
+
+
+@pytest.fixture
+def state(stub):
+    state, _ = stub
+    state.delay, state.first_token_delay, state.failure_rate = 0.0, 0.0, 0.0
+    return state
+
+
+def _client(base, budget=0.5, read_timeout=2.0, failures=1, cooldown=30.0):
+    pool = llm_client.HTTPPool(pool_size=2, connect_timeout=1.0, read_timeout=read_timeout, max_retries=0)
+    client = llm_client.GeminiClient(
+        pool, base, "stub-model",
+        breaker=llm_client.CircuitBreaker(failure_threshold=failures, cooldown=cooldown),
+        budgets={"chat": budget},
+    )
+    client.outcomes = []
+    client.on_call = lambda endpoint, outcome, seconds: client.outcomes.append(outcome)
+    return client
+
+
+def _astream_all(client):
+    async def run():
+        return [text async for text in client.astream("key", "hi", endpoint="chat")]
+    return asyncio.run(run())
+
+
+def test_stream_longer_than_budget_completes(stub, state):
+    # First chunk well within the 0.4 s budget; the whole answer takes about 0.8 s.
+    state.first_token_delay, state.delay = 0.02, 0.8
+    client = _client(stub[1], budget=0.4)
+    assert "".join(client.stream("key", "hi", endpoint="chat")) == STREAM_TEXT
+    assert "".join(_astream_all(client)) == STREAM_TEXT
+    assert client.outcomes == ["success", "success"]
+    assert client.breaker.snapshot()["consecutive_failures"] == 0
+
+
+def test_slow_first_chunk_counts_against_breaker(stub, state):
+    state.first_token_delay = state.delay = 0.35  # past 0.8 x the 0.4 s budget
+    client = _client(stub[1], budget=0.4)
+    assert "".join(client.stream("key", "hi", endpoint="chat")) == STREAM_TEXT
+    assert client.breaker.state == llm_client.CircuitBreaker.OPEN
+    with pytest.raises(llm_client.CircuitOpenError):
+        next(client.stream("key", "hi", endpoint="chat"))
+
+
+def test_first_chunk_past_budget_fails(stub, state):
+    state.first_token_delay = state.delay = 0.6
+    client = _client(stub[1], budget=0.2)
+    with pytest.raises(TimeoutError):
+        next(client.stream("key", "hi", endpoint="chat"))
+    assert client.outcomes == ["failure"]
+
+
+def test_stalled_stream_hits_idle_timeout(stub, state):
+    # About 0.3 s between chunks, against a 0.15 s read timeout.
+    state.first_token_delay, state.delay = 0.0, 3.3
+    client = _client(stub[1], budget=5.0, read_timeout=0.15)
+    chunks = client.stream("key", "hi", endpoint="chat")
+    assert next(chunks) == "Here"
+    with pytest.raises(TimeoutError):
+        list(chunks)
+    assert client.outcomes == ["failure"]
+
+
+def test_closing_a_probe_stream_releases_the_probe(stub, state):
+    client = _client(stub[1], cooldown=0.0)
+    client.breaker.record_failure()
+    chunks = client.stream("key", "hi", endpoint="chat")
+    assert next(chunks) == "Here"  # the half-open probe
+    assert not client.breaker.allow()
+    chunks.close()
+    assert client.outcomes == ["cancelled"]
+    assert client.breaker.state == llm_client.CircuitBreaker.HALF_OPEN
+    assert client.breaker.allow()  # the next call may probe
+
+
+def test_closing_a_probe_astream_releases_the_probe(stub, state):
+    client = _client(stub[1], cooldown=0.0)
+    client.breaker.record_failure()
+
+    async def run():
+        chunks = client.astream("key", "hi", endpoint="chat")
+        assert await anext(chunks) == "Here"
+        await chunks.aclose()
+
+    asyncio.run(run())
+    assert client.outcomes == ["cancelled"]
+    assert client.breaker.state == llm_client.CircuitBreaker.HALF_OPEN
+    assert client.breaker.allow()
+
+
+def test_chat_advisor_streams_ndjson_from_stub(stub, state, monkeypatch):
+    app = pytest.importorskip("app")
+    client = _client(stub[1], budget=2.0)
+    monkeypatch.setattr(app, "GEMINI", client)
+    monkeypatch.setattr(app, "GEMINI_API_KEY", "stub")
+    response = app.app.test_client().post("/chat_advisor", json={
+        "message": "How can I reduce my EMI?", "loan_amount": 500000, "tenure": 60,
+        "interest_rate": 10, "stream": "ndjson",
+    })
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    deltas = [e["text"] for e in events if e["type"] == "delta"]
+    assert len(deltas) == len(STREAM_TEXT.split(" "))
+    assert events[-1]["type"] == "done"
+    assert events[-1]["source"] == "gemini"
+    assert events[-1]["response"] == "".join(deltas) == STREAM_TEXT
+    assert client.outcomes == ["success"]
+
+
+# ─── CircuitBreaker and latency budgets (fake clock, no network) ───────────────
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_client.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = llm_client.CircuitBreaker(failure_threshold=3, cooldown=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # resets the streak
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == breaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN and breaker.is_open()
+    assert not breaker.allow()
+    clock.now += 29.9
+    assert not breaker.allow()
+    snapshot = breaker.snapshot()
+    assert snapshot["rejected_calls"] == 2 and snapshot["times_opened"] == 1
+    assert snapshot["retry_in_seconds"] == pytest.approx(0.1, abs=1e-3)
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = llm_client.CircuitBreaker(failure_threshold=1, cooldown=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.allow()       # the probe
+    assert not breaker.allow()   # everyone else while it is in flight
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_for_a_full_cooldown(clock):
+    breaker = llm_client.CircuitBreaker(failure_threshold=5, cooldown=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()  # a single failure in half-open re-opens
+    assert breaker.state == breaker.OPEN
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    assert breaker.snapshot()["times_opened"] == 2
+
+
+def test_release_probe_lets_the_next_call_probe(clock):
+    breaker = llm_client.CircuitBreaker(failure_threshold=1, cooldown=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+class FakePool(llm_client.HTTPPool):
+    """Answers every request after `delay` seconds of fake-clock time."""
+
+    def __init__(self, clock, delay=0.0, status=200):
+        super().__init__(read_timeout=6.0)
+        self.clock, self.delay, self.status = clock, delay, status
+        self.deadlines = []
+
+    def request(self, method, url, body=None, headers=None, read_timeout=None, deadline=None):
+        self.deadlines.append(deadline)
+        self.clock.now += self.delay
+        reply = {"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}
+        return self.status, json.dumps(reply).encode()
+
+
+def _fake_client(clock, **pool):
+    client = llm_client.GeminiClient(
+        FakePool(clock, **pool), "http://stub", "m",
+        breaker=llm_client.CircuitBreaker(failure_threshold=2, cooldown=30),
+        budgets={"explain": 6.0, "chat": 20.0}, slow_fraction=0.8,
+    )
+    client.outcomes = []
+    client.on_call = lambda endpoint, outcome, seconds: client.outcomes.append((endpoint, outcome, seconds))
+    return client
+
+
+def test_each_endpoint_gets_its_budget_as_deadline(clock):
+    client = _fake_client(clock)
+    assert client.budget("explain") == 6.0
+    assert client.budget("unknown") == 6.0  # "default": the pool's read timeout
+    for endpoint, timeout, budget in (("explain", None, 6.0), ("chat", None, 20.0), ("chat", 2.5, 2.5)):
+        started = clock.now
+        assert client.generate("key", "hi", endpoint=endpoint, timeout=timeout) == "ok"
+        assert client.pool.deadlines[-1] == started + budget
+
+
+def test_slow_calls_count_against_the_breaker(clock):
+    client = _fake_client(clock, delay=5.0)  # over 0.8 x 6 s for explain, fine for chat
+    client.generate("key", "hi", endpoint="chat")
+    assert client.breaker.snapshot()["consecutive_failures"] == 0
+    client.generate("key", "hi", endpoint="explain")
+    client.generate("key", "hi", endpoint="explain")
+    assert client.breaker.state == llm_client.CircuitBreaker.OPEN
+    assert [outcome for _, outcome, _ in client.outcomes] == ["success"] * 3
+    with pytest.raises(llm_client.CircuitOpenError):
+        client.generate("key", "hi", endpoint="chat")
+    assert client.outcomes[-1] == ("chat", "rejected", None)
+    assert len(client.pool.deadlines) == 3  # the rejected call never reached the pool
+
+
+def test_http_errors_open_the_breaker(clock):
+    client = _fake_client(clock, status=503)
+    for _ in range(2):
+        with pytest.raises(llm_client.LLMHTTPError):
+            client.generate("key", "hi", endpoint="explain")
+    assert client.breaker.state == llm_client.CircuitBreaker.OPEN
+    assert [outcome for _, outcome, _ in client.outcomes] == ["failure", "failure"]
+
+
+def test_budgets_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_BUDGET_CHAT", "3.5")
+    monkeypatch.setenv("LLM_READ_TIMEOUT", "4")
+    monkeypatch.setenv("LLM_BREAKER_FAILURES", "7")
+    client = llm_client.client_from_env()
+    assert client.budget("chat") == 3.5
+    assert client.budget("advisor") == 8.0
+    assert client.budget("other") == 4.0
+    assert client.breaker.failure_threshold == 7
@@ -0,0 +1,79 @@
+"""Cross-worker aggregation in metrics.Registry (snapshot files in METRICS_DIR)."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import metrics
+import timing
+
+COUNTER = "credilume_http_requests_total"
+LABELS = {"route": "predict", "method": "POST", "status": "200"}
+
+
+def _exited_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def _worker_file(directory, pid, requests, stage_ms):
+    stages = timing.StageHistograms()
+    timeline = timing.Timeline()
+    timeline.spans.append(("inference", stage_ms / 1e3))
+    stages.observe("predict", timeline)
+    snapshot = {
+        "pid": pid,
+        "counters": [[COUNTER, [list(pair) for pair in metrics._label_key(LABELS)], requests]],
+        "histograms": [],
+        "gauges": [["credilume_model_load_seconds", [], 0.5]],
+        "stages": stages.export(),
+    }
+    path = os.path.join(directory, f"{pid}-test.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    return path
+
+
+def _total(registry) -> float:
+    counters, _, _ = registry._collect()
+    return sum(value for (name, _), value in counters.items() if name == COUNTER)
+
+
+@pytest.mark.skipif(metrics.fcntl is None, reason="needs fcntl")
+def test_exited_workers_are_folded_once(tmp_path):
+    registry = metrics.Registry(str(tmp_path))
+    registry.inc(COUNTER, LABELS, 1)
+    exited = [_worker_file(str(tmp_path), _exited_pid(), n, 10.0) for n in (2, 3)]
+    live = _worker_file(str(tmp_path), os.getppid(), 4, 20.0)
+
+    assert _total(registry) == 10
+    assert not any(os.path.exists(path) for path in exited)
+    assert os.path.exists(live)
+    assert os.path.exists(tmp_path / metrics.RETIRED_FILE)
+
+    # Another worker exits later; totals keep adding up and never double count.
+    _worker_file(str(tmp_path), _exited_pid(), 5, 10.0)
+    assert _total(registry) == 15
+    assert _total(registry) == 15
+    assert sorted(os.listdir(tmp_path)) == sorted([".lock", os.path.basename(live), metrics.RETIRED_FILE])
+
+    # Gauges are reported for live processes only.
+    _, _, gauges = registry._collect()
+    assert {dict(labels)["pid"] for (name, labels) in gauges if name == "credilume_model_load_seconds"} == {
+        str(os.getppid())
+    }
+
+
+def test_stage_timings_sum_every_worker(tmp_path):
+    registry = metrics.Registry(str(tmp_path))
+    _worker_file(str(tmp_path), os.getppid(), 1, 20.0)
+    _worker_file(str(tmp_path), _exited_pid(), 1, 10.0)
+    before = timing.HISTOGRAMS.snapshot().get("predict", {}).get("inference", {}).get("count", 0)
+
+    inference = registry.stage_timings()["predict"]["inference"]
+    assert inference["count"] == before + 2
+    assert inference["max_ms"] >= 20.0
@@ -0,0 +1,77 @@
+"""Round trip of the compact model format against the pickled estimator."""
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import model_format
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def artifacts():
+    pytest.importorskip("sklearn")
+    with open(os.path.join(ROOT, "loan_model.pkl"), "rb") as f:
+        estimator = pickle.load(f)
+    with open(os.path.join(ROOT, "features.pkl"), "rb") as f:
+        feature_names = list(pickle.load(f))
+    return estimator, feature_names
+
+
+def _rows(n_features, n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 1, size=(n, n_features)) * rng.choice([1, 1e3, 1e6, 1e8], size=(n, n_features))
+    return np.vstack([X, np.zeros(n_features)])
+
+
+def test_export_load_round_trip_matches_estimator(artifacts, tmp_path):
+    estimator, feature_names = artifacts
+    path = str(tmp_path / "model.clm")
+    model_format.export_estimator(estimator, feature_names, path, metadata={"source_sha256": "abc"})
+    model = model_format.load(path)
+
+    assert model.feature_names == feature_names
+    assert model.header["source_sha256"] == "abc"
+    np.testing.assert_array_equal(model.classes_, estimator.classes_)
+    np.testing.assert_array_equal(model.coef_, estimator.coef_)
+    np.testing.assert_array_equal(model.intercept_, estimator.intercept_)
+
+    X = _rows(len(feature_names))
+    np.testing.assert_allclose(model.predict_proba(X), estimator.predict_proba(X), rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(model.predict(X), estimator.predict(X))
+
+
+def test_shipped_model_matches_pickle(artifacts):
+    estimator, feature_names = artifacts
+    model = model_format.load(os.path.join(ROOT, "loan_model.clm"))
+    assert model.feature_names == feature_names
+    X = _rows(len(feature_names), seed=1)
+    np.testing.assert_allclose(model.predict_proba(X), estimator.predict_proba(X), rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(model.predict(X), estimator.predict(X))
+
+
+def test_load_rejects_bad_magic(tmp_path):
+    path = tmp_path / "model.clm"
+    model_format.save(str(path), [1.0, 2.0], 0.5, ["a", "b"])
+    data = path.read_bytes()
+    path.write_bytes(b"XXXX" + data[4:])
+    with pytest.raises(ValueError, match="not a compact model file"):
+        model_format.load(str(path))
+    with pytest.raises(ValueError, match="not a compact model file"):
+        model_format.read_header(str(path))
+
+
+def test_load_rejects_unsupported_version(tmp_path):
+    path = str(tmp_path / "model.clm")
+    model_format.save(path, [1.0, 2.0], 0.5, ["a", "b"], metadata={"format_version": model_format.FORMAT_VERSION + 1})
+    assert model_format.read_header(path)["format_version"] == model_format.FORMAT_VERSION + 1
+    with pytest.raises(ValueError, match="Unsupported compact model version"):
+        model_format.load(path)
+
+
+def test_save_rejects_mismatched_coefficients(tmp_path):
+    with pytest.raises(ValueError, match="features"):
+        model_format.save(str(tmp_path / "model.clm"), [1.0, 2.0, 3.0], 0.0, ["a", "b"])
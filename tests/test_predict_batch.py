@@ -0,0 +1,126 @@
+"""/predict_batch against the single-application path (`_predict_payload`), and its limits."""
+
+import io
+import json
+
+import numpy as np
+import pytest
+
+app = pytest.importorskip("app")
+
+
+def _applications(n, seed=7):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        rows.append({
+            "id": f"A{i}",
+            "income_annum": float(rng.choice([0, 1, 1]) * round(rng.uniform(1e5, 5e6), -3)),
+            "loan_amount": round(rng.uniform(5e4, 2e7), -3),
+            "loan_term": int(rng.choice([6, 12, 60, 120, 240, 360, 480])),
+            "cibil_score": int(rng.integers(300, 900)),
+            "interest_rate": round(rng.uniform(0, 18), 2),
+            "existing_emi": float(rng.choice([0, 5000, 40000])),
+            "loan_type": str(rng.choice(["home", "education", "business", "personal", "other"])),
+            "applicant_profile": str(rng.choice(["student", "salaried", "self_employed", "business_owner"])),
+            "education": str(rng.choice(["Graduate", "Not Graduate"])),
+            "self_employed": str(rng.choice(["Yes", "No"])),
+        })
+    return rows
+
+
+def _inr(text):
+    return None if text is None else float(text.lstrip("₹").replace(",", ""))
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.app.test_client()
+
+
+def test_batch_matches_single_predictions(client):
+    rows = _applications(120)
+    response = client.post("/predict_batch", json=rows)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["ok"] and data["count"] == len(rows)
+
+    for i, (row, result) in enumerate(zip(rows, data["results"])):
+        single = app._predict_payload(row)
+        text = single["prediction_text"]
+        assert result["index"] == i and result["id"] == row["id"] and result["ok"]
+        assert result["prediction"] == (1 if "Approved" in text else 0), row
+        assert f"Probability: {round(result['approval_probability'] * 100, 2)}%" in text, row
+        assert result["guardrail_applied"] == ("(Hybrid)" in text), row
+        assert result["health_score"] == single["health_score"]
+        assert result["dti_percent"] == single["dti_percent"]
+        for key in ("emi_monthly", "emi_total_interest", "emi_total_cost"):
+            assert result[key] == pytest.approx(_inr(single[key]), abs=0.01)
+
+
+def test_ndjson_reports_per_row_errors_in_order(client):
+    good = _applications(3)
+    lines = [good[0], {"id": "bad", "loan_amount": 100000}, "not an application", good[1], good[2]]
+    body = "\n".join(json.dumps(line) for line in lines[:3]) + "\n\n" + "\n".join(json.dumps(line) for line in lines[3:])
+    response = client.post("/predict_batch", data=body, content_type="application/x-ndjson")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [r["index"] for r in results] == [0, 1, 2, 3, 4]
+    assert [r["ok"] for r in results] == [True, False, False, True, True]
+    assert "income_annum" in results[1]["error"]
+    assert results[3]["id"] == good[1]["id"]
+
+    as_json = client.post("/predict_batch", json={"applications": lines}).get_json()["results"]
+    assert as_json == results
+
+
+def test_row_cap(client, monkeypatch):
+    monkeypatch.setattr(app, "PREDICT_BATCH_MAX_ROWS", 3)
+    rows = _applications(4)
+    assert client.post("/predict_batch", json=rows[:3]).status_code == 200
+    for response in (
+        client.post("/predict_batch", json=rows),
+        client.post("/predict_batch", data="\n".join(map(json.dumps, rows)), content_type="application/x-ndjson"),
+    ):
+        assert response.status_code == 400
+        assert response.get_json()["error"].startswith("Batch too large")
+
+
+@pytest.mark.parametrize("content_type", ["application/json", "application/x-ndjson"])
+def test_byte_cap_with_and_without_content_length(client, monkeypatch, content_type):
+    rows = _applications(20)
+    if content_type == "application/json":
+        body = json.dumps(rows).encode()
+    else:
+        body = "\n".join(map(json.dumps, rows)).encode()
+    monkeypatch.setattr(app, "PREDICT_BATCH_MAX_BYTES", len(body) - 1)
+
+    declared = client.post("/predict_batch", data=body, content_type=content_type)
+    assert declared.status_code == 400
+    assert declared.get_json()["error"] == f"Batch too large: {len(body)} bytes (max {len(body) - 1})"
+
+    # Chunked transfer: no Content-Length, the cap applies while reading.
+    def chunked(payload):
+        return client.post(
+            "/predict_batch", input_stream=io.BytesIO(payload), content_type=content_type,
+            headers={"Transfer-Encoding": "chunked"}, environ_overrides={"wsgi.input_terminated": True},
+        )
+
+    response = chunked(body)
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("Batch too large: over")
+
+    monkeypatch.setattr(app, "PREDICT_BATCH_MAX_BYTES", len(body))
+    response = chunked(body)
+    assert response.status_code == 200
+    if content_type == "application/json":
+        assert response.get_json()["count"] == len(rows)
+    else:
+        assert len(response.get_data(as_text=True).splitlines()) == len(rows)
+
+
+def test_malformed_body_is_a_400(client):
+    response = client.post("/predict_batch", data="{not json", content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json()["ok"] is False
@@ -0,0 +1,134 @@
+"""Parity of the serving path (`_FeatureEncoder` + `_LinearScorer`) with the estimator.
+
+The reference is what the app did before: a zero row keyed by FEATURE_NAMES with the
+numeric inputs (and one-hot columns) filled in, scored by `estimator.predict` and
+`estimator.predict_proba`.
+"""
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+
+import app  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def artifacts():
+    with open(os.path.join(ROOT, "loan_model.pkl"), "rb") as f:
+        estimator = pickle.load(f)
+    with open(os.path.join(ROOT, "features.pkl"), "rb") as f:
+        feature_names = list(pickle.load(f))
+    return estimator, feature_names
+
+
+def _reference_row(feature_names, application, categorical=None):
+    row = dict.fromkeys(feature_names, 0.0)
+    for name in app._FeatureEncoder.NUMERIC_FIELDS:
+        if name in row:
+            row[name] = application[name]
+    for name in feature_names:
+        column, sep, level = name.partition("_ ")
+        raw = (categorical or {}).get(column)
+        if sep and raw is not None and str(raw).strip().lower() == level.strip().lower():
+            row[name] = 1.0
+    return np.array(list(row.values()), dtype=np.float64).reshape(1, -1)
+
+
+def _random_forms(n, seed=0):
+    rng = np.random.default_rng(seed)
+    forms = []
+    for _ in range(n):
+        forms.append({
+            "income_annum": str(float(rng.uniform(0, 5e7))),
+            "loan_amount": str(float(10 ** rng.uniform(3, 9))),
+            "loan_term": str(int(rng.integers(1, 481))),
+            "cibil_score": str(int(rng.integers(300, 901))),
+            "loan_type": str(rng.choice(["personal", "home", "education", "business"])),
+            "education": str(rng.choice(["Graduate", " not graduate ", "NOT GRADUATE"])),
+            "self_employed": str(rng.choice(["Yes", "no", " yes"])),
+        })
+    return forms
+
+
+EDGE_FORMS = [
+    {"income_annum": "0", "loan_amount": "0", "loan_term": "1", "cibil_score": "300"},
+    {"income_annum": "1e12", "loan_amount": "1e12", "loan_term": "480", "cibil_score": "900"},
+    {"income_annum": " 1200000 ", "loan_amount": "500000.5", "loan_term": "", "loan_term_value": "5",
+     "term_unit": "years", "cibil_score": "750"},
+    {"income_annum": "600000", "loan_amount": "2500000", "loan_term": "0", "loan_term_value": "18.4",
+     "cibil_score": "649.5", "education": "Unknown", "self_employed": ""},
+    {"income_annum": "-1", "loan_amount": "1", "loan_term": "12", "cibil_score": "-5"},
+]
+
+
+@pytest.mark.parametrize("form", EDGE_FORMS + _random_forms(200))
+def test_encode_one_matches_reference_row(artifacts, form):
+    _, feature_names = artifacts
+    encoder = app._FeatureEncoder(feature_names)
+    application = app._parse_application(form)
+    row = encoder.encode_one(application, form)
+    np.testing.assert_array_equal(row, _reference_row(feature_names, application, form))
+
+
+def test_encode_batch_matches_encode_one(artifacts):
+    _, feature_names = artifacts
+    encoder = app._FeatureEncoder(feature_names)
+    forms = EDGE_FORMS + _random_forms(300, seed=1)
+    applications = [app._parse_application(form) for form in forms]
+    columns = {name: np.array([a[name] for a in applications]) for name in encoder.NUMERIC_FIELDS}
+    categorical = {column: [form.get(column) for form in forms] for column in encoder.categorical}
+    matrix = encoder.encode_batch(columns, categorical)
+    expected = np.vstack([encoder.encode_one(a, form).copy() for a, form in zip(applications, forms)])
+    np.testing.assert_array_equal(matrix, expected)
+
+
+def test_scorer_matches_estimator_on_forms(artifacts):
+    estimator, feature_names = artifacts
+    scorer = app._LinearScorer.from_estimator(estimator)
+    assert scorer.coef is not None, "expected the fast NumPy path for a logistic regression"
+    forms = EDGE_FORMS + _random_forms(1000, seed=2)
+    X = np.vstack([
+        _reference_row(feature_names, app._parse_application(form), form) for form in forms
+    ])
+
+    labels, proba = scorer.predict(X)
+    np.testing.assert_allclose(proba, estimator.predict_proba(X)[:, 1], rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(labels, estimator.predict(X))
+
+    # One row at a time, as /predict scores.
+    for row in X[:50]:
+        label, p = scorer.predict(row.reshape(1, -1))
+        assert label[0] == estimator.predict(row.reshape(1, -1))[0]
+        assert abs(p[0] - estimator.predict_proba(row.reshape(1, -1))[0, 1]) <= 1e-9
+
+
+def test_scorer_matches_estimator_on_extreme_rows(artifacts):
+    estimator, feature_names = artifacts
+    scorer = app._LinearScorer.from_estimator(estimator)
+    X = app._parity_probe(len(feature_names))
+    X = np.vstack([X, np.zeros(len(feature_names)), np.full(len(feature_names), 1e9), np.full(len(feature_names), -1e9)])
+    labels, proba = scorer.predict(X)
+    np.testing.assert_allclose(proba, estimator.predict_proba(X)[:, 1], rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(labels, estimator.predict(X))
+    assert scorer.check_parity(X)
+
+
+def test_scorer_falls_back_to_predict_proba_without_coefficients():
+    class Estimator:
+        classes_ = np.array([0, 1])
+
+        def predict_proba(self, X):
+            p = np.clip(X[:, 0], 0, 1)
+            return np.column_stack([1 - p, p])
+
+    scorer = app._LinearScorer.from_estimator(Estimator())
+    assert scorer.coef is None
+    labels, proba = scorer.predict(np.array([[0.2], [0.5], [0.9]]))
+    np.testing.assert_array_equal(proba, [0.2, 0.5, 0.9])
+    np.testing.assert_array_equal(labels, [0, 0, 1])
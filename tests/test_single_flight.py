@@ -0,0 +1,281 @@
+"""single_flight.py: one upstream call per key across threads, tasks and worker processes."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import single_flight
+
+needs_fcntl = pytest.mark.skipif(single_flight.fcntl is None, reason="needs fcntl")
+
+
+class Upstream:
+    """A call that blocks until released, counting how often it was made."""
+
+    def __init__(self, value="answer", error=None):
+        self.value, self.error = value, error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def _run(target, *args):
+    """Start `target(*args)` on a thread; the returned dict gets "value" or "error"."""
+    out = {}
+
+    def run():
+        try:
+            out["value"] = target(*args)
+        except Exception as e:
+            out["error"] = e
+
+    out["thread"] = threading.Thread(target=run, daemon=True)
+    out["thread"].start()
+    return out
+
+
+def _join(*runs):
+    for run in runs:
+        run["thread"].join(5)
+        assert not run["thread"].is_alive()
+
+
+def test_waiters_share_the_leaders_result():
+    flights = single_flight.SingleFlight()
+    upstream = Upstream()
+    leader = _run(flights.do, "k", upstream)
+    assert upstream.started.wait(5)
+    waiters = [_run(flights.do, "k", upstream) for _ in range(5)]
+    time.sleep(0.05)
+    upstream.release.set()
+    _join(leader, *waiters)
+    assert [run["value"] for run in (leader, *waiters)] == ["answer"] * 6
+    assert upstream.calls == 1
+    assert flights.stats() == {"mode": "worker", "leaders": 1, "coalesced": 5, "in_flight": 0}
+
+
+def test_leader_error_is_raised_in_every_waiter():
+    flights = single_flight.SingleFlight()
+    upstream = Upstream(error=ValueError("upstream down"))
+    leader = _run(flights.do, "k", upstream)
+    assert upstream.started.wait(5)
+    waiters = [_run(flights.do, "k", upstream) for _ in range(3)]
+    time.sleep(0.05)
+    upstream.release.set()
+    _join(leader, *waiters)
+    assert all(run["error"] is upstream.error for run in (leader, *waiters))
+    assert upstream.calls == 1
+    # The failed flight is gone: the next caller leads again.
+    assert flights.do("k", lambda: "recovered") == "recovered"
+
+
+def test_off_mode_calls_every_time():
+    flights = single_flight.SingleFlight("off")
+    calls = []
+    assert [flights.do("k", lambda: calls.append(1) or len(calls)) for _ in range(3)] == [1, 2, 3]
+    assert flights.stats()["leaders"] == 0
+
+
+def test_async_waiters_share_the_leaders_result():
+    flights = single_flight.AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flights.do("k", fetch) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["answer"] * 4
+    assert len(calls) == 1
+    assert flights.stats()["coalesced"] == 3
+
+
+def test_async_leader_error_is_raised_in_waiters():
+    flights = single_flight.AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        raise ValueError("upstream down")
+
+    async def main():
+        return await asyncio.gather(*(flights.do("k", fetch) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert errors[0] is errors[1] is errors[2]
+
+
+def test_cancelled_async_leader_hands_the_call_to_a_waiter():
+    flights = single_flight.AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05 if len(calls) > 1 else 10)
+        return f"call {len(calls)}"
+
+    async def main():
+        leader = asyncio.create_task(flights.do("k", fetch))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(flights.do("k", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(waiter, 5)
+
+    assert asyncio.run(main()) == "call 2"
+    assert flights.stats() == {"mode": "worker", "leaders": 2, "coalesced": 0, "in_flight": 0}
+
+
+def test_cancelled_async_waiter_leaves_the_leader_running():
+    flights = single_flight.AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        leader = asyncio.create_task(flights.do("k", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flights.do("k", fetch))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        return await leader, waiter.cancelled()
+
+    assert asyncio.run(main()) == ("answer", True)
+
+
+# ─── host mode: two "workers" with their own _FileFlight on one directory ─────
+# flock locks belong to an open file description, so two instances in one process
+# contend for the lock exactly like two gunicorn workers do.
+
+def _worker(directory, wait_timeout=5.0, shares=None):
+    on_share = shares.append if shares is not None else None
+    return single_flight.SingleFlight("host", single_flight._FileFlight(str(directory), wait_timeout), on_share)
+
+
+@needs_fcntl
+def test_host_waiter_gets_the_other_workers_result(tmp_path):
+    shares = []
+    first, second = _worker(tmp_path), _worker(tmp_path, shares=shares)
+    upstream = Upstream(value={"advice": "shared"})
+    leader = _run(first.do, "k", upstream)
+    assert upstream.started.wait(5)
+    waiter = _run(second.do, "k", lambda: pytest.fail("the waiter must not call upstream"))
+    time.sleep(0.05)
+    upstream.release.set()
+    _join(leader, waiter)
+    assert leader["value"] == waiter["value"] == {"advice": "shared"}
+    assert shares == ["host"]
+    assert second.stats()["coalesced"] == 1
+
+
+@needs_fcntl
+def test_host_waiter_takes_over_when_the_leader_dies(tmp_path):
+    crashed = single_flight._FileFlight(str(tmp_path))
+    fd = crashed._try_lead("k")
+    assert fd is not None
+    survivor = _worker(tmp_path)
+    calls = []
+    waiter = _run(survivor.do, "k", lambda: calls.append(1) or "own answer")
+    time.sleep(0.1)
+    assert not calls  # still waiting on the lock holder
+    crashed._release(fd)  # the leader went away without publishing
+    _join(waiter)
+    assert waiter["value"] == "own answer" and calls == [1]
+    # The survivor published, so a later waiter on the same key could have shared it.
+    assert survivor.shared._collect("k", 0) == "own answer"
+
+
+@needs_fcntl
+def test_host_waiter_ignores_a_result_from_before_it_waited(tmp_path):
+    leader = single_flight._FileFlight(str(tmp_path))
+    leader._publish("k", "stale")
+    fd = leader._try_lead("k")
+    waiter = _run(_worker(tmp_path).do, "k", lambda: "fresh")
+    time.sleep(0.05)
+    leader._release(fd)
+    _join(waiter)
+    assert waiter["value"] == "fresh"
+
+
+@needs_fcntl
+def test_host_waiter_calls_upstream_after_the_wait_timeout(tmp_path):
+    holder = single_flight._FileFlight(str(tmp_path))
+    fd = holder._try_lead("k")
+    try:
+        started = time.monotonic()
+        assert _worker(tmp_path, wait_timeout=0.1).do("k", lambda: "gave up") == "gave up"
+        assert 0.1 <= time.monotonic() - started < 2
+    finally:
+        holder._release(fd)
+    # The lock was never ours to release: the holder still owns it.
+    assert holder._try_lead("k") is not None
+
+
+@needs_fcntl
+def test_async_host_waiter_gets_the_other_workers_result(tmp_path):
+    leader = single_flight._FileFlight(str(tmp_path))
+    fd = leader._try_lead("k")
+    flights = single_flight.AsyncSingleFlight("host", single_flight._FileFlight(str(tmp_path), 5.0))
+
+    async def fetch():
+        pytest.fail("the waiter must not call upstream")
+
+    async def main():
+        waiter = asyncio.create_task(flights.do("k", fetch))
+        await asyncio.sleep(0.05)
+        leader._publish("k", "shared")
+        leader._release(fd)
+        return await asyncio.wait_for(waiter, 5)
+
+    assert asyncio.run(main()) == "shared"
+
+
+@needs_fcntl
+def test_async_host_leader_cancelled_releases_the_lock(tmp_path):
+    flights = single_flight.AsyncSingleFlight("host", single_flight._FileFlight(str(tmp_path), 5.0))
+
+    async def fetch():
+        await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.create_task(flights.do("k", fetch))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    other = single_flight._FileFlight(str(tmp_path))
+    fd = other._try_lead("k")
+    assert fd is not None
+    other._release(fd)
+
+
+def test_flight_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("LLM_COALESCE", "bogus")
+    assert single_flight.flight_from_env().mode == "worker"
+    monkeypatch.setenv("LLM_COALESCE", "off")
+    assert single_flight.async_flight_from_env().mode == "off"
+    if single_flight.fcntl is not None:
+        monkeypatch.setenv("LLM_COALESCE", "host")
+        monkeypatch.setenv("LLM_COALESCE_DIR", str(tmp_path / "flights"))
+        monkeypatch.setenv("LLM_COALESCE_WAIT", "2.5")
+        flights = single_flight.flight_from_env()
+        assert flights.mode == "host"
+        assert flights.shared.directory == str(tmp_path / "flights") and flights.shared.wait_timeout == 2.5
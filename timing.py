@@ -0,0 +1,197 @@
+"""Per-request stage timing: `Server-Timing` headers, inline timings and histograms.
+
+A request gets a `Timeline` (held in a context variable, so helpers deep in the call
+stack can record into it without threading it through). Stages are recorded with
+`mark(name)`, which closes the span since the previous mark. `span(name)` times a
+block on its own. When `REQUEST_TIMING=0`, no timeline is started and every call
+below is a context-variable lookup plus a `None` check.
+
+    timing.start()
+    ... parse ...;     timing.mark("parse")
+    ... inference ...; timing.mark("inference")
+    with timing.span("llm"):
+        call_llm()
+    timeline = timing.finish()   # -> header(), as_dict(), HISTOGRAMS.observe(...)
+"""
+
+import bisect
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("REQUEST_TIMING", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+# Upper bounds (milliseconds) of the histogram buckets; the last bucket is +Inf.
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_current = contextvars.ContextVar("credilume_timeline", default=None)
+
+
+class Timeline:
+    """Ordered (stage, seconds) spans for one request."""
+
+    __slots__ = ("started", "last", "spans")
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.spans = []
+
+    def mark(self, name: str):
+        now = time.perf_counter()
+        self.spans.append((name, now - self.last))
+        self.last = now
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.spans.append((name, now - started))
+            self.last = now
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        """Milliseconds per stage (repeated stages are summed) plus the running total."""
+        out = {}
+        for name, seconds in self.spans:
+            out[name] = out.get(name, 0.0) + seconds * 1e3
+        out = {name: round(ms, 3) for name, ms in out.items()}
+        out["total"] = round(self.total() * 1e3, 3)
+        return out
+
+    def header(self) -> str:
+        return ", ".join(f"{name};dur={ms:.3f}" for name, ms in self.as_dict().items())
+
+
+def start():
+    if not ENABLED:
+        return None
+    timeline = Timeline()
+    _current.set(timeline)
+    return timeline
+
+
+def current():
+    return _current.get()
+
+
+def finish():
+    timeline = _current.get()
+    if timeline is not None:
+        _current.set(None)
+    return timeline
+
+
+def mark(name: str):
+    timeline = _current.get()
+    if timeline is not None:
+        timeline.mark(name)
+
+
+def span(name: str):
+    timeline = _current.get()
+    return timeline.span(name) if timeline is not None else contextlib.nullcontext()
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (cumulative-friendly, like Prometheus)."""
+
+    __slots__ = ("counts", "count", "sum_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile, capped at the max observed."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                upper = BUCKETS_MS[i] if i < len(BUCKETS_MS) else float("inf")
+                return round(min(float(upper), self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.50),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class StageHistograms:
+    """Histograms keyed by (route, stage), aggregated across requests in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, route: str, timeline: Timeline):
+        stages = timeline.as_dict()
+        with self._lock:
+            for stage, ms in stages.items():
+                histogram = self._histograms.get((route, stage))
+                if histogram is None:
+                    histogram = self._histograms[(route, stage)] = Histogram()
+                histogram.observe(ms)
+
+    def items(self):
+        """Snapshot of ((route, stage), Histogram copy) pairs."""
+        with self._lock:
+            copies = []
+            for key, histogram in self._histograms.items():
+                clone = Histogram()
+                clone.counts = list(histogram.counts)
+                clone.count, clone.sum_ms, clone.max_ms = histogram.count, histogram.sum_ms, histogram.max_ms
+                copies.append((key, clone))
+        return copies
+
+    def export(self) -> list:
+        """JSON-friendly [route, stage, counts, count, sum_ms, max_ms] rows (see `merged`)."""
+        return [[route, stage, h.counts, h.count, h.sum_ms, h.max_ms] for (route, stage), h in self.items()]
+
+    @classmethod
+    def merged(cls, exports) -> "StageHistograms":
+        """Histograms summing several `export()` results (e.g. one per worker)."""
+        out = cls()
+        for rows in exports:
+            for route, stage, counts, count, sum_ms, max_ms in rows:
+                histogram = out._histograms.get((route, stage))
+                if histogram is None:
+                    histogram = out._histograms[(route, stage)] = Histogram()
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.count += count
+                histogram.sum_ms += sum_ms
+                histogram.max_ms = max(histogram.max_ms, max_ms)
+        return out
+
+    def snapshot(self) -> dict:
+        out = {}
+        for (route, stage), histogram in sorted(self.items()):
+            out.setdefault(route, {})[stage] = histogram.summary()
+        return out
+
+
+HISTOGRAMS = StageHistograms()